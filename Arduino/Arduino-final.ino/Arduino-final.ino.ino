@@ -36,12 +36,20 @@ unsigned long ultimoMillis = 0;
 // ----------------------------------------------------------------------
 static const int HDR_ADDR    = 0;
 static const int HDR_SIZE    = 16;
-static const uint32_t MAGIC = 0x504F4E54UL; // 'P''O''N''T'
+// Header: magic u32 | head u16 | count u16 | seq u32 | id da placa u32
+// MAGIC_ID marca o header atual; os antigos ('PONT', com ou sem MAGIC_SEQ no lugar do id)
+// são convertidos no boot sem perder registros. O id é sorteado uma vez e identifica a
+// placa para o PC (cursor de sincronização por placa, não por porta).
+static const uint32_t MAGIC = 0x504F4E54UL; // 'P''O''N''T' (header antigo)
+static const uint32_t MAGIC_SEQ = 0x53455131UL; // 'S''E''Q''1' (header antigo com número de sequência)
+static const uint32_t MAGIC_ID = 0x32544E50UL; // 'P''N''T''2' (header com sequência e id da placa)
 static const int SLOT_SIZE   = 16;
 static const int MAX_SLOTS   = (EEPROM.length() - HDR_SIZE) / SLOT_SIZE;
 
 uint16_t e_head  = 0; // próximo slot p/ escrever
 uint16_t e_count = 0; // registros válidos
+uint32_t e_seq   = 0; // sequência do próximo registro (nunca volta, nem com ECLEAR)
+uint32_t e_placa = 0; // id desta placa (aleatório, gravado no header)
 
 // ===== helpers EEPROM =====
 uint8_t ee_r8(int a){ return EEPROM.read(a); }
@@ -76,23 +84,52 @@ int slot_addr(uint16_t idx){
   return HDR_SIZE + (idx % MAX_SLOTS) * SLOT_SIZE;
 }
 
+uint32_t sortear_id(){
+  randomSeed(analogRead(A0) ^ micros() ^ rtc.now().unixtime());
+  uint32_t id = 0;
+  while (id == 0 || id == 0xFFFFFFFFUL){
+    id = ((uint32_t)random(0x10000) << 16) | (uint32_t)random(0x10000);
+  }
+  return id;
+}
+
 void eeprom_load_header(){
   uint32_t magic = ee_r32(HDR_ADDR);
-  if (magic != MAGIC){
-    ee_w32(HDR_ADDR, MAGIC);
-    ee_w16(HDR_ADDR + 4, 0);
-    ee_w16(HDR_ADDR + 6, 0);
-    e_head = 0; e_count = 0;
-  } else {
+  if (magic == MAGIC_ID){
+    e_head  = ee_r16(HDR_ADDR + 4);
+    e_count = ee_r16(HDR_ADDR + 6);
+    e_seq   = ee_r32(HDR_ADDR + 8);
+    e_placa = ee_r32(HDR_ADDR + 12);
+  } else if (magic == MAGIC){
     e_head  = ee_r16(HDR_ADDR + 4);
     e_count = ee_r16(HDR_ADDR + 6);
-    if (e_head >= MAX_SLOTS)  e_head = 0;
-    if (e_count >  MAX_SLOTS) e_count = MAX_SLOTS;
+    // header sem sequência: numera os registros existentes a partir de 0
+    e_seq = (ee_r32(HDR_ADDR + 12) == MAGIC_SEQ) ? ee_r32(HDR_ADDR + 8) : e_count;
+    e_placa = 0;
+  } else {
+    e_head = 0; e_count = 0; e_seq = 0; e_placa = 0;
+  }
+  if (e_head >= MAX_SLOTS)  e_head = 0;
+  if (e_count >  MAX_SLOTS) e_count = MAX_SLOTS;
+  if (magic != MAGIC_ID || e_placa == 0 || e_placa == 0xFFFFFFFFUL){
+    e_placa = sortear_id();
+    ee_w16(HDR_ADDR + 4, e_head);
+    ee_w16(HDR_ADDR + 6, e_count);
+    ee_w32(HDR_ADDR + 8, e_seq);
+    ee_w32(HDR_ADDR + 12, e_placa);
+    ee_w32(HDR_ADDR, MAGIC_ID);   // por último: só vale depois de o resto estar gravado
   }
 }
+
+// id da placa em 8 dígitos hexadecimais
+void print_id(){
+  for (int8_t s = 28; s >= 0; s -= 4) Serial.print((e_placa >> s) & 0xF, HEX);
+}
+
 void eeprom_save_header(){
   ee_w16(HDR_ADDR + 4, e_head);
   ee_w16(HDR_ADDR + 6, e_count);
+  ee_w32(HDR_ADDR + 8, e_seq);
 }
 void eeprom_clear_all(){
   e_head = 0; e_count = 0; eeprom_save_header();
@@ -119,6 +156,7 @@ void eeprom_push(uint32_t epoch, const byte* uid, byte uid_len){
 
   e_head = (e_head + 1) % MAX_SLOTS;
   if (e_count < MAX_SLOTS) e_count++;
+  e_seq++;
   eeprom_save_header();
 }
 
@@ -154,7 +192,26 @@ String bytes_to_hex(const byte *uid, byte len){
   return s;
 }
 
-void print_one_json(uint32_t epoch, const byte *uid, byte len){
+// sequência do i-ésimo registro válido (0 = mais antigo ainda na EEPROM)
+uint32_t seq_of(uint16_t i){
+  return e_seq - e_count + i;
+}
+
+// CRC-8 (polinômio 0x07, inicial 0x00) dos quadros binários
+uint8_t crc8(const uint8_t *p, uint8_t n){
+  uint8_t c = 0;
+  for (uint8_t i=0;i<n;i++){
+    c ^= p[i];
+    for (uint8_t b=0;b<8;b++) c = (c & 0x80) ? (uint8_t)((c << 1) ^ 0x07) : (uint8_t)(c << 1);
+  }
+  return c;
+}
+
+void put32(uint8_t *p, uint32_t v){
+  p[0] = v & 0xFF; p[1] = (v >> 8) & 0xFF; p[2] = (v >> 16) & 0xFF; p[3] = (v >> 24) & 0xFF;
+}
+
+void print_one_json(uint32_t epoch, const byte *uid, byte len, uint32_t seq){
   DateTime dt = DateTime(epoch);
   char ts[25];
   snprintf(ts, sizeof(ts), "%04d-%02d-%02dT%02d:%02d:%02d",
@@ -162,14 +219,17 @@ void print_one_json(uint32_t epoch, const byte *uid, byte len){
   String uhex = bytes_to_hex(uid, len);
   Serial.print("{\"uid\":\""); Serial.print(uhex);
   Serial.print("\",\"ts\":\""); Serial.print(ts);
-  Serial.println("\",\"src\":\"eeprom\"}");
+  Serial.print("\",\"seq\":"); Serial.print(seq);
+  Serial.println(",\"src\":\"eeprom\"}");
 }
 
 // -------- comandos seriais --------
 void cmd_STATUS(){
   Serial.print("MAX_SLOTS="); Serial.print(MAX_SLOTS);
   Serial.print(" HEAD="); Serial.print(e_head);
-  Serial.print(" COUNT="); Serial.println(e_count);
+  Serial.print(" COUNT="); Serial.print(e_count);
+  Serial.print(" SEQ="); Serial.print(e_seq);
+  Serial.print(" ID="); print_id(); Serial.println();
 }
 
 void cmd_EDUMP(){
@@ -180,7 +240,58 @@ void cmd_EDUMP(){
     uint16_t idx = (start + i) % MAX_SLOTS;
     uint32_t epoch; byte uid[10]; byte len;
     if (!eeprom_read_slot(idx, epoch, uid, len)) continue;
-    print_one_json(epoch, uid, len);
+    print_one_json(epoch, uid, len, seq_of(i));
+  }
+  Serial.println("EEND");
+}
+
+// Dump binário: "EBIN <n> <primeira> <proxima> <id>", n quadros de 20 bytes e "EEND".
+// Quadro (little-endian): seq u32 | epoch u32 | uid_len u8 (0xFF = slot com CRC ruim) | uid[10] | crc8 dos 19 anteriores
+static const uint8_t FRAME_SIZE = 20;
+
+void cmd_EDUMP_BIN(const String &arg){
+  String s = arg; s.trim();
+  uint32_t desde = (uint32_t)strtoul(s.c_str(), NULL, 10);
+  uint16_t n = 0;
+  for (uint16_t i=0;i<e_count;i++) if (seq_of(i) >= desde) n++;
+  Serial.print("EBIN ");  Serial.print(n);
+  Serial.print(" ");      Serial.print(seq_of(0));
+  Serial.print(" ");      Serial.print(e_seq);
+  Serial.print(" ");      print_id(); Serial.println();
+  uint16_t start = (e_head + MAX_SLOTS - e_count) % MAX_SLOTS;
+  uint8_t f[FRAME_SIZE];
+  for (uint16_t i=0;i<e_count;i++){
+    if (seq_of(i) < desde) continue;
+    uint16_t idx = (start + i) % MAX_SLOTS;
+    uint32_t epoch; byte uid[10]; byte len;
+    bool ok = eeprom_read_slot(idx, epoch, uid, len);
+    put32(f, seq_of(i));
+    put32(f + 4, epoch);
+    f[8] = ok ? len : 0xFF;
+    for (byte k=0;k<10;k++) f[9 + k] = uid[k];
+    f[19] = crc8(f, 19);
+    Serial.write(f, FRAME_SIZE);
+  }
+  Serial.println("EEND");
+}
+
+// Só os registros com sequência >= `desde`. Logo após EBEGIN informa
+// "ESEQ <primeira> <proxima> <id>": a mais antiga ainda na EEPROM, a próxima a ser gravada
+// e o id da placa.
+void cmd_EDUMP_SINCE(const String &arg){
+  String s = arg; s.trim();
+  uint32_t desde = (uint32_t)strtoul(s.c_str(), NULL, 10);
+  Serial.println("EBEGIN");
+  Serial.print("ESEQ "); Serial.print(seq_of(0));
+  Serial.print(" ");     Serial.print(e_seq);
+  Serial.print(" ");     print_id(); Serial.println();
+  uint16_t start = (e_head + MAX_SLOTS - e_count) % MAX_SLOTS;
+  for (uint16_t i=0;i<e_count;i++){
+    if (seq_of(i) < desde) continue;
+    uint16_t idx = (start + i) % MAX_SLOTS;
+    uint32_t epoch; byte uid[10]; byte len;
+    if (!eeprom_read_slot(idx, epoch, uid, len)) continue;
+    print_one_json(epoch, uid, len, seq_of(i));
   }
   Serial.println("EEND");
 }
@@ -207,7 +318,7 @@ void cmd_EDUMP_UID(const String &uid_hex){
       if (!eeprom_read_slot(idx, epoch, uid, len)) continue;
       if (len != rlen) continue;
       bool eq = true; for(byte k=0;k<len;k++) if (uid[k]!=ref[k]) { eq=false; break; }
-      if (eq) print_one_json(epoch, uid, len);
+      if (eq) print_one_json(epoch, uid, len, seq_of(i));
     }
   }
   Serial.println("EEND");
@@ -283,7 +394,7 @@ void showRed(){
 // ----------------------------------------------------------------------
 //         Comando pendente durante espera de ACK
 // ----------------------------------------------------------------------
-enum PendingCmd { CMD_NONE, CMD_EDUMP, CMD_ECLEAR, CMD_STATUS, CMD_EDUMP_CSV, CMD_EDUMP_UID, CMD_SETTIME };
+enum PendingCmd { CMD_NONE, CMD_EDUMP, CMD_ECLEAR, CMD_STATUS, CMD_EDUMP_CSV, CMD_EDUMP_UID, CMD_SETTIME, CMD_EDUMP_SINCE, CMD_EDUMP_BIN };
 volatile PendingCmd pending_cmd = CMD_NONE;
 String pending_arg;
 
@@ -304,6 +415,8 @@ int waitAckFromPython(){
         if (line == "STATUS"){ pending_cmd = CMD_STATUS; return 1; }
         if (line == "EDUMP_CSV"){ pending_cmd = CMD_EDUMP_CSV; return 1; }
         if (line.startsWith("EDUMP_UID ")){ pending_cmd = CMD_EDUMP_UID; pending_arg = line.substring(10); pending_arg.trim(); return 1; }
+        if (line.startsWith("EDUMP_SINCE ")){ pending_cmd = CMD_EDUMP_SINCE; pending_arg = line.substring(12); pending_arg.trim(); return 1; }
+        if (line.startsWith("EDUMP_BIN ")){ pending_cmd = CMD_EDUMP_BIN; pending_arg = line.substring(10); pending_arg.trim(); return 1; }
         if (line.startsWith("SETTIME ")){ pending_cmd = CMD_SETTIME; pending_arg = line.substring(8); pending_arg.trim(); return 1; }
 
         line = "";
@@ -387,6 +500,9 @@ void setup(){
 
     // zera cache offline
     for (int i=0;i<8;i++) offline_cache[i].used = false;
+
+    // avisa o PC que o boot terminou (ele espera por esta linha em vez de um atraso fixo)
+    Serial.print("READY ID="); print_id(); Serial.println();
 }
 
 // ----------------------------------------------------------------------
@@ -400,6 +516,8 @@ void loop(){
       if (line == "STATUS"){ cmd_STATUS(); return; }
       if (line == "EDUMP"){ cmd_EDUMP(); return; }
       if (line.startsWith("EDUMP_UID ")){ cmd_EDUMP_UID(line.substring(10)); return; }
+      if (line.startsWith("EDUMP_SINCE ")){ cmd_EDUMP_SINCE(line.substring(12)); return; }
+      if (line.startsWith("EDUMP_BIN ")){ cmd_EDUMP_BIN(line.substring(10)); return; }
       if (line == "EDUMP_CSV"){ cmd_EDUMP_CSV(); return; }
       if (line == "ECLEAR"){ cmd_ECLEAR(); return; }
       if (line.startsWith("SETTIME ")){ cmd_SETTIME(line.substring(8)); return; }
@@ -413,6 +531,8 @@ void loop(){
       case CMD_STATUS:    cmd_STATUS(); break;
       case CMD_EDUMP:     cmd_EDUMP(); break;
       case CMD_EDUMP_UID: cmd_EDUMP_UID(pending_arg); pending_arg = ""; break;
+      case CMD_EDUMP_SINCE: cmd_EDUMP_SINCE(pending_arg); pending_arg = ""; break;
+      case CMD_EDUMP_BIN: cmd_EDUMP_BIN(pending_arg); pending_arg = ""; break;
       case CMD_EDUMP_CSV: cmd_EDUMP_CSV(); break;
       case CMD_ECLEAR:    cmd_ECLEAR(); break;
       case CMD_SETTIME:   cmd_SETTIME(pending_arg); pending_arg = ""; break;
@@ -0,0 +1,190 @@
+import os, time, queue, threading
+from collections import deque, Counter
+from datetime import datetime
+import config
+import metricas
+
+# BARRAMENTO DE EVENTOS
+# Substitui a antiga config.serial_queue (uma queue.Queue sem limite, drenada só com uma
+# tela aberta). Quem publica (thread serial, supervisor, exportação) nunca bloqueia, e
+# sem assinantes o evento simplesmente não vai a lugar nenhum. Cada assinante (telas,
+# simulador, auditoria, métricas) tem o seu buffer limitado: cheio, descarta o mais
+# antigo e conta em `descartados`. No buffer, eventos redundantes se juntam:
+#   - SINAIS ('update_data'): só importa que aconteceu, um pendente por payload basta
+#   - com `chave` (ex.: progresso de uma exportação): o novo substitui o pendente
+#   - repetição do último pendente (ex.: o mesmo log em laço): soma em `vezes`
+TIPOS = ("ok", "err", "log", "uid_captured", "update_data", "exportacao")
+SINAIS = {"update_data"}
+
+
+class Evento:
+    """Um evento publicado; desempacota como a tupla (kind, payload) da fila antiga."""
+    __slots__ = ("tipo", "dado", "chave", "quando", "vezes")
+
+    def __init__(self, tipo, dado, chave=None, quando=None, vezes=1):
+        self.tipo = tipo
+        self.dado = dado
+        self.chave = chave
+        self.quando = quando if quando is not None else time.time()
+        self.vezes = vezes
+
+    def __iter__(self):
+        return iter((self.tipo, self.dado))
+
+    def __repr__(self):
+        return f"Evento({self.tipo!r}, {self.dado!r}" + (f", x{self.vezes})" if self.vezes > 1 else ")")
+
+
+def _chave(ev):
+    """Com que evento pendente este se junta: sinal pelo payload (mesmo None), os outros pela `chave`."""
+    if ev.tipo in SINAIS:
+        return ev.tipo, ev.dado
+    return (ev.tipo, ev.chave) if ev.chave is not None else None
+
+
+class Assinatura:
+    """
+    Buffer de um assinante. `tipos` filtra o que entra (None = todos); `avisar()` é
+    chamado na thread de quem publica, fora do lock, quando o buffer deixa de estar
+    vazio. Leia com get() (bloqueia, como queue.Queue) ou drenar().
+    """
+    def __init__(self, nome, capacidade, tipos=None, avisar=None):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.tipos = set(tipos) if tipos is not None else None
+        self._avisar = avisar
+        self._cond = threading.Condition()
+        self._fila = deque()
+        self._por_chave = {}    # (tipo, chave) -> Evento pendente no buffer
+        self.recebidos = 0
+        self.agrupados = 0
+        self.descartados = 0
+
+    def _receber(self, ev):
+        if self.tipos is not None and ev.tipo not in self.tipos:
+            return
+        with self._cond:
+            self.recebidos += 1
+            chave = _chave(ev)
+            pendente = self._por_chave.get(chave) if chave is not None else None
+            if pendente is None and self._fila and ev.chave is None:
+                ultimo = self._fila[-1]
+                if ultimo.tipo == ev.tipo and ultimo.chave is None and ultimo.dado == ev.dado:
+                    pendente = ultimo
+            if pendente is not None:
+                pendente.dado, pendente.quando = ev.dado, ev.quando
+                pendente.vezes += 1
+                self.agrupados += 1
+                return
+            if len(self._fila) >= self.capacidade:
+                velho = self._fila.popleft()
+                self._esquecer(velho)
+                self.descartados += velho.vezes
+            copia = Evento(ev.tipo, ev.dado, ev.chave, ev.quando)     # só este buffer a altera
+            self._fila.append(copia)
+            if chave is not None:
+                self._por_chave[chave] = copia
+            primeiro = len(self._fila) == 1
+            self._cond.notify()
+        if primeiro and self._avisar is not None:
+            self._avisar()
+
+    def _esquecer(self, ev):
+        chave = _chave(ev)
+        if chave is not None and self._por_chave.get(chave) is ev:
+            del self._por_chave[chave]
+
+    def get(self, timeout=None):
+        """O evento mais antigo; queue.Empty se nada chegar em `timeout` segundos."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fila, timeout):
+                raise queue.Empty
+            ev = self._fila.popleft()
+            self._esquecer(ev)
+            return ev
+
+    def drenar(self):
+        """Todos os eventos pendentes, em ordem, sem bloquear."""
+        with self._cond:
+            eventos = list(self._fila)
+            self._fila.clear()
+            self._por_chave.clear()
+            return eventos
+
+    def pendentes(self):
+        return len(self._fila)
+
+    def estatisticas(self):
+        with self._cond:
+            return {"pendentes": len(self._fila), "recebidos": self.recebidos,
+                    "agrupados": self.agrupados, "descartados": self.descartados}
+
+
+class Barramento:
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._lock = threading.Lock()
+        self._assinaturas = ()      # trocada inteira: publicar() percorre sem lock
+        self.publicados = Counter()
+
+    def assinar(self, nome, capacidade=None, tipos=None, avisar=None):
+        """Nova Assinatura (buffer de `capacidade` eventos, config.BARRAMENTO_CAPACIDADE por padrão)."""
+        assinatura = Assinatura(nome, capacidade or self.capacidade, tipos, avisar)
+        with self._lock:
+            self._assinaturas += (assinatura,)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinaturas = tuple(a for a in self._assinaturas if a is not assinatura)
+
+    def publicar(self, tipo, dado=None, chave=None):
+        """Entrega a todos os assinantes sem bloquear (qualquer thread)."""
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de evento desconhecido: {tipo}")
+        self.publicados[tipo] += 1
+        ev = Evento(tipo, dado, chave)
+        for assinatura in self._assinaturas:
+            assinatura._receber(ev)
+
+    def estatisticas(self):
+        """{nome: {'pendentes', 'recebidos', 'agrupados', 'descartados'}} de cada assinante."""
+        return {a.nome: a.estatisticas() for a in self._assinaturas}
+
+
+eventos = Barramento(config.BARRAMENTO_CAPACIDADE)
+metricas.registro.medidor("ponto_eventos_pendentes", "Eventos no buffer de cada assinante do barramento",
+                          lambda: {a.nome: a.pendentes() for a in eventos._assinaturas}, rotulo="assinante")
+metricas.registro.medidor("ponto_eventos_descartados_total", "Eventos descartados por buffer cheio",
+                          lambda: {a.nome: a.descartados for a in eventos._assinaturas}, rotulo="assinante",
+                          tipo="counter")
+metricas.registro.medidor("ponto_eventos_publicados_total", "Eventos publicados no barramento, por tipo",
+                          lambda: dict(eventos.publicados), rotulo="tipo", tipo="counter")
+
+
+# AUDITORIA: um assinante que grava os eventos em arquivo, uma linha por evento
+def iniciar_auditoria(caminho=None, barramento=None):
+    """Thread que anexa os eventos a `caminho` (config.ARQ_AUDITORIA); devolve a Assinatura."""
+    caminho = caminho or config.ARQ_AUDITORIA
+    assinatura = (barramento or eventos).assinar("auditoria", tipos=set(TIPOS) - SINAIS)
+
+    def _gravar():
+        descartados = 0
+        while True:
+            lote = [assinatura.get()] + assinatura.drenar()
+            linhas = []
+            if assinatura.descartados != descartados:
+                linhas.append(f"{datetime.now().isoformat(timespec='seconds')} auditoria "
+                              f"{assinatura.descartados - descartados} eventos descartados (buffer cheio)\n")
+                descartados = assinatura.descartados
+            for ev in lote:
+                vezes = f" (x{ev.vezes})" if ev.vezes > 1 else ""
+                quando = datetime.fromtimestamp(ev.quando).isoformat(timespec='seconds')
+                linhas.append(f"{quando} {ev.tipo} {ev.dado}{vezes}\n")
+            try:
+                with open(caminho, "a", encoding="utf-8") as f:
+                    f.writelines(linhas)
+            except OSError as e:
+                print(f"[WARN] Auditoria: falha ao gravar {os.path.abspath(caminho)}: {e}")
+    threading.Thread(target=_gravar, daemon=True).start()
+    return assinatura
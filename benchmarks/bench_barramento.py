@@ -0,0 +1,90 @@
+"""
+Simula um período sem nenhuma tela aberta (um turno de batidas, um EDUMP grande e um
+erro de leitura em laço) e compara a antiga config.serial_queue (queue.Queue sem limite)
+com o barramento.eventos: eventos guardados, memória, quantas notificações a primeira
+tela a abrir receberia de uma vez e o custo de publicar com 1 e 3 assinantes.
+
+    python benchmarks/bench_barramento.py [--funcionarios 500] [--edump 10000] [--erros 1000]
+"""
+import os, sys, time, queue, argparse, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import barramento
+import difusao
+
+
+def eventos_do_periodo(n_func, n_edump, n_erros):
+    """(kind, payload, chave) na ordem em que a thread serial os publicaria."""
+    out = []
+    for i in range(n_edump // config.EDUMP_LOTE):
+        out.append(("log", f"[SYNC] {(i + 1) * config.EDUMP_LOTE} registros recebidos "
+                           f"({(i + 1) * config.EDUMP_LOTE} importados)...", ("sync", "COM3")))
+        out.append(("update_data", "nova_batida", None))
+    out.append(("ok", f"[SYNC] Importadas {n_edump} batidas offline.", None))
+    out.append(("update_data", "sync_completo", None))
+    for turno in range(4):
+        for i in range(n_func):
+            out.append(("ok", f"[OK] COM3: Func {i:04d}: evento {turno} às {8 + turno * 3:02d}:{i % 60:02d}", None))
+            out.append(("update_data", "nova_batida", None))
+        if turno == 1:
+            out += [("log", "[WARN] Leitura: device reports readiness to read but returned no data", None)] * n_erros
+    return out
+
+
+def _medir(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    resultado = fn()
+    dt = time.perf_counter() - t0
+    _atual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, dt, pico
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=500)
+    ap.add_argument("--edump", type=int, default=10000)
+    ap.add_argument("--erros", type=int, default=1000)
+    args = ap.parse_args(argv)
+    evs = eventos_do_periodo(args.funcionarios, args.edump, args.erros)
+
+    def antes():
+        fila = queue.Queue()
+        for kind, payload, _chave in evs:
+            fila.put((kind, payload))
+        return [m for m in iter(lambda: fila.get_nowait() if not fila.empty() else None, None)
+                if m[0] != "update_data"]      # o que ui_tick/difusor repassaria
+
+    def agora(n_extras=0):
+        b = barramento.Barramento(config.BARRAMENTO_CAPACIDADE)
+        telas = b.assinar("telas", tipos=difusao.Difusor.TIPOS)
+        for i in range(n_extras):
+            b.assinar(f"extra{i}")
+        for kind, payload, chave in evs:
+            b.publicar(kind, payload, chave=chave)
+        return telas.drenar(), telas, b
+
+    replay_antes, t_antes, mem_antes = _medir(antes)
+    (replay, telas, b), t_agora, mem_agora = _medir(agora)
+    (_r, _t, b3), t_tres, _m = _medir(lambda: agora(2))
+    n = len(evs)
+    print(f"{n} eventos publicados sem tela aberta ({args.funcionarios} funcionários x 4 batidas, "
+          f"EDUMP de {args.edump}, {args.erros} erros iguais)")
+    print(f"{'':<22} {'guardados':>9} {'na 1ª tela':>10} {'memória':>9} {'publicar':>12}")
+    print(f"{'queue.Queue':<22} {n:>9} {len(replay_antes):>10} {mem_antes / 1e6:>7.2f}MB "
+          f"{t_antes / n * 1e6:>9.2f} µs")
+    print(f"{'barramento (1 assin.)':<22} {len(replay):>9} {len(replay):>10} {mem_agora / 1e6:>7.2f}MB "
+          f"{t_agora / n * 1e6:>9.2f} µs")
+    print(f"{'barramento (3 assin.)':<22} {'':>9} {'':>10} {'':>9} {t_tres / n * 1e6:>9.2f} µs")
+    e = telas.estatisticas()
+    print(f"assinante 'telas': {e['recebidos']} recebidos, {e['agrupados']} agrupados, "
+          f"{e['descartados']} descartados (contados e avisados na tela)")
+    e = b3.estatisticas()["extra0"]
+    print(f"assinante com todos os tipos (como a auditoria): {e['recebidos']} recebidos, "
+          f"{e['agrupados']} agrupados, {e['descartados']} descartados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compara o dump JSONL (EDUMP/EDUMP_SINCE) com o binário (EDUMP_BIN) para uma EEPROM cheia:
+bytes no fio, tempo de transferência no baud informado e tempo de parse+agrupamento no
+MescladorIncremental (sem aplicar no repositório).
+
+    python benchmarks/bench_edump.py [--eeprom 4096] [--baud 9600] [--repeticoes 50]
+"""
+import os, sys, time, argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import funcoes
+import simulador
+
+HDR_SIZE = simulador.HDR_SIZE
+SLOT_SIZE = simulador.SLOT_SIZE
+
+
+class _RepoVazio:
+    def funcionarios(self):
+        return {}
+
+
+def gerar(eeprom_bytes, n_uids=50):
+    slots = (eeprom_bytes - HDR_SIZE) // SLOT_SIZE
+    uids = [f"{0xA0000000 + i:08X}" for i in range(n_uids)]
+    inicio = datetime(2024, 3, 4, 7, 0)
+    regs = []
+    for i in range(slots):
+        ts = inicio + timedelta(seconds=300 * (i // n_uids))
+        regs.append((simulador._epoch(ts), uids[i % n_uids], 1000 + i))
+    linhas = [simulador.ArduinoSimulado._json(e, u, s) for e, u, s in regs]
+    bloco = b"".join(simulador._quadro(s, e, u) for e, u, s in regs)
+    return uids, linhas, bloco
+
+
+def medir(fn, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--eeprom", type=int, default=4096, help="tamanho da EEPROM em bytes")
+    ap.add_argument("--baud", type=int, default=9600)
+    ap.add_argument("--repeticoes", type=int, default=50)
+    args = ap.parse_args(argv)
+
+    uids, linhas, bloco = gerar(args.eeprom)
+    funcs = {u: u for u in uids}
+    repo = _RepoVazio()
+
+    def jsonl():
+        m = funcoes.MescladorIncremental(repo, funcs)
+        for linha in linhas:
+            m.adicionar(linha)
+        return m
+
+    def binario():
+        m = funcoes.MescladorIncremental(repo, funcs)
+        regs, _ = funcoes.decodificar_edump_bin(bloco)
+        for uid, data_iso, hora, seq in regs:
+            m.adicionar_registro(uid, data_iso, hora, seq)
+        return m
+
+    a, b = jsonl(), binario()
+    assert a._buckets == b._buckets and a.ultimo_seq == b.ultimo_seq, "formatos divergem"
+
+    bytes_json = sum(len(l) + 2 for l in linhas)            # + \r\n
+    bytes_bin = len(bloco)
+    t_json = medir(jsonl, args.repeticoes)
+    t_bin = medir(binario, args.repeticoes)
+
+    print(f"EEPROM {args.eeprom} B = {len(linhas)} registros, {args.baud} baud")
+    print(f"{'formato':<8} {'bytes':>8} {'fio (s)':>9} {'parse (ms)':>11} {'us/reg':>8}")
+    for nome, nb, t in (("jsonl", bytes_json, t_json), ("binario", bytes_bin, t_bin)):
+        print(f"{nome:<8} {nb:>8} {nb * 10 / args.baud:>9.2f} {t * 1000:>11.2f} {t * 1e6 / len(linhas):>8.2f}")
+    print(f"bytes: {bytes_json / bytes_bin:.1f}x menos, parse: {t_json / t_bin:.1f}x mais rápido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Compara o estágio de leitura da serial (serial_thread._ler_uids, com LeitorLinhas) com o
+laço anterior (readline() com timeout=1, pausa por sleep(0.05), sleep(0.3) em exceção)
+no simulador: CPU da thread de leitura parada, pausada e sob carga, latência batida→ACK
+e tempo para a thread parar.
+
+    python benchmarks/bench_leitura.py [--taps 200] [--ocioso 3] [--baud 9600]
+"""
+import os, sys, time, queue, threading, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import serial
+import config
+import funcoes
+import serial_thread
+import simulador
+
+
+def leitura_readline(ar, terminal, fila_uids):
+    """O laço de leitura antes do LeitorLinhas."""
+    while not terminal.stop_flag.is_set():
+        if terminal.pause_flag.is_set():
+            time.sleep(0.05)
+            continue
+        try:
+            linha = ar.readline().decode("utf-8", errors="ignore").strip()
+            if not linha:
+                continue
+            uid = funcoes.extrair_uid(linha)
+            if uid is None:
+                continue
+            fila_uids.put(uid)
+        except Exception:
+            time.sleep(0.3)
+
+
+def _parar_antigo(terminal):
+    terminal.stop_flag.set()
+    terminal.pause_flag.clear()
+
+
+def _cpu(thread):
+    return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100.0 * (len(valores) - 1))))]
+
+
+def medir(leitura, parar, taps, ocioso, baud):
+    sim = simulador.ArduinoSimulado(baud=baud, led_ms=0).iniciar()
+    ar = serial.Serial(sim.porta, config.BAUDRATE, timeout=config.TIMEOUT)
+    term = serial_thread.Terminal(sim.porta)
+    term.ser = ar
+    fila = queue.Queue()
+
+    def responder():
+        while True:
+            uid = fila.get()
+            if uid is None:
+                return
+            ar.write(b"OK\r\n")
+
+    threading.Thread(target=responder, daemon=True).start()
+    leitor = threading.Thread(target=leitura, args=(ar, term, fila), daemon=True)
+    leitor.start()
+    time.sleep(0.2)
+    rel = {}
+
+    c0 = _cpu(leitor)
+    time.sleep(ocioso)
+    rel["cpu_ocioso_ms/s"] = (_cpu(leitor) - c0) * 1000 / ocioso
+
+    if leitura is leitura_readline:
+        term.pause_flag.set()
+    else:
+        term.pausar()
+    c0 = _cpu(leitor)
+    time.sleep(ocioso)
+    rel["cpu_pausado_ms/s"] = (_cpu(leitor) - c0) * 1000 / ocioso
+    t0 = time.perf_counter()
+    term.retomar()
+    sim.tocar("C0FFEE01")
+    while not sim.resultados:
+        time.sleep(0.001)
+    rel["retomar_ate_ack_ms"] = (time.perf_counter() - t0) * 1000
+
+    c0 = _cpu(leitor)
+    t0 = time.perf_counter()
+    for i in range(taps):
+        sim.tocar(f"{0xA0000000 + i:08X}")
+    while len(sim.resultados) < taps + 1:
+        time.sleep(0.005)
+    dur = time.perf_counter() - t0
+    rel["cpu_carga_ms/s"] = (_cpu(leitor) - c0) * 1000 / dur
+    lat = [r[1] * 1000 for r in sim.resultados[1:] if r[2] == "OK"]
+    rel["ack_ok"] = len(lat)
+    rel["lat_p50_ms"] = _percentil(lat, 50)
+    rel["lat_p99_ms"] = _percentil(lat, 99)
+
+    t0 = time.perf_counter()
+    parar(term)
+    leitor.join(5.0)
+    rel["parada_ms"] = (time.perf_counter() - t0) * 1000
+    fila.put(None)
+    ar.close()
+    sim.parar()
+    return rel
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--taps", type=int, default=200)
+    ap.add_argument("--ocioso", type=float, default=3.0, help="segundos medidos parado e pausado")
+    ap.add_argument("--baud", type=int, default=9600)
+    args = ap.parse_args(argv)
+
+    res = {
+        "readline": medir(leitura_readline, _parar_antigo, args.taps, args.ocioso, args.baud),
+        "buffer": medir(serial_thread._ler_uids, serial_thread.Terminal.parar, args.taps, args.ocioso, args.baud),
+    }
+    print(f"{'':<20} {'readline':>10} {'buffer':>10}")
+    for k in res["readline"]:
+        a, b = res["readline"][k], res["buffer"][k]
+        print(f"{k:<20} {a:>10.2f} {b:>10.2f}" if isinstance(a, float) else f"{k:<20} {a:>10} {b:>10}")
+
+
+if __name__ == "__main__":
+    main()
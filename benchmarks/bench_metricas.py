@@ -0,0 +1,85 @@
+"""
+Custo das métricas no caminho da batida: o que _estagio_decisao passou a fazer a mais
+(três perf_counter e dois Histograma.observar) comparado com o próprio decidir_batida
+sobre um repositório com `--funcionarios` cadastrados, com e sem outra thread
+observando o mesmo histograma ao mesmo tempo. Mede também quanto custa gerar /metrics.
+
+    python benchmarks/bench_metricas.py [--funcionarios 2000] [--batidas 20000]
+"""
+import os, sys, time, shutil, argparse, tempfile, threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import data
+import funcoes
+import metricas
+import repositorio
+
+
+def _por_chamada(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def instrumentacao():
+    """O que o estágio de decisão faz por batida só para as métricas."""
+    lido = time.perf_counter()
+    t0 = time.perf_counter()
+    t1 = time.perf_counter()
+    metricas.decisao.observar(t1 - t0)
+    metricas.ack.observar(time.perf_counter() - lido)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=2000)
+    ap.add_argument("--batidas", type=int, default=20000)
+    args = ap.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix="ponto_metricas_")
+    os.chdir(pasta)
+    try:
+        uids = [f"{0xA0000000 + i:08X}" for i in range(args.funcionarios)]
+        data.salvar_json(config.ARQ_FUNC, {u: f"Func {i:04d}" for i, u in enumerate(uids)})
+        config.repo = repositorio.criar()
+        config.repo.carregar()
+        config.MIN_GAP_SECONDS = 0          # toda batida passa pela decisão completa
+        i = [0]
+
+        def decidir():
+            i[0] += 1
+            funcoes.decidir_batida(uids[i[0] % len(uids)], "BENCH")
+
+        t_decidir = _por_chamada(decidir, args.batidas)
+        t_instr = _por_chamada(instrumentacao, args.batidas)
+        t_observar = _por_chamada(lambda: metricas.ack.observar(0.0003), args.batidas)
+
+        parar = threading.Event()
+
+        def concorrente():
+            while not parar.is_set():
+                metricas.ack.observar(0.0003)
+        t = threading.Thread(target=concorrente, daemon=True)
+        t.start()
+        t_disputa = _por_chamada(instrumentacao, args.batidas)
+        parar.set()
+        t.join()
+
+        t_texto = _por_chamada(metricas.registro.texto, 200)
+        print(f"{args.funcionarios} funcionários, {args.batidas} batidas")
+        print(f"{'decidir_batida':<40} {t_decidir * 1e6:>8.2f} µs")
+        print(f"{'Histograma.observar':<40} {t_observar * 1e6:>8.2f} µs")
+        print(f"{'instrumentação por batida':<40} {t_instr * 1e6:>8.2f} µs  "
+              f"({t_instr / t_decidir * 100:.1f}% da decisão)")
+        print(f"{'  com outra thread observando':<40} {t_disputa * 1e6:>8.2f} µs")
+        print(f"{'registro.texto() (GET /metrics)':<40} {t_texto * 1e3:>8.2f} ms  "
+              f"({len(metricas.registro.texto())} bytes)")
+    finally:
+        os.chdir("/")
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
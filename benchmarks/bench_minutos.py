@@ -0,0 +1,83 @@
+"""
+Compara o cálculo das horas de um mês inteiro (horas por dia + total por funcionário) a
+partir dos dicts {"entrada": "HH:MM", ...} — com strptime/datetime como antes e com o
+parse de minutos por dia — e a partir de minutos.BatidasMinutos (array de int16 por
+funcionário), incluindo o custo da conversão, e a leitura dos totais já materializados em
+indices.HorasTrabalhadas (e o custo de mantê-los a cada batida). Mostra também o tamanho
+da cópia dos dados que vai para o processo de exportação (pickle).
+
+    python benchmarks/bench_minutos.py [--funcionarios 5000] [--mes 2024-03] [--repeticoes 3]
+"""
+import os, sys, time, pickle, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data
+import export_excel
+import indices
+import minutos
+import bench_export
+
+
+def por_dia_strptime(registros, calendario):
+    return {uid: sum(bench_export._horas_dia_antigo(dias.get(d) or {}) for d, _br, _ds in calendario)
+            for uid, dias in registros.items()}
+
+def por_dia_minutos(registros, calendario):
+    return {uid: sum(export_excel.calcular_horas_dia_excel(dias.get(d) or {}) for d, _br, _ds in calendario)
+            for uid, dias in registros.items()}
+
+def compacto(batidas):
+    """Recalcula sempre (_calcular), sem os minutos por dia já guardados em trabalhados()."""
+    return {uid: minutos.fracao_dia(sum(b._calcular())) for uid, b in batidas.items()}
+
+
+def _melhor(fn, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=5000)
+    ap.add_argument("--mes", default="2024-03")
+    ap.add_argument("--repeticoes", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    _funcionarios, registros = bench_export.gerar(args.funcionarios, args.mes)
+    calendario = export_excel.calendario_mes(args.mes)
+    inicio, n_dias = calendario[0][0], len(calendario)
+    converter = lambda: {uid: minutos.BatidasMinutos.de_dias(d, inicio, n_dias) for uid, d in registros.items()}
+    batidas = converter()
+
+    res = {
+        "dict + strptime": _melhor(lambda: por_dia_strptime(registros, calendario), args.repeticoes),
+        "dict + minutos por dia": _melhor(lambda: por_dia_minutos(registros, calendario), args.repeticoes),
+        "conversão + array": _melhor(lambda: compacto(converter()), args.repeticoes),
+        "array (já convertido)": _melhor(lambda: compacto(batidas), args.repeticoes),
+    }
+    horas = indices.HorasTrabalhadas(lambda _mes: registros)
+    horas.totais_do_mes(args.mes)
+    res["materializado (leitura)"] = _melhor(lambda: horas.totais_do_mes(args.mes), args.repeticoes)
+    uids = list(registros)
+    batidas_novas = [[data.registro_batida(uids[i % len(uids)], inicio, "saida", f"{17 + i % 6:02d}:{i % 60:02d}")]
+                     for i in range(10000)]
+    t0 = time.perf_counter()
+    for recs in batidas_novas:
+        horas.aplicar(recs)
+    por_batida_us = (time.perf_counter() - t0) / len(batidas_novas) * 1e6
+    base = res["dict + strptime"]
+    print(f"{args.funcionarios} funcionários x {n_dias} dias, numpy: {'sim' if minutos.numpy() is not None else 'não'}")
+    print(f"{'forma':<26} {'tempo (ms)':>11} {'ganho':>7}")
+    for nome, t in res.items():
+        print(f"{nome:<26} {t * 1000:>11.2f} {base / t:>6.1f}x")
+    print(f"manter os totais: {por_batida_us:.1f} µs por batida aplicada")
+    print(f"cópia para exportar (pickle): dicts {len(pickle.dumps(registros)) / 1e6:.1f} MB, "
+          f"arrays {len(pickle.dumps(batidas)) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Mede a partida a frio de cada subcomando de `python -m ponto` (processo novo a cada vez):
+tempo de parede até o fim do comando (para serve, até a primeira resposta HTTP), tempo
+de import (python -X importtime) e quais dependências pesadas foram carregadas. A linha
+de base é o que toda tarefa pagava antes, só para importar o que interface.py importa.
+
+    python benchmarks/bench_partida.py [--funcionarios 200] [--repeticoes 5]
+"""
+import os, re, sys, json, time, socket, shutil, tempfile, argparse, subprocess, urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+import bench_export
+
+PESADAS = ["nicegui", "openpyxl", "serial", "numpy"]
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def preparar(pasta, n_func, ano_mes="2024-03"):
+    funcionarios, registros = bench_export.gerar(n_func, ano_mes)
+    with open(os.path.join(pasta, "funcionarios.json"), "w", encoding="utf-8") as f:
+        json.dump(funcionarios, f)
+    with open(os.path.join(pasta, "dump.jsonl"), "w", encoding="utf-8") as f:
+        seq = 0
+        for uid, dias in registros.items():
+            for d, dia in dias.items():
+                for ev in ("entrada", "saida_intervalo", "volta_intervalo", "saida"):
+                    if ev in dia:
+                        f.write(json.dumps({"uid": uid, "ts": f"{d}T{dia[ev]}:00", "seq": seq}) + "\n")
+                        seq += 1
+    _rodar([sys.executable, "-m", "ponto", "--dados", pasta, "import-dump", os.path.join(pasta, "dump.jsonl")])
+
+
+def _rodar(cmd, **kw):
+    return subprocess.run(cmd, cwd=RAIZ, capture_output=True, text=True, check=True, **kw)
+
+
+def _ms_imports(stderr):
+    """Soma do tempo cumulativo dos imports de topo (python -X importtime)."""
+    return sum(int(cum_us) for _self, cum_us, recuo, _nome in _IMPORTTIME.findall(stderr) if not recuo) / 1000
+
+
+def _pesadas(cmd):
+    """Dependências pesadas em sys.modules no fim do comando (tentativas que falharam não contam)."""
+    sonda = ("import sys, atexit, runpy; atexit.register(lambda: print('PESADAS', "
+             f"*[m for m in {PESADAS!r} if m in sys.modules], file=sys.stderr)); ")
+    if cmd[1] == "-m":
+        sonda += f"sys.argv = {cmd[2:]!r}; runpy.run_module({cmd[2]!r}, run_name='__main__')"
+    else:
+        sonda += cmd[2]
+    linha = [l for l in _rodar([sys.executable, "-c", sonda]).stderr.splitlines() if l.startswith("PESADAS")]
+    return linha[-1].split()[1:]
+
+
+def medir(cmd, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        _rodar(cmd)
+        tempos.append(time.perf_counter() - t0)
+    imp = _ms_imports(_rodar([sys.executable, "-X", "importtime"] + cmd[1:]).stderr)
+    return min(tempos) * 1000, imp, _pesadas(cmd)
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def medir_serve(pasta, repeticoes):
+    """Do início do processo até a primeira página servida."""
+    tempos = []
+    for _ in range(repeticoes):
+        porta = _porta_livre()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-m", "ponto", "--dados", pasta, "serve", "--porta", str(porta)],
+                                cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{porta}/", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.02)
+            tempos.append(time.perf_counter() - t0)
+        finally:
+            proc.terminate()
+            proc.wait()
+    return min(tempos) * 1000
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=200)
+    ap.add_argument("--repeticoes", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    pasta = tempfile.mkdtemp()
+    try:
+        preparar(pasta, args.funcionarios)
+        ponto = [sys.executable, "-m", "ponto", "--dados", pasta]
+        casos = {
+            "antes: imports de interface.py": [sys.executable, "-c",
+                                               "import nicegui.ui, openpyxl, serial, serial.tools.list_ports"],
+            "--help": ponto + ["--help"],
+            "import-dump (tudo repetido)": ponto + ["import-dump", os.path.join(pasta, "dump.jsonl")],
+            "stats": ponto + ["stats", "--mes", "2024-03"],
+            "export 2024-03": ponto + ["export", "2024-03"],
+        }
+        print(f"{args.funcionarios} funcionários, melhor de {args.repeticoes}")
+        print(f"{'comando':<34} {'total (ms)':>10} {'imports (ms)':>13}  pesadas")
+        for nome, cmd in casos.items():
+            total, imp, pesadas = medir(cmd, args.repeticoes)
+            print(f"{nome:<34} {total:>10.0f} {imp:>13.0f}  {', '.join(pesadas) or '-'}")
+        print(f"{'serve (até a 1ª página)':<34} {medir_serve(pasta, max(1, args.repeticoes // 2)):>10.0f}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Quanto uma captura do perfil.py atrasa o trabalho que está observando: uma exportação
+de mês (sem cache) e um laço de decidir_batida, sem captura, com a amostragem das pilhas
+e com amostragem + tracemalloc. Sem captura não há nada instalado, então a primeira
+linha é o custo de sempre.
+
+    python benchmarks/bench_perfil.py [--funcionarios 300] [--batidas 20000]
+"""
+import os, sys, time, shutil, argparse, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import data
+import funcoes
+import perfil
+import repositorio
+import export_excel
+import bench_export
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=300)
+    ap.add_argument("--batidas", type=int, default=20000)
+    args = ap.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix="ponto_perfil_")
+    os.chdir(pasta)
+    try:
+        funcionarios, registros = bench_export.gerar(args.funcionarios, "2024-03")
+        data.salvar_json(config.ARQ_FUNC, funcionarios)
+        config.repo = repositorio.criar()
+        config.repo.carregar()
+        config.repo.registrar_eventos([data.registro_batida(uid, d, ev, h)
+                                       for uid, dias in registros.items() for d, dia in dias.items()
+                                       for ev, h in dia.items()])
+        minutos = config.repo.minutos_do_mes("2024-03")
+        uids = list(funcionarios)
+        config.MIN_GAP_SECONDS = 0
+
+        def exportar():
+            shutil.rmtree("export", ignore_errors=True)
+            t0 = time.perf_counter()
+            export_excel.exportar_mes_xlsx("2024-03", funcionarios, minutos, config.EVENTOS)
+            return time.perf_counter() - t0
+
+        def decidir():
+            t0 = time.perf_counter()
+            for i in range(args.batidas):
+                funcoes.decidir_batida(uids[i % len(uids)], "BENCH")
+            return (time.perf_counter() - t0) / args.batidas
+
+        print(f"{args.funcionarios} funcionários, {args.batidas} batidas")
+        print(f"{'':<26} {'exportação':>11} {'decidir_batida':>15}")
+        base = None
+        for nome, memoria in (("sem captura", None), ("amostragem", False), ("amostragem + tracemalloc", True)):
+            captura = perfil.iniciar(600, memoria=memoria) if memoria is not None else None
+            t_exp, t_dec = exportar(), decidir()
+            if captura is not None:
+                captura.parar()
+            base = base or (t_exp, t_dec)
+            print(f"{nome:<26} {t_exp * 1000:>8.0f} ms {t_dec * 1e6:>11.1f} µs"
+                  + (f"   (x{t_exp / base[0]:.2f}, x{t_dec / base[1]:.2f})" if captura else ""))
+    finally:
+        os.chdir("/")
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compara o relatório de período (export_excel.exportar_periodo_xlsx, em série e com as abas
+geradas em lotes num pool de processos) com a alternativa sem ele: chamar exportar_mes_xlsx uma vez por mês.
+Mede o tempo de parede de cada forma para o mesmo ano de batidas.
+
+    python benchmarks/bench_periodo.py [--funcionarios 200] [--ano 2024] [--meses 12] [--processos N]
+"""
+import os, sys, time, shutil, tempfile, argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import export_excel
+import bench_export
+
+
+def gerar(n_func, ano, meses):
+    funcionarios, registros = {}, {}
+    for m in range(1, meses + 1):
+        funcionarios, regs = bench_export.gerar(n_func, f"{ano}-{m:02d}", semente=m)
+        for uid, dias in regs.items():
+            registros.setdefault(uid, {}).update(dias)
+    return funcionarios, registros
+
+
+def medir(fn):
+    """Roda fn() num diretório vazio; devolve os segundos."""
+    anterior = os.getcwd()
+    pasta = tempfile.mkdtemp()
+    os.chdir(pasta)
+    try:
+        t0 = time.perf_counter()
+        fn()
+        return time.perf_counter() - t0
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--funcionarios", type=int, default=200)
+    ap.add_argument("--ano", type=int, default=2024)
+    ap.add_argument("--meses", type=int, default=12)
+    ap.add_argument("--processos", type=int, default=os.cpu_count())
+    args = ap.parse_args(argv)
+
+    funcionarios, registros = gerar(args.funcionarios, args.ano, args.meses)
+    meses = [f"{args.ano}-{m:02d}" for m in range(1, args.meses + 1)]
+    inicio = f"{meses[0]}-01"
+    fim = export_excel.calendario_mes(meses[-1])[-1][0]
+
+    def por_mes():
+        for mes in meses:
+            fatia = {u: {d: dia for d, dia in dias.items() if d.startswith(mes)} for u, dias in registros.items()}
+            export_excel.exportar_mes_xlsx(mes, funcionarios, fatia, config.EVENTOS, usar_cache=False)
+
+    res = {"exportar_mes_xlsx por mês": medir(por_mes)}
+    res["período mensal (.zip), em série"] = medir(lambda: export_excel.exportar_periodo_xlsx(
+        inicio, fim, funcionarios, registros, config.EVENTOS, mensal=True))
+    with ProcessPoolExecutor(args.processos) as pool:
+        pool.submit(int).result()       # sobe os processos fora da medida
+        res[f"período mensal (.zip), {args.processos} proc."] = medir(lambda: export_excel.exportar_periodo_xlsx(
+            inicio, fim, funcionarios, registros, config.EVENTOS, mensal=True, mapear=pool.map))
+        res[f"período em 1 .xlsx, {args.processos} proc."] = medir(lambda: export_excel.exportar_periodo_xlsx(
+            inicio, fim, funcionarios, registros, config.EVENTOS, mapear=pool.map))
+
+    base = res["exportar_mes_xlsx por mês"]
+    print(f"{args.funcionarios} funcionários x {args.meses} meses, {os.cpu_count()} CPUs")
+    print(f"{'forma':<36} {'tempo (s)':>10} {'ganho':>7}")
+    for nome, t in res.items():
+        print(f"{nome:<36} {t:>10.2f} {base / t:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Teste de estresse da concorrência entre a thread serial e as telas/exportação: um
+escritor aplica batidas (como o pipeline serial: decide sob config.decisao_lock e grava
+em grupo noutra thread), outro mexe no cadastro, e vários leitores varrem ao mesmo tempo
+o que a interface e a exportação leem. Cada batida grava os 4 eventos de um dia de uma
+vez, com 8 h trabalhadas, então um leitor nunca pode ver:
+  - um dia com 1 a 3 eventos, ou com horas diferentes de 0 ou 8 h (leitura rasgada)
+  - um total do mês que não seja múltiplo de 8 h
+  - exceções ("dictionary changed size during iteration" e afins)
+Mostra também a latência de aplicar_eventos (o que a thread serial espera antes do ACK)
+com e sem leitores. Sai com código 1 se algum leitor viu inconsistência ou erro.
+
+    python benchmarks/stress_concorrencia.py [--backend json|sqlite] [--segundos 5] [--leitores 4]
+"""
+import os, sys, time, queue, pickle, random, shutil, argparse, calendar, tempfile, threading, traceback
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import data
+import minutos
+import repositorio
+
+OITO_HORAS = 8 * 60
+
+
+def _meses(n):
+    """Os n meses até o atual, 'YYYY-MM', do mais antigo ao atual."""
+    d = date.today().replace(day=1)
+    out = []
+    for _ in range(n):
+        out.append(d.strftime("%Y-%m"))
+        d = (d - timedelta(days=1)).replace(day=1)
+    return out[::-1]
+
+def _dias(meses):
+    hoje = date.today().isoformat()
+    out = []
+    for mes in meses:
+        ano, m = int(mes[:4]), int(mes[5:7])
+        out += [f"{mes}-{d:02d}" for d in range(1, calendar.monthrange(ano, m)[1] + 1) if f"{mes}-{d:02d}" <= hoje]
+    return out
+
+def batida_completa(uid, data_iso, rnd):
+    """Os 4 eventos de um dia, sempre com 8 h trabalhadas (1 h de intervalo)."""
+    e = rnd.randrange(5 * 60, 11 * 60)
+    horas = (e, e + 4 * 60, e + 5 * 60, e + 9 * 60)
+    return [data.registro_batida(uid, data_iso, ev, minutos.hhmm(h), "STRESS") for ev, h in zip(config.EVENTOS, horas)]
+
+
+class Estresse:
+    def __init__(self, n_func, meses, leitores, segundos, seed=1):
+        self.uids = [f"{0xB0000000 + i:08X}" for i in range(n_func)]
+        self.meses = meses
+        self.dias = _dias(meses)
+        self.n_leitores = leitores
+        self.segundos = segundos
+        self.seed = seed
+        self.parar = threading.Event()
+        self.latencias = []
+        self.leituras = Counter()
+        self.problemas = Counter()
+        self.exemplos = {}
+        self._lock = threading.Lock()
+
+    def preparar(self):
+        data.salvar_json(config.ARQ_FUNC, {u: f"Func {i:04d}" for i, u in enumerate(self.uids)})
+        if config.BACKEND == "sqlite":
+            repositorio.migrar_json_para_sqlite()
+        config.repo = repositorio.criar()
+        config.repo.carregar()
+        rnd = random.Random(self.seed)
+        recs = [r for u in self.uids for d in rnd.sample(self.dias, min(10, len(self.dias)))
+                for r in batida_completa(u, d, rnd)]
+        config.repo.registrar_eventos(recs)
+
+    def _problema(self, tipo, detalhe):
+        with self._lock:
+            self.problemas[tipo] += 1
+            self.exemplos.setdefault(tipo, detalhe)
+
+    # ---- escritores ----
+    def serial(self):
+        rnd = random.Random(self.seed + 1)
+        gravar = queue.Queue()
+
+        def gravador():     # como serial_thread.PersistenciaEmGrupo
+            while True:
+                recs = gravar.get()
+                if recs is None:
+                    return
+                config.repo.persistir_eventos(recs)
+        t = threading.Thread(target=gravador, daemon=True)
+        t.start()
+        n = 0
+        while not self.parar.is_set():
+            n += 1
+            uid = rnd.choice(self.uids)
+            if n % 500 == 0:
+                recs = [{"op": "del_uid", "uid": uid}]
+            else:
+                recs = batida_completa(uid, rnd.choice(self.dias), rnd)
+            t0 = time.perf_counter()
+            with config.decisao_lock:
+                config.repo.aplicar_eventos(recs)
+            self.latencias.append(time.perf_counter() - t0)
+            gravar.put(recs)
+            time.sleep(0.0005)
+        gravar.put(None)
+        t.join()
+
+    def cadastro(self):
+        rnd = random.Random(self.seed + 2)
+        extras = []
+        while not self.parar.is_set():
+            if extras and rnd.random() < 0.4:
+                config.repo.remover_funcionario(extras.pop(rnd.randrange(len(extras))))
+            else:
+                uid = f"{0xC0000000 + rnd.randrange(1 << 20):08X}"
+                config.repo.salvar_funcionario(uid, f"Novo {uid}")
+                extras.append(uid)
+            time.sleep(0.01)
+
+    # ---- leitores ----
+    def _conferir_dia(self, onde, dia):
+        n = sum(1 for ev in config.EVENTOS if dia.get(ev))
+        if n not in (0, 4):
+            self._problema("dia com 1 a 3 eventos", f"{onde}: {dict(dia)}")
+        elif n == 4:
+            m = [minutos.minutos_hhmm(dia[ev]) for ev in config.EVENTOS]
+            if minutos.minutos_trabalhados(*m) != OITO_HORAS:
+                self._problema("dia com eventos de batidas diferentes", f"{onde}: {dict(dia)}")
+
+    def _conferir_totais(self, onde, totais):
+        for uid, m in totais.items():
+            if m % OITO_HORAS:
+                self._problema("total do mês rasgado", f"{onde}: {uid} = {m} min")
+
+    def ler_registros_do_mes(self, rnd):
+        mes = rnd.choice(self.meses)
+        for uid, dias in config.repo.registros_do_mes(mes).items():
+            for d, dia in dias.items():
+                self._conferir_dia(f"registros_do_mes {d}", dia)
+
+    def ler_minutos_do_mes(self, rnd):
+        mes = rnd.choice(self.meses)
+        batidas = config.repo.minutos_do_mes(mes)
+        pickle.dumps((config.repo.funcionarios(), batidas))     # o que vai para o processo de exportação
+        for uid, b in batidas.items():
+            if any(m not in (0, OITO_HORAS) for m in b.trabalhados()):
+                self._problema("dia com eventos de batidas diferentes", f"minutos_do_mes {mes}: {uid}")
+            self._conferir_totais(f"minutos_do_mes {mes}", {uid: sum(b.trabalhados())})
+
+    def ler_totais(self, rnd):
+        mes = rnd.choice(self.meses)
+        self._conferir_totais(f"totais_do_mes {mes}", config.repo.horas.totais_do_mes(mes))
+
+    def ler_pagina(self, rnd):
+        d = rnd.choice(self.dias)
+        ordem = rnd.choice(["nome", "uid", "horas_mes"] + config.EVENTOS)
+        _total, rows = config.repo.pagina_do_dia(d, ordenar=ordem, desc=rnd.random() < 0.5, qtd=0)
+        for row in rows:
+            self._conferir_dia(f"pagina_do_dia {d}", row)
+            if row["horas_mes"] % OITO_HORAS:
+                self._problema("total do mês rasgado", f"pagina_do_dia {d}: {row['uid']}")
+
+    def ler_dia(self, rnd):
+        d = rnd.choice(self.dias)
+        por_uid = Counter(uid for _h, uid, _ev in config.repo.batidas_do_dia(d))
+        for uid, n in por_uid.items():
+            if n != 4:
+                self._problema("dia com 1 a 3 eventos", f"batidas_do_dia {d}: {uid} com {n}")
+        for uid in rnd.sample(self.uids, 20):
+            self._conferir_dia(f"dia {d}", config.repo.dia(uid, d))
+
+    def ler_listas(self, rnd):
+        config.repo.datas()
+        config.repo.meses()
+        config.repo.uids_do_dia(rnd.choice(self.dias))
+        nomes = config.repo.funcionarios_por_nome()
+        funcionarios = config.repo.funcionarios()
+        sorted(funcionarios.items(), key=lambda x: x[1])
+        if len(nomes) < len(self.uids):
+            self._problema("cadastro incompleto", f"{len(nomes)} funcionários")
+
+    def leitor(self, i):
+        rnd = random.Random(self.seed + 10 + i)
+        leituras = [self.ler_registros_do_mes, self.ler_minutos_do_mes, self.ler_totais,
+                    self.ler_pagina, self.ler_dia, self.ler_listas]
+        while not self.parar.is_set():
+            fn = rnd.choice(leituras)
+            try:
+                fn(rnd)
+            except Exception as e:
+                self._problema(f"{type(e).__name__}: {e}", traceback.format_exc(limit=-3))
+            with self._lock:
+                self.leituras[fn.__name__] += 1
+
+    def rodar(self, com_leitores=True):
+        self.parar.clear()
+        self.latencias = []
+        threads = [threading.Thread(target=self.serial), threading.Thread(target=self.cadastro)]
+        if com_leitores:
+            threads += [threading.Thread(target=self.leitor, args=(i,)) for i in range(self.n_leitores)]
+        for t in threads:
+            t.start()
+        time.sleep(self.segundos)
+        self.parar.set()
+        for t in threads:
+            t.join()
+        return sorted(self.latencias)
+
+    def conferir_final(self):
+        """Depois de parar: o que está em memória confere com uma leitura nova do disco?"""
+        mes = self.meses[-1]
+        em_memoria = config.repo.horas.totais_do_mes(mes)
+        config.repo.persistir_eventos([])
+        novo = repositorio.criar()
+        novo.carregar()
+        do_disco = {u: m for u, m in novo.horas.totais_do_mes(mes).items() if m}
+        if {u: m for u, m in em_memoria.items() if m} != do_disco:
+            self._problema("memória diferente do disco no fim", mes)
+
+
+def _ms(lat, p):
+    return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000 if lat else 0.0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    ap.add_argument("--funcionarios", type=int, default=2000)
+    ap.add_argument("--meses", type=int, default=4)
+    ap.add_argument("--leitores", type=int, default=4)
+    ap.add_argument("--segundos", type=float, default=5.0)
+    args = ap.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix="ponto_stress_")
+    os.chdir(pasta)
+    config.BACKEND = args.backend
+    config.SHARDS_EM_MEMORIA = 2            # força carga/descarte de meses durante o teste
+    config.HORAS_MESES_EM_MEMORIA = 2
+    config.JOURNAL_MAX_SEGUNDOS = 1         # e compactações do journal no meio
+    try:
+        e = Estresse(args.funcionarios, _meses(args.meses), args.leitores, args.segundos)
+        e.preparar()
+        print(f"backend {args.backend}, {args.funcionarios} funcionários, {args.meses} meses, "
+              f"{args.leitores} leitores, {args.segundos:g} s")
+        print(f"{'aplicar_eventos':<16} {'batidas':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9}")
+        for nome, com in (("sem leitores", False), ("com leitores", True)):
+            lat = e.rodar(com)
+            print(f"{nome:<16} {len(lat):>8} {_ms(lat, .5):>9.3f} {_ms(lat, .99):>9.3f} {_ms(lat, 1):>9.3f}")
+        e.conferir_final()
+        print("leituras: " + ", ".join(f"{k} {v}" for k, v in sorted(e.leituras.items())))
+        if not e.problemas:
+            print("nenhuma inconsistência")
+            return 0
+        for tipo, n in e.problemas.most_common():
+            print(f"PROBLEMA {n}x {tipo}\n    ex.: {e.exemplos[tipo].strip()}")
+        return 1
+    finally:
+        os.chdir("/")
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
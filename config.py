@@ -1,8 +1,14 @@
-import re, threading, queue
+import re, threading
 
 # CONFIGURAÇÕES E CONSTANTES
 ARQ_FUNC = "funcionarios.json"
-ARQ_REG  = "registros.json"
+ARQ_REG  = "registros.json"   # formato antigo (arquivo único), migrado para DIR_REG
+DIR_REG  = "registros"        # shards mensais: registros/YYYY-MM.json
+ARQ_JOURNAL = "registros.journal"
+ARQ_DB   = "ponto.db"
+ARQ_CURSOR = "sync_cursor.json"   # próximo seq da EEPROM a importar, por id da placa
+ARQ_TRAVA = "ponto.lock"   # segurado pelo serve; import-dump e migrate não rodam sem ele
+BACKEND  = "json"       # "json" (shards em DIR_REG + journal) ou "sqlite" (ARQ_DB)
 
 BAUDRATE = 9600
 TIMEOUT = 1
@@ -10,17 +16,55 @@ EVENTOS = ["entrada", "saida_intervalo", "volta_intervalo", "saida"]
 MIN_GAP_SECONDS = 60
 HEX_RE = re.compile(r'^[0-9A-F]+$')
 
+# PIPELINE SERIAL: ACK imediato, persistência em grupo
+GROUP_COMMIT_MS = 100           # janela de agrupamento dos commits
+PIPELINE_MAX_PENDENTES = 500    # batidas (não lotes) com ACK sem commit; acima disso não responde:
+                                # o Arduino grava na EEPROM
+
+# EDUMP em streaming
+EDUMP_LOTE = 50         # registros por commit parcial / aviso de progresso
+EDUMP_OCIOSO_S = 3.0    # aborta o dump após N segundos sem nenhuma linha
+EDUMP_BINARIO = True    # tenta EDUMP_BIN (quadros de 20 bytes) antes do JSON
+
+# CONEXÃO: prontidão do firmware, reconexão e hot-plug
+PRONTO_TIMEOUT_S = 5.0      # espera máxima pelo boot do Arduino após abrir a porta
+PRONTO_SONDA_S = 0.5        # sem linha READY, sonda com STATUS a cada N segundos
+RECONEXAO_MIN_S = 0.2       # backoff da reconexão: dobra a cada falha até o máximo
+RECONEXAO_MAX_S = 5.0
+HOTPLUG_INTERVALO_S = 0.5   # varredura de listar_portas() pelo supervisor
+AUTO_CONECTAR = False       # conecta sozinho portas novas que aparecerem
+
+# UI: mudanças e mensagens são agrupadas por esta janela antes de ir às telas
+UI_AGRUPAR_S = 0.25
+UI_PORTA = 8080
+
+# BARRAMENTO DE EVENTOS (serial -> telas, simulador, auditoria)
+BARRAMENTO_CAPACIDADE = 200     # eventos guardados por assinante; cheio, descarta o mais antigo
+ARQ_AUDITORIA = "eventos.log"   # ok/err/log/... com data e hora (None desliga)
+
+# PERFIL SOB DEMANDA (perfil.py): só roda durante uma captura pedida na aba Conexão ou por
+# PONTO_PERFIL=<segundos> no ambiente; relatórios em export/perfil_*
+PERFIL_INTERVALO_MS = 5     # amostragem das pilhas de todas as threads
+
+# EXPORTAÇÃO: roda em processos separados, sem travar a interface
+EXPORT_PROCESSOS = None     # tamanho do pool (None = número de CPUs)
+
+# JOURNAL: compacta ao passar de N bytes ou de N segundos desde a última compactação
+JOURNAL_MAX_BYTES = 256 * 1024
+JOURNAL_MAX_SEGUNDOS = 600
+SHARDS_EM_MEMORIA = 3    # meses mantidos em memória (o mês atual nunca é descartado)
+
+# HORAS TRABALHADAS
+HORAS_MESES_EM_MEMORIA = 12     # meses com horas por dia/total mantidas (indices.HorasTrabalhadas)
+VIRADA_MAX_HORAS = 12   # batida após a meia-noite fecha o turno aberto da véspera se a entrada
+                        # dela foi há menos de N horas (turno noturno); 0 desliga
+
 # VARIAVEIS GLOBAIS
 funcionarios = {}
-registros = {}
+registros = {}          # só os meses carregados (ver repositorio.RepositorioJSON)
+repo = None             # repositorio.Repositorio ativo
 ultimas_batidas = {}
-serial_thread_obj = None
-serial_stop_flag = threading.Event()
-serial_port = None
-serial_pause_flag = threading.Event()
-serial_connected = False
-serial_queue = queue.Queue()    # ('ok'|'err'|'log'|'uid_captured', payload)
-PORTA_ATUAL = None
+decisao_lock = threading.Lock()     # anti-dupe/decisão compartilhados entre terminais
 last_export_path = None
 
 capture_uid_mode = False
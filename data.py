@@ -1,4 +1,5 @@
-import os, json
+import os, re, json, threading, time
+import metricas
 
 def carregar_json(path, default):
     if os.path.exists(path):
@@ -7,7 +8,261 @@ def carregar_json(path, default):
     return default
 
 def salvar_json(path, data):
+    t0 = time.perf_counter()
     tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+        tamanho = f.tell()
     os.replace(tmp, path)
+    metricas.json_segundos.observar(time.perf_counter() - t0)
+    metricas.json_bytes.observar(tamanho)
+
+
+# JOURNAL DE BATIDAS (APPEND-ONLY) + SHARDS MENSAIS
+# Cada batida vira uma linha JSON no journal; os shards registros/YYYY-MM.json
+# só são reescritos pelo compactador, e apenas os meses tocados pelo journal.
+#   {"uid":"AABBCCDD","data":"YYYY-MM-DD","ev":"entrada","hora":"HH:MM","term":"COM3"}
+#   {"op":"del_uid","uid":"AABBCCDD"}
+# registros/_indice.json guarda {mes: [datas]} para listar datas sem abrir os shards.
+_journal_lock = threading.Lock()
+_shard_lock = threading.Lock()      # compactação x leitura de shard + journal
+_SHARD_RE = re.compile(r'^(\d{4}-\d{2})\.json$')
+ARQ_INDICE = "_indice.json"
+
+def registro_batida(uid, data_iso, ev, hora, terminal=None):
+    rec = {"uid": uid, "data": data_iso, "ev": ev, "hora": hora}
+    if terminal:
+        rec["term"] = terminal
+    return rec
+
+def aplicar_registro(registros, rec):
+    """Aplica um registro do journal no dict de registros (idempotente)."""
+    if rec.get("op") == "del_uid":
+        registros.pop(rec.get("uid"), None)
+        return
+    registros.setdefault(rec["uid"], {}).setdefault(rec["data"], {})[rec["ev"]] = rec["hora"]
+
+def aplicar_copiando(registros, recs):
+    """
+    aplicar_registro sem alterar `registros`: devolve um dict novo em que só os
+    funcionários e dias tocados são cópias (o resto é compartilhado com o original).
+    """
+    novo = dict(registros)
+    copiados = set()
+    for rec in recs:
+        uid = rec.get("uid")
+        if rec.get("op") == "del_uid":
+            novo.pop(uid, None)
+            copiados.discard(uid)
+            continue
+        if uid not in copiados:
+            novo[uid] = dict(novo.get(uid, {}))
+            copiados.add(uid)
+        dias = novo[uid]
+        dias[rec["data"]] = {**dias.get(rec["data"], {}), rec["ev"]: rec["hora"]}
+    return novo
+
+def ler_journal(journal_path):
+    """Registros do journal em ordem; ignora a linha truncada por queda de energia."""
+    if not os.path.exists(journal_path):
+        return []
+    recs = []
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                recs.append(json.loads(linha))
+            except Exception:
+                continue
+    return recs
+
+def _journal_pendente(journal_path):
+    return ler_journal(journal_path + ".compactando") + ler_journal(journal_path)
+
+def caminho_shard(dir_reg, mes):
+    return os.path.join(dir_reg, f"{mes}.json")
+
+def meses_em_disco(dir_reg):
+    if not os.path.isdir(dir_reg):
+        return []
+    return sorted(m.group(1) for m in map(_SHARD_RE.match, os.listdir(dir_reg)) if m)
+
+def carregar_indice(dir_reg, journal_path):
+    """
+    {mes: set(datas)} do índice em disco + datas ainda só no journal. Com um del_uid no
+    journal, os meses são refeitos dos shards (as datas do uid apagado podem ter esvaziado).
+    """
+    indice = {m: set(ds) for m, ds in carregar_json(os.path.join(dir_reg, ARQ_INDICE), {}).items()}
+    with _shard_lock:
+        recs = _journal_pendente(journal_path)
+        if any(rec.get("op") == "del_uid" for rec in recs):
+            meses = set(indice) | set(meses_em_disco(dir_reg))
+            meses.update(r["data"][:7] for r in recs if r.get("op") != "del_uid")
+            indice = {}
+            for mes in meses:
+                shard = carregar_json(caminho_shard(dir_reg, mes), {})
+                for rec in recs:
+                    if rec.get("op") == "del_uid" or rec["data"][:7] == mes:
+                        aplicar_registro(shard, rec)
+                datas = {d for dias in shard.values() for d in dias}
+                if datas:
+                    indice[mes] = datas
+            return indice
+    for rec in recs:
+        if rec.get("op") != "del_uid":
+            indice.setdefault(rec["data"][:7], set()).add(rec["data"])
+    return indice
+
+def carregar_meses(dir_reg, journal_path, meses):
+    """Reconstrói {uid: {data: dia}} só dos meses pedidos: shards + journal filtrado."""
+    meses = set(meses)
+    registros = {}
+    with _shard_lock:
+        for mes in meses:
+            for uid, dias in carregar_json(caminho_shard(dir_reg, mes), {}).items():
+                registros.setdefault(uid, {}).update(dias)
+        recs = _journal_pendente(journal_path)
+    for rec in recs:
+        if rec.get("op") == "del_uid" or rec["data"][:7] in meses:
+            aplicar_registro(registros, rec)
+    return registros
+
+def anexar_journal(journal_path, recs):
+    """Anexa os registros ao journal com um único flush/fsync."""
+    if not recs:
+        return
+    buf = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in recs).encode("utf-8")
+    t0 = time.perf_counter()
+    with _journal_lock:
+        with open(journal_path, "ab") as f:
+            f.write(buf)
+            f.flush()
+            os.fsync(f.fileno())
+    metricas.journal_segundos.observar(time.perf_counter() - t0)
+    metricas.journal_bytes.observar(len(buf))
+
+def compactar(dir_reg, journal_path):
+    """
+    Dobra o journal nos shards dos meses que ele toca.
+    O journal é renomeado sob lock (novas batidas já vão para um arquivo novo) e os
+    shards são refeitos a partir dos arquivos, sem tocar no dict em memória.
+    Se cair no meio, o `.compactando` é reaplicado depois (reaplicar é inofensivo).
+    """
+    rotacionado = journal_path + ".compactando"
+    with _journal_lock:
+        if not os.path.exists(rotacionado):
+            if not os.path.exists(journal_path) or os.path.getsize(journal_path) == 0:
+                return False
+            os.replace(journal_path, rotacionado)
+    with _shard_lock:
+        recs = ler_journal(rotacionado)
+        if any(r.get("op") == "del_uid" for r in recs):
+            tocados = set(meses_em_disco(dir_reg))
+        else:
+            tocados = set()
+        tocados.update(r["data"][:7] for r in recs if r.get("op") != "del_uid")
+
+        os.makedirs(dir_reg, exist_ok=True)
+        arq_indice = os.path.join(dir_reg, ARQ_INDICE)
+        indice = carregar_json(arq_indice, {})
+        for mes in sorted(tocados):
+            shard = carregar_json(caminho_shard(dir_reg, mes), {})
+            for rec in recs:
+                if rec.get("op") == "del_uid" or rec["data"][:7] == mes:
+                    aplicar_registro(shard, rec)
+            salvar_json(caminho_shard(dir_reg, mes), shard)
+            datas = sorted({d for dias in shard.values() for d in dias})
+            if datas:
+                indice[mes] = datas
+            else:
+                indice.pop(mes, None)       # mês esvaziado por um del_uid
+        salvar_json(arq_indice, indice)
+        os.remove(rotacionado)
+    return True
+
+def precisa_migrar(arq_reg, dir_reg):
+    """Os registros ainda estão no registros.json antigo (tudo em um arquivo)."""
+    return not os.path.isdir(dir_reg) and os.path.exists(arq_reg)
+
+def migrar_arquivo_unico(arq_reg, dir_reg):
+    """Divide o registros.json antigo (tudo em um arquivo) em shards mensais, uma única vez."""
+    if not precisa_migrar(arq_reg, dir_reg):
+        return False
+    registros = carregar_json(arq_reg, {})
+    shards = {}
+    for uid, dias in registros.items():
+        for data_iso, dia in dias.items():
+            shards.setdefault(data_iso[:7], {}).setdefault(uid, {})[data_iso] = dia
+    os.makedirs(dir_reg, exist_ok=True)
+    for mes, shard in shards.items():
+        salvar_json(caminho_shard(dir_reg, mes), shard)
+    salvar_json(os.path.join(dir_reg, ARQ_INDICE),
+                {mes: sorted({d for dias in shard.values() for d in dias}) for mes, shard in shards.items()})
+    os.replace(arq_reg, arq_reg + ".migrado")
+    return True
+
+def iniciar_compactador(dir_reg, journal_path, max_bytes, max_segundos, stop_flag=None, intervalo=5.0):
+    """Thread em segundo plano que compacta ao passar do limite de tamanho ou de tempo."""
+    stop_flag = stop_flag or threading.Event()
+
+    def _loop():
+        ultima = time.time()
+        while not stop_flag.wait(intervalo):
+            try:
+                tam = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+                if tam and (tam >= max_bytes or time.time() - ultima >= max_segundos):
+                    compactar(dir_reg, journal_path)
+                    ultima = time.time()
+            except Exception as e:
+                print(f"[WARN] Falha ao compactar journal: {e}")
+
+    t = threading.Thread(target=_loop, daemon=True)
+    t.start()
+    return t
+
+
+# CURSOR DE SINCRONIZAÇÃO: próximo seq da EEPROM ainda não aplicado, por id da placa
+# (gravado no header da EEPROM; a porta muda quando se troca o cabo ou a placa de lugar)
+_cursor_lock = threading.Lock()
+
+def ler_cursor(path, placa):
+    with _cursor_lock:
+        return carregar_json(path, {}).get(placa, 0)
+
+def salvar_cursor(path, placa, proximo):
+    with _cursor_lock:
+        cursores = carregar_json(path, {})
+        cursores[placa] = proximo
+        salvar_json(path, cursores)
+
+
+# TRAVA ENTRE PROCESSOS: o serve a segura enquanto roda; import-dump e migrate, que
+# escrevem no journal e no cursor, só rodam se a conseguirem. flock/msvcrt somem com o
+# processo, então um serve derrubado não deixa trava velha para trás.
+_travas = {}
+
+def travar(path):
+    """Tenta a trava exclusiva de `path` sem esperar; False se outro processo a tem."""
+    if path in _travas:
+        return True
+    f = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _travas[path] = f
+    return True
+
+def destravar(path):
+    f = _travas.pop(path, None)
+    if f is not None:
+        f.close()       # fechar solta a trava (flock e msvcrt)
@@ -0,0 +1,120 @@
+import time, threading
+import config
+import metricas
+
+# DIFUSÃO DE MUDANÇAS PARA AS TELAS
+# Cada cliente (aba do navegador) se inscreve com um callback; as mudanças de batidas
+# (vindas de IndicesBatidas.ouvintes) e as mensagens do barramento.eventos (assinante
+# "telas", buffer limitado) são agrupadas por uma janela curta e entregues no loop do
+# NiceGUI, sem polling. Sem o loop (antes do startup) nada cresce sem limite: o buffer
+# descarta as mensagens mais antigas e, acima de `limite_batidas` batidas numa janela,
+# o lote vira um redesenho completo.
+class Difusor:
+    """
+    O callback recebe um lote (dict):
+      - 'batidas': [(uid, data_iso, evento, hora)] que mudaram (a última hora vale)
+      - 'completo': True se algo exige redesenhar tudo (registros de um UID apagados)
+      - 'funcionarios': True se o cadastro mudou
+      - 'mensagens': [barramento.Evento] em ordem, desempacotáveis como (kind, payload)
+        ('update_data' não entra: as batidas já chegam em 'batidas'); `vezes` > 1 quando
+        repetições foram agrupadas
+      - 'descartados': mensagens perdidas por buffer cheio desde a última entrega
+    Um EDUMP de 300 registros gera uma entrega por janela, não 300.
+    """
+    TIPOS = ("ok", "err", "uid_captured", "exportacao")
+
+    def __init__(self, janela_s=0.25, limite_batidas=500):
+        self.janela_s = janela_s
+        self.limite_batidas = limite_batidas
+        self.loop = None
+        self._eventos = None
+        self._descartados = 0
+        self._lock = threading.Lock()
+        self._assinantes = {}
+        self._proximo_id = 0
+        self._agendado = False
+        self._novo_lote()
+
+    def _novo_lote(self):
+        self._batidas = {}
+        self._completo = False
+        self._funcionarios = False
+
+    def iniciar(self, loop):
+        """Chamado no startup do NiceGUI com o loop dele."""
+        self.loop = loop
+        with self._lock:
+            pendente = self._tem_pendente()
+        if pendente:
+            self._agendar()
+
+    def assinar(self, callback):
+        with self._lock:
+            self._proximo_id += 1
+            self._assinantes[self._proximo_id] = callback
+            return self._proximo_id
+
+    def cancelar(self, token):
+        with self._lock:
+            self._assinantes.pop(token, None)
+
+    # ---- publicação (qualquer thread) ----
+    def publicar_mudancas(self, recs):
+        with self._lock:
+            for rec in recs:
+                op = rec.get("op")
+                if op == "del_uid":
+                    self._completo = True
+                elif op == "funcionarios":
+                    self._funcionarios = True
+                elif not self._completo:
+                    self._batidas[(rec["uid"], rec["data"], rec["ev"])] = rec["hora"]
+            if len(self._batidas) > self.limite_batidas:
+                self._batidas = {}
+                self._completo = True
+        self._agendar()
+
+    def ligar_barramento(self, barramento):
+        """Assina as mensagens que as telas mostram; cada publicação agenda uma entrega."""
+        self._eventos = barramento.assinar("telas", tipos=self.TIPOS, avisar=self._agendar)
+
+    # ---- entrega (loop do NiceGUI) ----
+    def _tem_pendente(self):
+        return bool(self._batidas or self._completo or self._funcionarios
+                    or (self._eventos is not None and self._eventos.pendentes()))
+
+    def _agendar(self):
+        loop = self.loop
+        if loop is None:
+            return      # antes do startup: fica acumulado até iniciar()
+        with self._lock:
+            if self._agendado:
+                return
+            self._agendado = True
+        loop.call_soon_threadsafe(loop.call_later, self.janela_s, self._entregar)
+
+    def _entregar(self):
+        t0 = time.perf_counter()
+        with self._lock:
+            mensagens, descartados = [], 0
+            if self._eventos is not None:
+                mensagens = self._eventos.drenar()
+                descartados, self._descartados = self._eventos.descartados - self._descartados, self._eventos.descartados
+            lote = {
+                'batidas': [(uid, d, ev, hora) for (uid, d, ev), hora in self._batidas.items()],
+                'completo': self._completo,
+                'funcionarios': self._funcionarios,
+                'mensagens': mensagens,
+                'descartados': descartados,
+            }
+            self._novo_lote()
+            self._agendado = False
+            assinantes = list(self._assinantes.values())
+        for callback in assinantes:
+            try:
+                callback(lote)
+            except Exception as e:
+                print(f"[WARN] Falha ao atualizar cliente: {e}")
+        metricas.entrega_segundos.observar(time.perf_counter() - t0)
+
+difusor = Difusor(config.UI_AGRUPAR_S)
@@ -1,191 +1,554 @@
-import os
-from datetime import datetime, timedelta
+import os, json, time, shutil, zipfile, hashlib, calendar, tempfile, threading
+from datetime import datetime, date, timedelta
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+import config
+from minutos import BatidasMinutos, hhmm, fracao_dia
 
-# HELPERS PARA EXPORTAÇÃO EXCEL (SEM ALTERAÇÃO)
-def _parse_hhmm(s):
-    try:
-        return datetime.strptime(s, "%H:%M").time()
-    except Exception:
-        return None
-
+# HELPERS PARA EXPORTAÇÃO EXCEL
 def calcular_horas_dia_excel(dia: dict) -> float:
     """
     Calcula horas do dia em FRAÇÃO DE DIA (padrão Excel):
     (saida - entrada) - (volta_intervalo - saida_intervalo)
     """
-    e = _parse_hhmm(dia.get('entrada', ''))
-    s = _parse_hhmm(dia.get('saida', ''))
-    if not (e and s):
-        return 0.0
-    si = _parse_hhmm(dia.get('saida_intervalo', ''))
-    vi = _parse_hhmm(dia.get('volta_intervalo', ''))
+    return fracao_dia(BatidasMinutos.de_dias({"0001-01-01": dia}, "0001-01-01", 1).trabalhados()[0])
+
+def _compactar(registros, uids, calendario):
+    """
+    {uid: BatidasMinutos} exatamente nos dias do calendário; `registros` pode vir como
+    {uid: {data_iso: dia}} ou já em minutos (repositorio.minutos_do_periodo).
+    """
+    inicio, n_dias = calendario[0][0], len(calendario)
+    saida = {}
+    for uid in uids:
+        batidas = registros.get(uid)
+        if isinstance(batidas, BatidasMinutos):
+            saida[uid] = batidas.fatia(inicio, n_dias)
+        else:
+            saida[uid] = BatidasMinutos.de_dias(batidas or {}, inicio, n_dias)
+    return saida
+
+
+class ExportacaoCancelada(Exception):
+    """O callback de progresso pediu para parar; nenhum arquivo é gerado."""
+
+
+# ESTILOS NOMEADOS
+# Registrados uma vez no workbook; cada célula só guarda o nome (um único xf por estilo
+# no styles.xml), em vez de receber fill/font/alignment/border objeto a objeto.
+_HORAS = "[h]:mm"
+COLS_FUNC = ["Data", "Dia", "Entrada", "Saída Intervalo", "Volta Intervalo", "Saída", "Horas"]
+LARGURAS_FUNC = [11, 6, 10, 16, 16, 10, 9]
+COLS_RESUMO = ["Funcionário", "UID", "Total Horas"]
+LARGURAS_RESUMO = [36, 20, 12]
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+def _registrar_estilos(wb):
+    thin = Side(style="thin", color="CCCCCC")
+    borda = Border(left=thin, right=thin, top=thin, bottom=thin)
+    centro = Alignment(horizontal="center", vertical="center")
+    direita = Alignment(horizontal="right", vertical="center")
+    negrito = Font(bold=True)
+    for estilo in (
+        NamedStyle("ponto_cabecalho", fill=PatternFill("solid", fgColor="1F4E78"),
+                   font=Font(bold=True, color="FFFFFF"), alignment=centro, border=borda),
+        NamedStyle("ponto_celula", alignment=centro, border=borda),
+        NamedStyle("ponto_horas", alignment=direita, border=borda, number_format=_HORAS),
+        NamedStyle("ponto_borda", border=borda),
+        NamedStyle("ponto_total_rotulo", font=negrito, border=borda),
+        NamedStyle("ponto_total_horas", font=negrito, alignment=direita, border=borda, number_format=_HORAS),
+        NamedStyle("ponto_resumo_horas", alignment=centro, border=borda, number_format=_HORAS),
+    ):
+        wb.add_named_style(estilo)
+
+def _fixar_ids_estilos(ws):
+    """
+    Registra os estilos das células sempre na mesma ordem (ids 1..N no styles.xml), para o
+    XML de uma aba valer em qualquer workbook desta versão (ver CACHE DE EXPORTAÇÃO).
+    """
+    for nome in ws.parent.named_styles:
+        if nome.startswith("ponto_"):
+            c = WriteOnlyCell(ws)
+            c.style = nome
+            c.style_id      # a propriedade registra o estilo no workbook
+
+
+# GERADORES DE LINHAS
+def calendario_periodo(inicio: str, fim: str):
+    """[(data_iso, data_br, dia_semana)] de cada dia entre inicio e fim (ISO, inclusivo)."""
+    try:
+        d, d_fim = date.fromisoformat(inicio), date.fromisoformat(fim)
+    except (TypeError, ValueError):
+        raise ValueError("Use datas no formato YYYY-MM-DD (ex.: 2025-01-31)")
+    if d_fim < d:
+        raise ValueError("A data final é anterior à inicial.")
+    dias = []
+    while d <= d_fim:
+        dias.append((d.isoformat(), d.strftime("%d/%m/%Y"), DIAS_SEMANA[d.weekday()]))
+        d += timedelta(days=1)
+    return dias
+
+def calendario_mes(ano_mes: str):
+    """[(data_iso, data_br, dia_semana)] de todos os dias do mês (compartilhado entre as abas)."""
+    try:
+        ano, mes = int(ano_mes[:4]), int(ano_mes[5:])
+        n_dias = calendar.monthrange(ano, mes)[1]
+    except ValueError:
+        raise ValueError("Formato de data YYYY-MM inválido.")
+    return calendario_periodo(f"{ano:04d}-{mes:02d}-01", f"{ano:04d}-{mes:02d}-{n_dias:02d}")
+
+def linhas_funcionario(batidas, calendario, trabalhados=None):
+    """
+    Gera uma linha de valores por dia do calendário a partir de um BatidasMinutos dos mesmos
+    dias (a última coluna é a fração de dia trabalhada).
+    """
+    if trabalhados is None:
+        trabalhados = batidas.trabalhados()
+    v = batidas.valores
+    n = len(config.EVENTOS)     # colunas Entrada..Saída na ordem de config.EVENTOS
+    for i, (_data_iso, data_br, dia_semana) in enumerate(calendario):
+        yield [data_br, dia_semana, *map(hhmm, v[i * n:(i + 1) * n]), fracao_dia(trabalhados[i])]
+
+class _Estampa:
+    """
+    Células de escrita com estilo fixo por coluna, reaproveitadas linha a linha: no modo
+    write-only cada append() serializa a linha na hora, então trocar só o valor basta.
+    """
+    def __init__(self, ws, estilos):
+        self.celulas = []
+        for estilo in estilos:
+            c = WriteOnlyCell(ws)
+            c.style = estilo
+            self.celulas.append(c)
+
+    def __call__(self, valores):
+        for c, v in zip(self.celulas, valores):
+            c.value = v
+        return self.celulas
+
+def _preparar_aba(ws, larguras):
+    """Larguras e painel congelado precisam existir antes da primeira linha (write-only)."""
+    for i, w in enumerate(larguras, 1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+    ws.freeze_panes = "A2"
+
+# XML TEMPORÁRIO DAS ABAS WRITE-ONLY
+# O cache e os lotes do relatório de período leem e trocam o arquivo em que o openpyxl
+# escreve uma aba write-only. Ele não expõe esse arquivo: é ws._writer.out, apagado com
+# ws._writer.cleanup(), interno e conferido só nas versões de OPENPYXL_TESTADO
+# (requirements.txt fixa uma delas). Todo acesso passa pelas funções abaixo; se a versão
+# for outra ou o atributo sumir, xml_direto() é False e as exportações geram todas as
+# abas normalmente (sem reaproveitar abas do cache nem gerar em lotes).
+OPENPYXL_TESTADO = ((3, 1),)
+_xml_direto = None
+
+def xml_direto():
+    """True se o arquivo temporário das abas write-only pode ser usado (conferido uma vez)."""
+    global _xml_direto
+    if _xml_direto is None:
+        _xml_direto = _conferir_xml_direto()
+    return _xml_direto
+
+def _conferir_xml_direto():
+    import openpyxl
+    try:
+        versao = tuple(int(p) for p in openpyxl.__version__.split(".")[:2])
+    except ValueError:
+        return False
+    if versao not in OPENPYXL_TESTADO:
+        return False
+    try:
+        ws = Workbook(write_only=True).create_sheet()
+        ws.close()
+        ok = os.path.isfile(ws._writer.out) and callable(ws._writer.cleanup)
+        ws._writer.cleanup()
+        return ok
+    except Exception:
+        return False
+
+def _arquivo_xml(ws):
+    """Arquivo temporário com o XML da aba (None se ela ainda não começou a ser escrita)."""
+    writer = getattr(ws, "_writer", None)
+    return getattr(writer, "out", None)
+
+def _apagar_xml(ws):
+    ws._writer.cleanup()
+
+def _descartar(wb):
+    """Apaga os XML temporários das abas write-only de uma exportação abortada."""
+    if not xml_direto():
+        return      # sem acesso ao arquivo: fica para o openpyxl apagar ao sair
+    for ws in wb.worksheets:
+        arq = _arquivo_xml(ws)
+        if arq is None:
+            continue
+        if not ws.closed:
+            ws.close()
+        try:
+            os.remove(arq)
+        except OSError:
+            pass
+
+# CACHE DE EXPORTAÇÃO
+# export/.cache/<YYYY-MM>.json guarda, para o último arquivo gerado do mês, a chave do
+# conteúdo (versão do formato + cadastro + batidas do mês) e, para cada aba de funcionário,
+# a chave das batidas dele -> (membro no zip, total de horas). Se a chave do mês bate e o
+# arquivo não foi mexido, ele é devolvido sem gerar nada; senão, as abas com chave conhecida
+# são copiadas do arquivo anterior (o XML delas só depende das batidas: nome e título ficam
+# no workbook.xml, strings são inline e os ids de estilo são fixos) e só as outras são geradas.
+FORMATO_EXPORT = 3      # mude ao alterar layout/estilos: invalida o cache
+DIR_CACHE = os.path.join("export", ".cache")
+
+def _chave(*partes):
+    return hashlib.blake2b(json.dumps(partes, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+def _chave_aba(ano_mes, batidas):
+    return _chave(FORMATO_EXPORT, ano_mes, batidas.chave().hex())
+
+def _manifesto_valido(man, caminho):
+    try:
+        st = os.stat(caminho)
+    except OSError:
+        return False
+    return man.get("formato") == FORMATO_EXPORT and [st.st_size, st.st_mtime_ns] == man.get("arquivo")
+
+def _ler_manifesto(ano_mes, caminho):
+    """Manifesto do mês, se o arquivo ainda é exatamente o que ele descreve."""
+    try:
+        with open(os.path.join(DIR_CACHE, f"{ano_mes}.json"), encoding="utf-8") as f:
+            man = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return man if _manifesto_valido(man, caminho) else None
 
-    base = (datetime.combine(datetime.today(), s) -
-            datetime.combine(datetime.today(), e))
-    if si and vi:
-        base -= (datetime.combine(datetime.today(), vi) -
-                 datetime.combine(datetime.today(), si))
-    secs = max(0, base.total_seconds())
-    return secs / 86400.0
+def _gravar_manifesto(ano_mes, caminho, chave, abas):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    st = os.stat(caminho)
+    man = {"formato": FORMATO_EXPORT, "chave": chave, "caminho": caminho, "arquivo": [st.st_size, st.st_mtime_ns],
+           "gerado": time.time(), "abas": abas}
+    arq = os.path.join(DIR_CACHE, f"{ano_mes}.json")
+    tmp = f"{arq}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(man, f)
+    os.replace(tmp, arq)
+    _varrer_cache()
 
+def _varrer_cache():
+    """Apaga manifestos velhos: formato antigo, arquivo apagado ou alterado fora daqui."""
+    for nome in os.listdir(DIR_CACHE):
+        arq = os.path.join(DIR_CACHE, nome)
+        if not nome.endswith(".json"):
+            continue
+        try:
+            with open(arq, encoding="utf-8") as f:
+                man = json.load(f)
+        except (OSError, ValueError):
+            man = {}
+        if not _manifesto_valido(man, man.get("caminho", "")):
+            try:
+                os.remove(arq)
+            except OSError:
+                pass
+
+def _aba_pronta(ws, xml, n_linhas):
+    """Aba write-only cujo XML já existe: fecha vazia e troca o arquivo temporário."""
+    ws.auto_filter.ref = f"A1:G{n_linhas}"     # o workbook.xml também referencia o filtro
+    ws.close()
+    with open(_arquivo_xml(ws), "wb") as f:
+        f.write(xml)
+
+
+def _salvar(wb, caminho, escrever):
+    """Roda escrever() e grava o workbook em `caminho` só se tudo deu certo; devolve o retorno dela."""
+    tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        r = escrever()
+        wb.save(tmp)
+    except BaseException:
+        _descartar(wb)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, caminho)
+    return r
+
+class _Resumo:
+    """Aba 'Resumo' (a primeira): total de horas por funcionário."""
+    def __init__(self, wb):
+        self.ws = wb.create_sheet("Resumo")
+        _preparar_aba(self.ws, LARGURAS_RESUMO)
+        _fixar_ids_estilos(self.ws)
+        self.ws.append(_Estampa(self.ws, ["ponto_cabecalho"] * 3)(COLS_RESUMO))
+        self._linha = _Estampa(self.ws, ["ponto_celula", "ponto_celula", "ponto_resumo_horas"])
+        self.n = 1
+
+    def adicionar(self, nome, uid, total_horas):
+        self.ws.append(self._linha([nome, uid, total_horas]))
+        self.n += 1
 
-def exportar_mes_xlsx(ano_mes: str, funcionarios: dict, registros: dict, eventos: list[str]) -> str:
+    def fechar(self, rotulo):
+        if self.n == 1:
+            self.ws.append(["Sem registros para", rotulo])
+            self.n += 1
+        self.ws.auto_filter.ref = f"A1:C{self.n}"
+
+def _titulo_aba(nome, uid):
+    title_base = nome.strip().replace("/", "-").replace("\\", "-").replace(":", "-")
+    return title_base[:31] if title_base else uid[:8]
+
+
+def exportar_mes_xlsx(ano_mes: str, funcionarios: dict, registros: dict, eventos: list[str],
+                      progresso=None, usar_cache=True) -> str:
     """
     Gera export/<MM-YYYY>_registros.xlsx
     - Uma aba por funcionário (com dados do mês)
     - Aba 'Resumo' com total de horas por funcionário
+    `progresso(feitos, total)` é chamado a cada funcionário; se devolver False a exportação
+    para com ExportacaoCancelada. O arquivo só aparece no caminho final quando completo.
+    Com `usar_cache`, um mês sem mudanças não é gerado de novo (ver CACHE DE EXPORTAÇÃO).
+    `registros` = {uid: {data_iso: dia}} ou {uid: minutos.BatidasMinutos}.
     Retorna caminho do arquivo gerado.
     """
     if len(ano_mes) != 7 or ano_mes[4] != "-":
         raise ValueError("Use o formato YYYY-MM (ex.: 2025-11)")
+    calendario = calendario_mes(ano_mes)
 
     os.makedirs("export", exist_ok=True)
     nome_arq = f"Registros_{datetime.strptime(ano_mes, '%Y-%m').strftime('%m-%Y')}.xlsx"
     caminho = os.path.join("export", nome_arq)
 
-    wb = Workbook()
+    batidas = _compactar(registros, funcionarios, calendario)
+    chaves = {uid: _chave_aba(ano_mes, b) for uid, b in batidas.items()}
+    chave = _chave(FORMATO_EXPORT, ano_mes, sorted(funcionarios.items()), sorted(chaves.items()))
+    anterior = _ler_manifesto(ano_mes, caminho) if usar_cache else None
+    if anterior and anterior["chave"] == chave:
+        if progresso:
+            progresso(len(funcionarios), len(funcionarios))
+        return caminho
 
-    header_fill = PatternFill("solid", fgColor="1F4E78")
-    header_font = Font(bold=True, color="FFFFFF")
-    center = Alignment(horizontal="center", vertical="center")
-    right = Alignment(horizontal="right", vertical="center")
-    thin = Side(style="thin", color="CCCCCC")
-    border_thin = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    totais_func = []
-    created_any = False
+    # write-only: cada aba vai para um arquivo temporário à medida que as linhas chegam,
+    # então a memória não cresce com o número de funcionários.
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb)
 
+    cache = anterior["abas"] if anterior and xml_direto() else {}
+    zip_anterior = zipfile.ZipFile(caminho) if cache else None
     try:
-        ano = int(ano_mes[:4])
-        mes = int(ano_mes[5:])
-        dt_inicio = datetime(ano, mes, 1)
-        
-        if mes == 12:
-            dt_fim = datetime(ano + 1, 1, 1) - timedelta(days=1)
+        abas = _salvar(wb, caminho, lambda: _escrever_abas(
+            wb, ano_mes, calendario, funcionarios, batidas, chaves, progresso, cache, zip_anterior))
+    finally:
+        if zip_anterior:
+            zip_anterior.close()
+    if usar_cache:
+        # ws.path só é definido no save(): é o membro do zip onde a aba ficou
+        _gravar_manifesto(ano_mes, caminho, chave, {k: [ws.path[1:], total] for k, (ws, total) in abas.items()})
+    return caminho
+
+
+def _escrever_abas(wb, ano_mes, calendario, funcionarios, batidas, chaves, progresso, cache, zip_cache):
+    """
+    Escreve Resumo + uma aba por funcionário (`batidas` = {uid: BatidasMinutos} nos dias do
+    calendário); devolve {chave da aba: (ws, total de horas)}.
+    """
+    resumo = _Resumo(wb)
+    abas = {}
+    direto = xml_direto()
+
+    ordem = sorted(funcionarios.items(), key=lambda x: x[1].lower())
+    if progresso and progresso(0, len(ordem)) is False:
+        raise ExportacaoCancelada(ano_mes)
+    for feitos, (uid, nome) in enumerate(ordem, 1):
+        ws = wb.create_sheet(title=_titulo_aba(nome, uid))
+        chave = chaves[uid]
+        if direto and chave in abas:    # mesmas batidas de outra aba deste arquivo (ex.: mês vazio)
+            feita, total_horas = abas[chave]
+            with open(_arquivo_xml(feita), "rb") as f:
+                _aba_pronta(ws, f.read(), len(calendario) + 2)
+        elif chave in cache:        # aba igual no arquivo anterior
+            membro, total_horas = cache[chave]
+            _aba_pronta(ws, zip_cache.read(membro), len(calendario) + 2)
+            abas[chave] = (ws, total_horas)
         else:
-            dt_fim = datetime(ano, mes + 1, 1) - timedelta(days=1)
-            
-    except ValueError:
-        raise ValueError("Formato de data YYYY-MM inválido.")
+            total_horas = _escrever_aba(ws, batidas[uid], calendario)
+            abas[chave] = (ws, total_horas)
 
+        resumo.adicionar(nome, uid, total_horas)
+        if progresso and progresso(feitos, len(ordem)) is False:
+            raise ExportacaoCancelada(ano_mes)
 
-    for uid, nome in sorted(funcionarios.items(), key=lambda x: x[1].lower()):
-        dias_mes = {d: dia for d, dia in (registros.get(uid, {}) or {}).items()
-                    if d.startswith(ano_mes)}
-        
-        # Se não há registros, não precisa mais do 'continue'
-        # if not dias_mes:
-        #     continue
-
-        created_any = True
-        title_base = nome.strip().replace("/", "-").replace("\\", "-").replace(":", "-")
-        title = title_base[:31] if title_base else uid[:8]
-        ws = wb.create_sheet(title=title)
-
-        cols = ["Data", "Dia", "Entrada", "Saída Intervalo", "Volta Intervalo", "Saída", "Horas"]
-        ws.append(cols)
-        for col_idx in range(1, len(cols)+1):
-            c = ws.cell(row=1, column=col_idx)
-            c.fill = header_fill
-            c.font = header_font
-            c.alignment = center
-            c.border = border_thin
-
-        total_horas = 0.0
-        
-        current_date = dt_inicio
-        while current_date <= dt_fim:
-            data_str = current_date.strftime("%Y-%m-%d")
-            
-            dia = dias_mes.get(data_str, {})
-            
-            try:
-                dt = current_date
-                dia_semana = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"][dt.weekday()]
-            except Exception:
-                dia_semana = ""
-                
-            data_br = current_date.strftime("%d/%m/%Y")
-            
-            row = [
-                data_br,
-                dia_semana,
-                dia.get("entrada", ""),
-                dia.get("saida_intervalo", ""),
-                dia.get("volta_intervalo", ""),
-                dia.get("saida", ""),
-                None,
-            ]
-            ws.append(row)
-
-            r = ws.max_row
-            horas_frac = calcular_horas_dia_excel(dia)
-            total_horas += horas_frac
-            c = ws.cell(row=r, column=7, value=horas_frac)
-            c.number_format = "[h]:mm"
-            c.alignment = right
-            c.border = border_thin
-
-            for col in range(1, 7):
-                cell = ws.cell(row=r, column=col)
-                cell.alignment = center
-                cell.border = border_thin
-                
-            current_date += timedelta(days=1)
-
-        ws.append(["", "", "", "", "TOTAL", "", total_horas])
-        r = ws.max_row
-        ws.cell(row=r, column=5).font = Font(bold=True)
-        tc = ws.cell(row=r, column=7)
-        tc.number_format = "[h]:mm"
-        tc.font = Font(bold=True)
-        tc.alignment = right
-        for col in range(1, 8):
-            ws.cell(row=r, column=col).border = border_thin
-
-        widths = [11, 6, 10, 16, 16, 10, 9]
-        for i, w in enumerate(widths, 1):
-            ws.column_dimensions[get_column_letter(i)].width = w
-
-        ws.freeze_panes = "A2"
-        ws.auto_filter.ref = f"A1:G{ws.max_row}"
-
-        totais_func.append((nome, uid, total_horas))
-
-    if "Sheet" in wb.sheetnames and not created_any:
-        ws = wb["Sheet"]
-        ws.title = "Resumo"
-        ws.append(["Sem registros para", ano_mes])
+    resumo.fechar(ano_mes)
+    return abas
+
+
+def _escrever_aba(ws, batidas, calendario):
+    """Gera a aba de um funcionário; devolve o total de horas (fração de dia)."""
+    trabalhados = batidas.trabalhados()
+    _preparar_aba(ws, LARGURAS_FUNC)
+    ws.append(_Estampa(ws, ["ponto_cabecalho"] * 7)(COLS_FUNC))
+    linha = _Estampa(ws, ["ponto_celula"] * 6 + ["ponto_horas"])
+
+    for valores in linhas_funcionario(batidas, calendario, trabalhados):
+        ws.append(linha(valores))
+    total_horas = fracao_dia(sum(trabalhados))
+
+    total = _Estampa(ws, ["ponto_borda"] * 4 + ["ponto_total_rotulo", "ponto_borda", "ponto_total_horas"])
+    ws.append(total(["", "", "", "", "TOTAL", "", total_horas]))
+    ws.auto_filter.ref = f"A1:G{len(calendario) + 2}"
+    ws.close()      # fecha o XML da aba agora; o save() só junta os arquivos no zip
+    return total_horas
+
+
+# RELATÓRIO DE PERÍODO (vários meses / intervalo de datas)
+# As abas de funcionário são geradas em lotes independentes (gerar_abas), que podem rodar
+# em processos diferentes: cada lote escreve o XML das suas abas em arquivos e devolve os
+# totais. Depois montar_xlsx junta os XML prontos num workbook (mesmo truque do cache).
+LOTE_ABAS = 50      # funcionários por tarefa
+
+def gerar_abas(calendario, pasta, itens):
+    """
+    XML das abas de funcionário, fora de um workbook final (pode rodar em outro processo):
+    `itens` = [(nome_arquivo, BatidasMinutos)] -> [(caminho_xml, total de horas)]. Abas com
+    as mesmas batidas são geradas uma vez só.
+    """
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb)
+    _fixar_ids_estilos(wb.create_sheet())
+    feitas = {}
+    saida = []
+    for nome_arq, batidas in itens:
+        chave = batidas.chave()
+        if chave not in feitas:
+            ws = wb.create_sheet()
+            total_horas = _escrever_aba(ws, batidas, calendario)
+            destino = os.path.join(pasta, nome_arq)
+            shutil.copyfile(_arquivo_xml(ws), destino)
+            _apagar_xml(ws)
+            feitas[chave] = (destino, total_horas)
+        saida.append(feitas[chave])
+    return saida
+
+def montar_xlsx(caminho, rotulo, n_linhas, abas):
+    """
+    Junta abas já geradas por gerar_abas num .xlsx com Resumo (layout de exportar_mes_xlsx):
+    `abas` = [(uid, nome, caminho_xml, total de horas)] na ordem das abas.
+    """
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb)
+
+    def escrever():
+        resumo = _Resumo(wb)
+        for uid, nome, arq, total_horas in abas:
+            ws = wb.create_sheet(title=_titulo_aba(nome, uid))
+            with open(arq, "rb") as f:
+                _aba_pronta(ws, f.read(), n_linhas)
+            resumo.adicionar(nome, uid, total_horas)
+        resumo.fechar(rotulo)
+
+    _salvar(wb, caminho, escrever)
+    return caminho
+
+def _coletar(resultados, seguir, rotulo):
+    """Lista os resultados de mapear(); se seguir(resultado) der False, para com ExportacaoCancelada."""
+    saida = []
+    try:
+        for r in resultados:
+            saida.append(r)
+            if not seguir(r):
+                raise ExportacaoCancelada(rotulo)
+    finally:
+        if hasattr(resultados, "close"):
+            resultados.close()      # Executor.map: cancela as tarefas que nem começaram
+    return saida
+
+def _escrever_direto(destino, rotulo, calendario, funcionarios, registros, seguir):
+    """Um bloco do período escrito em série direto no workbook final (sem lotes)."""
+    batidas = _compactar(registros, funcionarios, calendario)
+    chaves = {uid: b.chave() for uid, b in batidas.items()}
+    wb = Workbook(write_only=True)
+    _registrar_estilos(wb)
+    _salvar(wb, destino, lambda: _escrever_abas(wb, rotulo, calendario, funcionarios, batidas, chaves,
+                                                lambda feitos, _total: seguir(1 if feitos else 0), {}, None))
+    return destino
+
+def exportar_periodo_xlsx(inicio: str, fim: str, funcionarios: dict, registros: dict, eventos: list[str],
+                          uids=None, mensal=False, mapear=None, progresso=None, lote=LOTE_ABAS) -> str:
+    """
+    Relatório de um intervalo de datas (ISO, inclusivo), opcionalmente só dos `uids` dados:
+    - mensal=False: export/Registros_<início>_a_<fim>.xlsx, uma aba por funcionário com
+      todos os dias do período + Resumo
+    - mensal=True: export/Registros_<início>_a_<fim>.zip com um Registros_MM-YYYY.xlsx por mês
+    Com `mapear(fn, *iteráveis)` (o map de um pool de processos) as abas saem em lotes de
+    `lote` funcionários em paralelo e depois são montadas; sem ele tudo é escrito em série,
+    direto no arquivo final (também quando xml_direto() é False). `progresso(feitos, total)` conta abas prontas; devolver False
+    cancela (ExportacaoCancelada). `registros` como em exportar_mes_xlsx. Retorna caminho
+    do arquivo gerado.
+    """
+    calendario = calendario_periodo(inicio, fim)
+    if uids is not None:
+        uids = set(uids)
+        funcionarios = {u: n for u, n in funcionarios.items() if u in uids}
+    registros = _compactar(registros, funcionarios, calendario)    # cada bloco é uma fatia disto
+    ordem = sorted(funcionarios.items(), key=lambda x: x[1].lower())
+    if mensal:
+        meses = sorted({d[:7] for d, _br, _ds in calendario})
+        blocos = [(mes, [c for c in calendario if c[0].startswith(mes)]) for mes in meses]
     else:
-        if "Sheet" in wb.sheetnames:
-            std = wb["Sheet"]
-            wb.remove(std)
-
-    ws_r = wb.create_sheet("Resumo", 0)
-    ws_r.append(["Funcionário", "UID", "Total Horas"])
-    for col_idx in range(1, 4):
-        c = ws_r.cell(row=1, column=col_idx)
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = center
-        c.border = border_thin
-
-    for nome, uid, total in sorted(totais_func, key=lambda x: x[0].lower()):
-        ws_r.append([nome, uid, total])
-        r = ws_r.max_row
-        ws_r.cell(row=r, column=3).number_format = "[h]:mm"
-        for col in range(1, 4):
-            ws_r.cell(row=r, column=col).border = border_thin
-            ws_r.cell(row=r, column=col).alignment = center
-
-    ws_r.column_dimensions["A"].width = 36
-    ws_r.column_dimensions["B"].width = 20
-    ws_r.column_dimensions["C"].width = 12
-    ws_r.freeze_panes = "A2"
-    ws_r.auto_filter.ref = f"A1:C{ws_r.max_row}"
-
-    wb.save(caminho)
-    return caminho
\ No newline at end of file
+        blocos = [(f"{inicio} a {fim}", calendario)]
+
+    total = len(blocos) * len(ordem)
+    feitos = [0]
+
+    def seguir(n_abas):
+        feitos[0] += n_abas
+        return not progresso or progresso(feitos[0], total) is not False
+
+    rotulo_periodo = f"{inicio} a {fim}"
+    if not seguir(0):
+        raise ExportacaoCancelada(rotulo_periodo)
+
+    os.makedirs("export", exist_ok=True)
+    base = os.path.join("export", f"Registros_{calendario[0][1].replace('/', '-')}_a_{calendario[-1][1].replace('/', '-')}")
+    # caminhos absolutos: os processos do pool podem ter outro diretório de trabalho
+    pasta = os.path.abspath(tempfile.mkdtemp(prefix=".periodo_", dir="export"))
+    try:
+        destinos = [os.path.join(pasta, f"Registros_{rotulo[5:]}-{rotulo[:4]}.xlsx") if mensal
+                    else os.path.abspath(base + ".xlsx") for rotulo, _cal in blocos]
+        if mapear is None or not xml_direto():
+            arquivos = [_escrever_direto(destino, rotulo, cal, funcionarios, registros, seguir)
+                        for destino, (rotulo, cal) in zip(destinos, blocos)]
+        else:
+            arquivos = _periodo_em_lotes(blocos, destinos, ordem, registros, pasta, mapear, seguir, lote,
+                                         rotulo_periodo)
+        if not mensal:
+            return base + ".xlsx"
+
+        caminho = base + ".zip"
+        tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as z:     # .xlsx já é comprimido
+            for arq in arquivos:
+                z.write(arq, os.path.basename(arq))
+        os.replace(tmp, caminho)
+        return caminho
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+def _periodo_em_lotes(blocos, destinos, ordem, registros, pasta, mapear, seguir, lote, rotulo_periodo):
+    """Gera as abas em lotes com mapear(gerar_abas) e monta cada bloco com mapear(montar_xlsx)."""
+    tarefas = []    # (calendário, pasta, itens), na ordem bloco -> funcionário
+    for b, (_rotulo, cal) in enumerate(blocos):
+        batidas = _compactar(registros, [uid for uid, _nome in ordem], cal)
+        for i in range(0, len(ordem), lote):
+            itens = [(f"{b}_{i + j}.xml", batidas[uid]) for j, (uid, _nome) in enumerate(ordem[i:i + lote])]
+            tarefas.append((cal, pasta, itens))
+    lotes = _coletar(mapear(gerar_abas, *zip(*tarefas)) if tarefas else [], lambda feito: seguir(len(feito)),
+                     rotulo_periodo)
+    prontas = [aba for feito in lotes for aba in feito]
+
+    montagens = []
+    for b, ((rotulo, cal), destino) in enumerate(zip(blocos, destinos)):
+        abas = [(uid, nome, arq, total_horas) for (uid, nome), (arq, total_horas)
+                in zip(ordem, prontas[b * len(ordem):(b + 1) * len(ordem)])]
+        montagens.append((destino, rotulo, len(cal) + 2, abas))
+    return _coletar(mapear(montar_xlsx, *zip(*montagens)), lambda _arq: seguir(0), rotulo_periodo)
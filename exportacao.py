@@ -0,0 +1,205 @@
+import time, queue, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, CancelledError
+import config
+import export_excel
+import barramento
+import metricas
+import perfil
+
+# EXPORTAÇÕES EM SEGUNDO PLANO
+# Cada exportação vira um trabalho num pool de processos, sobre uma cópia dos dados
+# tirada no clique (minutos_do_mes/minutos_do_periodo/funcionarios). Com mais de um
+# processo, um relatório de período é coordenado por uma thread que reparte as abas entre
+# eles. O progresso volta por uma fila e é publicado no barramento.eventos como
+# ('exportacao', resumo do trabalho), com o id do trabalho como chave de agrupamento.
+#
+# O pool usa "fork" e é aquecido em iniciar(), antes de qualquer thread existir: no
+# script mode do NiceGUI um processo "spawn" reexecutaria interface.py inteiro. Onde
+# não há fork (Windows) os trabalhos rodam numa thread — a UI continua respondendo,
+# só não ganha núcleos extras.
+_SLOTS = 64         # cancelamentos: _cancelados[id % _SLOTS] == id
+_PROGRESSO_S = 0.1  # no máximo um aviso de progresso por intervalo (fora o último)
+
+_fila = None
+_cancelados = None
+
+def _iniciar_processo(fila, cancelados):
+    global _fila, _cancelados
+    _fila, _cancelados = fila, cancelados
+
+def _relator(trabalho_id, avisar):
+    """progresso(feitos, total) para export_excel: checa o cancelamento e avisa com limite de frequência."""
+    ultimo = [0.0]
+
+    def progresso(feitos, total):
+        if _cancelados[trabalho_id % _SLOTS] == trabalho_id:
+            return False
+        agora = time.monotonic()
+        if feitos == total or agora - ultimo[0] >= _PROGRESSO_S:
+            ultimo[0] = agora
+            avisar(trabalho_id, feitos, total)
+        return True
+    return progresso
+
+def _perfilado(arq_perfil, fn, *args, **kw):
+    """fn(*args, **kw); com `arq_perfil` (captura do perfil.py em andamento), sob cProfile, gravando o .pstats."""
+    if arq_perfil is None:
+        return fn(*args, **kw)
+    import cProfile
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn, *args, **kw)
+    finally:
+        prof.dump_stats(arq_perfil)
+
+def _executar(trabalho_id, ano_mes, funcionarios, registros, eventos, arq_perfil=None):
+    """Roda no pool; devolve o caminho do arquivo gerado."""
+    progresso = _relator(trabalho_id, lambda *aviso: _fila.put(aviso))
+    return _perfilado(arq_perfil, export_excel.exportar_mes_xlsx, ano_mes, funcionarios, registros, eventos,
+                      progresso=progresso)
+
+def _executar_periodo(trabalho_id, inicio, fim, funcionarios, registros, eventos, uids, mensal, arq_perfil=None):
+    """Relatório de período inteiro num processo do pool (em série)."""
+    progresso = _relator(trabalho_id, lambda *aviso: _fila.put(aviso))
+    return _perfilado(arq_perfil, export_excel.exportar_periodo_xlsx, inicio, fim, funcionarios, registros, eventos,
+                      uids=uids, mensal=mensal, progresso=progresso)
+
+
+class TrabalhoExportacao:
+    """estado: 'na fila' -> 'gerando' -> 'pronto' | 'erro' | 'cancelado'."""
+    def __init__(self, trabalho_id, descricao, total):
+        self.id = trabalho_id
+        self.descricao = descricao
+        self.estado = "na fila"
+        self.feitos = 0
+        self.total = total
+        self.caminho = None
+        self.erro = None
+        self.futuro = None
+        self.criado = time.monotonic()
+
+    def resumo(self):
+        return {"id": self.id, "descricao": self.descricao, "estado": self.estado, "feitos": self.feitos,
+                "total": self.total, "caminho": self.caminho, "erro": self.erro}
+
+
+class Exportador:
+    def __init__(self, processos=None):
+        self.processos = processos
+        self.trabalhos = {}
+        self._lock = threading.Lock()
+        self._proximo_id = 0
+        self._pool = None
+        self._paralelo = False
+
+    def iniciar(self):
+        """
+        Cria o pool e sobe os processos já (antes das threads do resto do sistema). Sob o
+        _lock: duas primeiras exportações simultâneas criariam dois pools, cada um com o
+        seu array de cancelamentos. `_pool` é o último a ser publicado.
+        """
+        if self._pool is not None:
+            return
+        with self._lock:
+            if self._pool is not None:
+                return
+            paralelo = False
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+                fila, cancelados = ctx.Queue(), ctx.Array("l", _SLOTS, lock=False)
+                pool = ProcessPoolExecutor(self.processos, mp_context=ctx,
+                                           initializer=_iniciar_processo, initargs=(fila, cancelados))
+                pool.submit(int).result()       # com fork, todos os processos nascem no 1º submit
+                paralelo = (self.processos or multiprocessing.cpu_count()) > 1
+            else:
+                fila, cancelados = queue.Queue(), [0] * _SLOTS
+                pool = ThreadPoolExecutor(1, thread_name_prefix="exportacao")
+            _iniciar_processo(fila, cancelados)     # também aqui: relatórios de período coordenam deste processo
+            self._fila, self._cancelados, self._paralelo = fila, cancelados, paralelo
+            # relatórios de período: a thread coordena, os lotes de abas vão para o pool
+            self._coordenacao = ThreadPoolExecutor(2, thread_name_prefix="exportacao-periodo")
+            threading.Thread(target=self._consumir_progresso, daemon=True).start()
+            self._pool = pool
+
+    def _novo(self, descricao, total):
+        self.iniciar()
+        with self._lock:
+            self._proximo_id += 1
+            trabalho = TrabalhoExportacao(self._proximo_id, descricao, total)
+            self.trabalhos[trabalho.id] = trabalho
+        self._publicar(trabalho)
+        return trabalho
+
+    def _acompanhar(self, trabalho, futuro):
+        trabalho.futuro = futuro
+        futuro.add_done_callback(lambda f: self._concluir(trabalho, f))
+        return trabalho
+
+    def enviar(self, ano_mes, funcionarios, registros, eventos):
+        """Agenda a exportação de um mês; os dados já devem ser uma cópia."""
+        trabalho = self._novo(ano_mes, len(funcionarios))
+        return self._acompanhar(trabalho, self._pool.submit(
+            _executar, trabalho.id, ano_mes, funcionarios, registros, eventos, perfil.arquivo_export(trabalho.id)))
+
+    def enviar_periodo(self, inicio, fim, funcionarios, registros, eventos, uids=None, mensal=False):
+        """
+        Agenda um relatório de período (export_excel.exportar_periodo_xlsx). Com mais de um
+        processo no pool, uma thread daqui reparte as abas entre eles; com um só, o relatório
+        inteiro roda em série nele, como uma exportação de mês.
+        """
+        trabalho = self._novo(f"{inicio} a {fim}", 0)
+        if not self._paralelo:
+            return self._acompanhar(trabalho, self._pool.submit(
+                _executar_periodo, trabalho.id, inicio, fim, funcionarios, registros, eventos, uids, mensal,
+                perfil.arquivo_export(trabalho.id)))
+        progresso = _relator(trabalho.id, self._atualizar)
+        return self._acompanhar(trabalho, self._coordenacao.submit(     # só a coordenação: as abas vão ao pool
+            _perfilado, perfil.arquivo_export(trabalho.id), export_excel.exportar_periodo_xlsx, inicio, fim,
+            funcionarios, registros, eventos, uids=uids, mensal=mensal, mapear=self._pool.map, progresso=progresso))
+
+    def cancelar(self, trabalho_id):
+        with self._lock:
+            trabalho = self.trabalhos.get(trabalho_id)
+        if trabalho is None:
+            return False
+        self._cancelados[trabalho_id % _SLOTS] = trabalho_id
+        if trabalho.futuro is not None:
+            trabalho.futuro.cancel()    # ainda na fila: nem chega a rodar
+        return True
+
+    def _consumir_progresso(self):
+        while True:
+            self._atualizar(*self._fila.get())
+
+    def _atualizar(self, trabalho_id, feitos, total):
+        with self._lock:
+            trabalho = self.trabalhos.get(trabalho_id)     # já concluído: some do dict
+            if trabalho is None:
+                return
+            trabalho.estado, trabalho.feitos, trabalho.total = "gerando", feitos, total
+        self._publicar(trabalho)
+
+    def _concluir(self, trabalho, futuro):
+        caminho = erro = None
+        try:
+            caminho, estado = futuro.result(), "pronto"
+        except (CancelledError, export_excel.ExportacaoCancelada):
+            estado = "cancelado"
+        except Exception as e:
+            estado, erro = "erro", str(e)
+        with self._lock:
+            self.trabalhos.pop(trabalho.id, None)
+            trabalho.estado, trabalho.caminho, trabalho.erro = estado, caminho, erro
+            if estado == "pronto":
+                trabalho.feitos = trabalho.total
+        if estado == "pronto":
+            metricas.export_segundos.observar(time.monotonic() - trabalho.criado)
+        self._publicar(trabalho)
+
+    def _publicar(self, trabalho):
+        barramento.eventos.publicar("exportacao", trabalho.resumo(), chave=trabalho.id)   # só o último estado importa
+
+
+exportador = Exportador(config.EXPORT_PROCESSOS)
+metricas.registro.medidor("ponto_export_trabalhos", "Exportações na fila ou gerando",
+                          lambda: len(exportador.trabalhos))
@@ -1,68 +1,183 @@
-import json, time
+import json, time, struct
 from datetime import datetime, timedelta
 import config
 import data
+import minutos
 
-# FUNÇÕES AUXILIARES
-def mesclar_scans_jsonl(lines, registros, funcionarios):
+# DUMP BINÁRIO (EDUMP_BIN): quadros de 20 bytes, little-endian
+#   seq u32 | epoch u32 | uid_len u8 (0xFF = slot com CRC ruim na EEPROM) | uid[10] | crc8
+# O epoch do RTC é "hora local ingênua" (DateTime(epoch) no firmware), então a
+# conversão é aritmética pura, sem fuso.
+FRAME_BIN = struct.Struct("<IIB10sB")
+_EPOCH_0 = datetime(1970, 1, 1)
+_HHMM = [f"{m // 60:02d}:{m % 60:02d}" for m in range(1440)]
+
+def _tabela_crc8(poly=0x07):
+    tab = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = ((c << 1) ^ poly) & 0xFF if c & 0x80 else (c << 1) & 0xFF
+        tab.append(c)
+    return tab
+
+_CRC8 = _tabela_crc8()
+
+def crc8(buf):
+    c = 0
+    for b in buf:
+        c = _CRC8[c ^ b]
+    return c
+
+def decodificar_edump_bin(buf):
     """
-    lines: lista de strings JSON no formato:
-      {"uid":"AABBCCDD","ts":"YYYY-MM-DDTHH:MM:SS","src":"eeprom"}
-    Vamos:
-      - ignorar UIDs que NÃO estão cadastrados em `funcionarios`
-      - agrupar por (uid, data) e ordenar por hora
-      - preencher eventos na ordem: entrada, saida_intervalo, volta_intervalo, saida
-    Retorna (novos:int, ignorados:int)
+    Decodifica quadros do EDUMP_BIN direto do buffer (memoryview, sem cópias por quadro).
+    Retorna ([(uid, data_iso, hora, seq)], invalidos). Datas são convertidas uma vez por dia.
     """
-    novos = 0
-    ignorados = 0
+    mv = memoryview(buf)
+    tam = FRAME_BIN.size
+    n = len(mv) // tam
+    dias = {}
+    out = []
+    invalidos = 0
+    for i, (seq, epoch, ln, uid, crc) in enumerate(FRAME_BIN.iter_unpack(mv[:n * tam])):
+        if ln > 10 or crc != crc8(mv[i * tam:i * tam + tam - 1]):
+            invalidos += 1
+            continue
+        d, seg = divmod(epoch, 86400)
+        data_iso = dias.get(d)
+        if data_iso is None:
+            data_iso = dias[d] = (_EPOCH_0 + timedelta(days=d)).strftime("%Y-%m-%d")
+        out.append((uid[:ln].hex().upper(), data_iso, _HHMM[seg // 60], seq))
+    return out, invalidos
 
-    uids_validos = set([u.strip().upper() for u in funcionarios.keys()])
+# FUNÇÕES AUXILIARES
+class MescladorIncremental:
+    """
+    Mescla registros offline (linhas JSON do EDUMP) à medida que chegam:
+      {"uid":"AABBCCDD","ts":"YYYY-MM-DDTHH:MM:SS","seq":123,"src":"eeprom"}
+      - adicionar(): valida e agrupa por (uid, data); UIDs não cadastrados são ignorados
+        e registros com seq < `desde_seq` (já aplicados deste terminal) são descartados
+      - a cada `lote` linhas válidas (ou em aplicar()) os grupos são ordenados por hora e
+        preenchem os eventos na ordem entrada, saida_intervalo, volta_intervalo, saida
+        (uma batida logo após a meia-noite pode fechar o turno da véspera: pertence_a_vespera)
+      - confirmar(): aplica o que faltar e persiste tudo o que foi aplicado (commit parcial)
+    Uma hora já presente no dia é descartada, então reprocessar o mesmo dump não duplica.
+    `ultimo_seq` é o maior seq visto; depois de confirmar() tudo até ele está gravado.
+    """
+    def __init__(self, repo, funcionarios=None, terminal=None, lote=None, desde_seq=None):
+        self.repo = repo
+        self.terminal = terminal
+        self.lote = lote
+        self.desde_seq = desde_seq
+        self.ultimo_seq = None
+        if funcionarios is None:
+            funcionarios = repo.funcionarios()
+        self._uids_validos = set([u.strip().upper() for u in funcionarios.keys()])
+        self._buckets = {}
+        self._no_lote = 0
+        self._a_persistir = []
+        self.recebidos = 0
+        self.novos = 0
+        self.ignorados = 0
+        self.repetidos = 0
 
-    buckets = {}
-    for raw in lines:
+    def adicionar(self, raw):
+        """Uma linha JSON do EDUMP."""
         raw = raw.strip()
         if not raw:
-            continue
+            return
         try:
             obj = json.loads(raw)
         except Exception:
-            continue
+            return
 
         uid = (obj.get("uid") or "").strip().upper()
         ts  = (obj.get("ts")  or "").strip()
+        seq = obj.get("seq")
 
-        if not uid or uid not in uids_validos:
-            ignorados += 1
-            continue
-
-        if len(ts) < 19:
-            ignorados += 1
-            continue
         try:
-            dt = datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S")
+            dt = datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S") if len(ts) >= 19 else None
         except Exception:
-            ignorados += 1
-            continue
+            dt = None
+        if dt is None:
+            self.recebidos += 1
+            self.ignorados += 1
+            return
+        self.adicionar_registro(uid, dt.strftime("%Y-%m-%d"), dt.strftime("%H:%M"),
+                                seq if isinstance(seq, int) else None)
+
+    def adicionar_registro(self, uid, data_iso, hora, seq=None):
+        """Um registro já decodificado (ex.: decodificar_edump_bin)."""
+        self.recebidos += 1
+
+        if seq is not None:
+            if self.desde_seq is not None and seq < self.desde_seq:
+                self.repetidos += 1
+                return
+            if self.ultimo_seq is None or seq > self.ultimo_seq:
+                self.ultimo_seq = seq
+
+        if not uid or uid not in self._uids_validos:
+            self.ignorados += 1
+            return
+
+        self._buckets.setdefault((uid, data_iso), []).append(hora)
+        self._no_lote += 1
+        if self.lote and self._no_lote >= self.lote:
+            self.aplicar()
 
-        data_iso = dt.strftime("%Y-%m-%d")
-        hora     = dt.strftime("%H:%M")
-        buckets.setdefault((uid, data_iso), []).append(hora)
-
-    for (uid, data_iso), horas in buckets.items():
-        horas.sort()
-        if uid not in registros:
-            registros[uid] = {}
-        dia = registros[uid].setdefault(data_iso, {})
-        for h in horas:
-            if all(ev in dia for ev in config.EVENTOS):
-                break
-            ev = next((e for e in config.EVENTOS if e not in dia), None)
-            if ev and h:
-                dia[ev] = h
-                novos += 1
-
-    return novos, ignorados
+    def aplicar(self):
+        """Aplica em memória os grupos acumulados."""
+        aplicados = []
+        dias = {}   # (uid, data) -> cópia do dia com o que já foi aplicado neste lote
+
+        def dia_de(uid, data_iso):
+            if (uid, data_iso) not in dias:
+                dias[(uid, data_iso)] = dict(self.repo.dia(uid, data_iso))
+            return dias[(uid, data_iso)]
+
+        with config.decisao_lock:
+            for (uid, data_iso), horas in sorted(self._buckets.items()):   # véspera antes do dia
+                horas.sort()
+                anterior = vespera(data_iso)
+                for h in horas:
+                    alvo = data_iso
+                    if pertence_a_vespera(dia_de(uid, data_iso), h, lambda: dia_de(uid, anterior)):
+                        alvo = anterior
+                    dia = dia_de(uid, alvo)
+                    if h in dia.values():
+                        self.repetidos += 1
+                        continue
+                    ev = proximo_evento(dia)
+                    if ev is None:
+                        continue
+                    dia[ev] = h
+                    self.novos += 1
+                    aplicados.append(data.registro_batida(uid, alvo, ev, h, self.terminal))
+            self.repo.aplicar_eventos(aplicados)
+        self._buckets = {}
+        self._no_lote = 0
+        self._a_persistir.extend(aplicados)
+
+    def confirmar(self):
+        """Aplica o pendente e torna durável tudo o que já foi aplicado."""
+        self.aplicar()
+        recs, self._a_persistir = self._a_persistir, []
+        self.repo.persistir_eventos(recs)
+
+
+def mesclar_scans_jsonl(lines, repo, funcionarios=None, terminal=None, desde_seq=None):
+    """
+    Mescla uma lista completa de linhas JSON do EDUMP (ver MescladorIncremental)
+    com um único commit. Idempotente por (terminal, seq) quando `desde_seq` é o cursor
+    do terminal. Retorna (novos:int, ignorados:int)
+    """
+    m = MescladorIncremental(repo, funcionarios, terminal, desde_seq=desde_seq)
+    for raw in lines:
+        m.adicionar(raw)
+    m.confirmar()
+    return m.novos, m.ignorados
 
 def agora():
     dt = datetime.now()
@@ -74,6 +189,27 @@ def proximo_evento(dia_dict):
             return ev
     return None
 
+def vespera(data_iso):
+    return (datetime.strptime(data_iso, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+
+def pertence_a_vespera(hoje, hora, ler_vespera):
+    """
+    True se a batida `hora` (antes da entrada de hoje, ou sem entrada hoje) fecha o turno
+    noturno da véspera: ela tem entrada há menos de config.VIRADA_MAX_HORAS e ainda não tem
+    saída, ou já recebeu esta mesma hora depois da virada (reprocessamento do dump).
+    `ler_vespera()` -> dict do dia anterior, só lido se preciso.
+    """
+    if not config.VIRADA_MAX_HORAS:
+        return False
+    entrada_hoje = hoje.get("entrada")
+    if entrada_hoje and entrada_hoje <= hora:
+        return False
+    vespera = ler_vespera()
+    e, h = minutos.minutos_hhmm(vespera.get("entrada")), minutos.minutos_hhmm(hora)
+    if e is None or h is None or h >= e or h + 24 * 60 - e >= config.VIRADA_MAX_HORAS * 60:
+        return False
+    return "saida" not in vespera or hora in vespera.values()
+
 def extrair_uid(linha: str):
     """Retorna UID válido (HEX, tamanho par entre 8 e 20) ou None."""
     if not linha:
@@ -87,31 +223,46 @@ def extrair_uid(linha: str):
         return s
     return None
 
-def registrar_batida(uid):
-    """Registra batida e retorna (ok: bool, msg: str, evento_ou_ERR: str)."""
+def decidir_batida(uid, terminal=None):
+    """
+    Decide a batida só em memória (anti-dupe, cadastro, próximo evento) e aplica no
+    repositório sem persistir. Retorna (ok, msg, evento_ou_ERR, recs); quem chama
+    é responsável por repo.persistir_eventos(recs).
+    Serializada por config.decisao_lock: vários terminais compartilham o anti-dupe.
+    """
     uid = uid.strip().upper()
     if not uid:
-        return False, "UID vazio", "ERR"
+        return False, "UID vazio", "ERR", []
 
+    with config.decisao_lock:
+        return _decidir(uid, terminal)
+
+def _decidir(uid, terminal):
     t = time.time()
     if uid in config.ultimas_batidas and (t - config.ultimas_batidas[uid]) < config.MIN_GAP_SECONDS:
-        return False, f"Toque repetido em < {config.MIN_GAP_SECONDS}s", "ERR"
+        return False, f"Toque repetido em < {config.MIN_GAP_SECONDS}s", "ERR", []
     config.ultimas_batidas[uid] = t
 
-    if uid not in config.funcionarios:
-        return False, "UID não cadastrado", "ERR"
+    repo = config.repo
+    funcionarios = repo.funcionarios()
+    if uid not in funcionarios:
+        return False, "UID não cadastrado", "ERR", []
 
     data_str, hora_str = agora()
-    if uid not in config.registros:
-        config.registros[uid] = {}
-    if data_str not in config.registros[uid]:
-        config.registros[uid][data_str] = {}
-
-    dia = config.registros[uid][data_str]
+    dia = repo.dia(uid, data_str)
+    anterior = vespera(data_str)
+    if pertence_a_vespera(dia, hora_str, lambda: repo.dia(uid, anterior)):
+        data_str, dia = anterior, repo.dia(uid, anterior)
     ev = proximo_evento(dia)
     if ev is None:
-        return False, "Dia já completo", "ERR"
+        return False, "Dia já completo", "ERR", []
 
-    dia[ev] = hora_str
-    data.salvar_json(config.ARQ_REG, config.registros)
-    return True, f"{config.funcionarios[uid]}: {ev.replace('_',' ')} às {hora_str} ({data_str})", ev
+    recs = [data.registro_batida(uid, data_str, ev, hora_str, terminal)]
+    repo.aplicar_eventos(recs)
+    return True, f"{funcionarios[uid]}: {ev.replace('_',' ')} às {hora_str} ({data_str})", ev, recs
+
+def registrar_batida(uid):
+    """Registra batida (decide + persiste) e retorna (ok: bool, msg: str, evento_ou_ERR: str)."""
+    ok, msg, ev, recs = decidir_batida(uid)
+    config.repo.persistir_eventos(recs)
+    return ok, msg, ev
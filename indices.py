@@ -0,0 +1,312 @@
+import time, bisect, calendar, threading
+from datetime import datetime
+import config
+import minutos
+
+# ÍNDICES SECUNDÁRIOS DAS BATIDAS
+# Mantidos pelo repositório a cada aplicar_eventos(), para as telas não varrerem o
+# histórico inteiro a cada batida:
+#   - datas e meses com registro (listas ordenadas, inserção por bisect)
+#   - data -> set(uids) com batida naquele dia (preenchido sob demanda, por data)
+#   - batidas de hoje ordenadas por hora
+#   - funcionários ordenados por nome
+# `versao` muda a cada alteração; quem desenha uma tela pode pular o redesenho se
+# a versão for a mesma da última vez. `ouvintes` recebem os registros aplicados
+# (e {"op": "funcionarios"} quando o cadastro muda), fora do lock.
+# O lock só cobre operações curtas: as fontes (disco/banco) são lidas fora dele
+# (_montar), para a thread serial nunca esperar uma tela montar um índice.
+class IndicesBatidas:
+    """
+    `fonte_datas()` -> todas as datas ISO com registro; `fonte_dia(data_iso)` ->
+    [(hora, uid, evento)] do dia; `fonte_funcionarios()` -> {uid: nome}. As fontes só
+    são lidas na (re)construção ou na primeira consulta de cada dia.
+    """
+    def __init__(self, fonte_datas, fonte_dia, fonte_funcionarios):
+        self._fonte_datas = fonte_datas
+        self._fonte_dia = fonte_dia
+        self._fonte_funcionarios = fonte_funcionarios
+        self._lock = threading.RLock()
+        self.versao = 0
+        self._geracao = 0           # muda em reconstruir(): o que estava sendo montado é descartado
+        self._geracao_func = 0
+        self._montando = {}         # id -> [recs aplicados enquanto uma fonte é lida]
+        self._datas = None          # lista crescente
+        self._datas_set = set()
+        self._meses = []            # lista crescente
+        self._uids_por_data = {}
+        self._hoje = None
+        self._lista_hoje = []       # [(hora, uid, evento)] crescente
+        self._hora_hoje = {}        # (uid, evento) -> hora em _lista_hoje
+        self._por_nome = None
+        self.ouvintes = []
+
+    def _avisar(self, recs):
+        for ouvinte in self.ouvintes:
+            try:
+                ouvinte(recs)
+            except Exception as e:
+                print(f"[WARN] Ouvinte dos índices falhou: {e}")
+
+    def reconstruir(self):
+        """Descarta tudo; a próxima consulta relê as fontes."""
+        with self._lock:
+            self._datas = None
+            self._uids_por_data = {}
+            self._hoje = None
+            self._por_nome = None
+            self._geracao += 1
+            self._geracao_func += 1
+            self.versao += 1
+
+    def _montar(self, fonte, instalar):
+        """
+        Lê `fonte()` fora do lock e devolve instalar(resultado, recs aplicados durante a
+        leitura, valido), chamado sob o lock; `valido` é False se houve um reconstruir()
+        no meio (o resultado serve para esta consulta, mas não deve ser guardado).
+        """
+        durante = []
+        with self._lock:
+            geracao = self._geracao
+            self._montando[id(durante)] = durante
+        try:
+            resultado = fonte()
+        except BaseException:
+            with self._lock:
+                del self._montando[id(durante)]
+            raise
+        with self._lock:
+            del self._montando[id(durante)]
+            return instalar(resultado, [r for r in durante if r.get("op") is None], geracao == self._geracao)
+
+    # ---- escrita ----
+    def aplicar(self, recs):
+        """Atualiza os índices com registros já aplicados no backend."""
+        if not recs:
+            return
+        with self._lock:
+            self._aplicar(recs)
+        self._avisar(recs)
+
+    def _aplicar(self, recs):
+        if any(rec.get("op") == "del_uid" for rec in recs):
+            self.reconstruir()
+            return
+        for durante in self._montando.values():
+            durante.extend(recs)
+        for rec in recs:
+            uid, d = rec["uid"], rec["data"]
+            if self._datas is not None and d not in self._datas_set:
+                self._datas_set.add(d)
+                bisect.insort(self._datas, d)
+                i = bisect.bisect_left(self._meses, d[:7])
+                if i == len(self._meses) or self._meses[i] != d[:7]:
+                    self._meses.insert(i, d[:7])
+                self._uids_por_data[d] = set()
+            uids = self._uids_por_data.get(d)
+            if uids is not None:
+                uids.add(uid)
+            if d == self._hoje and self._hora_hoje.get((uid, rec["ev"])) != rec["hora"]:
+                antiga = self._hora_hoje.get((uid, rec["ev"]))
+                if antiga is not None:      # evento regravado: sai a hora anterior
+                    del self._lista_hoje[bisect.bisect_left(self._lista_hoje, (antiga, uid, rec["ev"]))]
+                bisect.insort(self._lista_hoje, (rec["hora"], uid, rec["ev"]))
+                self._hora_hoje[(uid, rec["ev"])] = rec["hora"]
+        self.versao += 1
+
+    def funcionarios_alterados(self):
+        with self._lock:
+            self._por_nome = None
+            self._geracao_func += 1
+            self.versao += 1
+        self._avisar([{"op": "funcionarios"}])
+
+    # ---- leitura ----
+    def _garantir_datas(self):
+        while True:
+            with self._lock:
+                if self._datas is not None:
+                    return
+            self._montar(self._fonte_datas, self._instalar_datas)
+
+    def _instalar_datas(self, datas, durante, valido):
+        if valido and self._datas is None:
+            self._datas = sorted(set(datas) | {r["data"] for r in durante})
+            self._datas_set = set(self._datas)
+            self._meses = sorted({d[:7] for d in self._datas})
+
+    def datas(self):
+        """Da mais recente para a mais antiga."""
+        self._garantir_datas()
+        with self._lock:
+            return self._datas[::-1] if self._datas is not None else self.datas()
+
+    def meses(self):
+        self._garantir_datas()
+        with self._lock:
+            return self._meses[::-1] if self._datas is not None else self.meses()
+
+    def uids_do_dia(self, data_iso):
+        with self._lock:
+            uids = self._uids_por_data.get(data_iso)
+            if uids is not None:
+                return set(uids)
+
+        def instalar(itens, durante, valido):
+            uids = {uid for _h, uid, _ev in itens} | {r["uid"] for r in durante if r["data"] == data_iso}
+            if valido:
+                self._uids_por_data[data_iso] = uids
+            return set(uids)
+        return self._montar(lambda: self._fonte_dia(data_iso), instalar)
+
+    def batidas_do_dia(self, data_iso):
+        hoje = datetime.now().strftime("%Y-%m-%d")
+        if data_iso != hoje:
+            return list(self._fonte_dia(data_iso))
+        with self._lock:
+            if self._hoje == hoje:
+                return list(self._lista_hoje)
+
+        def instalar(itens, durante, valido):
+            horas = {(uid, ev): hora for hora, uid, ev in itens}
+            horas.update(((r["uid"], r["ev"]), r["hora"]) for r in durante if r["data"] == hoje)
+            lista = sorted((hora, uid, ev) for (uid, ev), hora in horas.items())
+            if valido:
+                self._hoje, self._lista_hoje, self._hora_hoje = hoje, lista, horas
+            return list(lista)
+        return self._montar(lambda: self._fonte_dia(hoje), instalar)
+
+    def funcionarios_por_nome(self):
+        """[(uid, nome)] em ordem alfabética (sem diferenciar maiúsculas)."""
+        with self._lock:
+            if self._por_nome is not None:
+                return list(self._por_nome)
+            geracao = self._geracao_func
+        por_nome = sorted(self._fonte_funcionarios().items(), key=lambda x: x[1].lower())
+        with self._lock:
+            if self._geracao_func == geracao:
+                self._por_nome = por_nome
+        return list(por_nome)
+
+
+# HORAS TRABALHADAS (materializadas)
+# Minutos trabalhados por (uid, dia) e totais por (uid, mês), para a UI e as exportações
+# não recalcularem a partir das batidas. Cada mês é montado na primeira consulta (um
+# minutos.BatidasMinutos por funcionário, com os minutos por dia já calculados) e depois
+# só recebe as batidas aplicadas: aplicar() é ouvinte de IndicesBatidas e refaz apenas o
+# dia tocado. Os meses menos usados saem acima de config.HORAS_MESES_EM_MEMORIA.
+# Cópia na escrita: um mês publicado em `_meses` nunca muda; aplicar() copia o dicionário
+# do mês e os funcionários tocados e publica a cópia, então as leituras não pegam lock.
+class HorasTrabalhadas:
+    """`fonte_mes(ano_mes)` -> {uid: {data_iso: dia}} (lida só ao montar um mês)."""
+    def __init__(self, fonte_mes):
+        self._fonte_mes = fonte_mes
+        self._escrita = threading.RLock()
+        self._meses = {}        # mes -> ({uid: BatidasMinutos}, {uid: minutos}), publicados
+        self._uso = {}          # mes -> último uso (LRU)
+        self._montando = {}     # mes -> (Event, [recs aplicados enquanto o mês é montado])
+        self._geracao = 0
+
+    def reconstruir(self):
+        with self._escrita:
+            self._meses = {}
+            self._uso = {}
+            self._geracao += 1
+
+    def _mes(self, mes):
+        """(do_mes, totais) publicados do mês; monta fora do lock se ainda não existir."""
+        publicado = self._meses.get(mes)
+        if publicado is not None:
+            self._uso[mes] = time.monotonic()
+            return publicado
+        with self._escrita:
+            publicado = self._meses.get(mes)
+            if publicado is not None:
+                return publicado
+            espera = self._montando.get(mes)
+            dono = espera is None
+            if dono:
+                espera = self._montando[mes] = (threading.Event(), [])
+                geracao = self._geracao
+        if not dono:
+            espera[0].wait()
+            return self._meses.get(mes) or self._mes(mes)
+        try:
+            inicio = f"{mes}-01"
+            n_dias = calendar.monthrange(int(mes[:4]), int(mes[5:7]))[1]
+            do_mes = {uid: minutos.BatidasMinutos.de_dias(dias, inicio, n_dias)
+                      for uid, dias in self._fonte_mes(mes).items()}
+            totais = {uid: sum(b.trabalhados()) for uid, b in do_mes.items()}
+            with self._escrita:
+                for rec in espera[1]:
+                    self._aplicar_rec(mes, do_mes, totais, rec)
+                if geracao == self._geracao:
+                    self._meses[mes] = (do_mes, totais)
+                    self._uso[mes] = time.monotonic()
+                    self._descartar(mes)
+            return do_mes, totais
+        finally:
+            with self._escrita:
+                del self._montando[mes]
+            espera[0].set()
+
+    def _descartar(self, novo):
+        atual = datetime.now().strftime("%Y-%m")
+        while len(self._meses) > config.HORAS_MESES_EM_MEMORIA:
+            candidatos = [(self._uso.get(m, 0), m) for m in self._meses if m not in (atual, novo)]
+            if not candidatos:
+                break
+            velho = min(candidatos)[1]
+            del self._meses[velho]
+            self._uso.pop(velho, None)
+
+    @staticmethod
+    def _aplicar_rec(mes, do_mes, totais, rec, copiados=None):
+        """Aplica um registro em (do_mes, totais) de `mes`; copia antes cada funcionário ainda fora de `copiados`."""
+        uid = rec["uid"]
+        if rec.get("op") == "del_uid":
+            do_mes.pop(uid, None)
+            totais.pop(uid, None)
+            return
+        if rec["data"][:7] != mes:
+            return
+        batidas = do_mes.get(uid)
+        if batidas is None:
+            n_dias = calendar.monthrange(int(mes[:4]), int(mes[5:7]))[1]
+            batidas = do_mes[uid] = minutos.BatidasMinutos.vazio(f"{mes}-01", n_dias)
+        elif copiados is not None and uid not in copiados:
+            batidas = do_mes[uid] = batidas.copia()
+        if copiados is not None:
+            copiados.add(uid)
+        delta = batidas.definir(rec["data"], rec["ev"], rec["hora"])
+        totais[uid] = totais.get(uid, 0) + delta
+
+    def aplicar(self, recs):
+        """Ouvinte dos índices: publica cópias dos meses já montados com os registros aplicados."""
+        recs = [r for r in recs if r.get("op") in (None, "del_uid")]
+        if not recs:
+            return
+        with self._escrita:
+            for mes, (_ev, durante) in self._montando.items():
+                durante.extend(recs)
+            for mes, (do_mes, totais) in list(self._meses.items()):
+                meus = [r for r in recs if r.get("op") == "del_uid" or r["data"][:7] == mes]
+                if not meus:
+                    continue    # mês ainda não montado não está aqui: a fonte já terá a batida
+                do_mes, totais, copiados = dict(do_mes), dict(totais), set()
+                for rec in meus:
+                    self._aplicar_rec(mes, do_mes, totais, rec, copiados)
+                self._meses[mes] = (do_mes, totais)
+
+    # ---- leitura ----
+    def do_dia(self, uid, data_iso):
+        """Minutos trabalhados por um funcionário num dia."""
+        batidas = self._mes(data_iso[:7])[0].get(uid)
+        return batidas.trabalhados()[int(data_iso[8:10]) - 1] if batidas else 0
+
+    def totais_do_mes(self, ano_mes):
+        """{uid: minutos trabalhados no mês} (só quem tem batida)."""
+        return dict(self._mes(ano_mes)[1])
+
+    def fatias(self, ano_mes, inicio, n_dias):
+        """{uid: BatidasMinutos} (cópias) de n_dias do mês a partir de `inicio` (ISO)."""
+        return {uid: b.fatia(inicio, n_dias) for uid, b in self._mes(ano_mes)[0].items()}
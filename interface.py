@@ -1,14 +1,42 @@
-import threading, queue
+import asyncio, bisect
 from datetime import datetime
+from fastapi.responses import PlainTextResponse
 from nicegui import ui, app
 import config
+import data
 import serial_thread as serial_logic
+import terminais
 import export_excel
-import data
+import exportacao
+import repositorio
+import difusao
+import barramento
+import metricas
+import perfil
 
 # ===================== Carrega dados na inicialização =====================
-config.funcionarios = data.carregar_json(config.ARQ_FUNC, {})
-config.registros = data.carregar_json(config.ARQ_REG, {})
+# No script mode do NiceGUI este arquivo roda de novo para cada cliente: o que é
+# global (repositório, ponte da serial, supervisor) só é criado na primeira vez.
+if config.repo is None:
+    if not data.travar(config.ARQ_TRAVA):       # outro serve, ou um import-dump/migrate rodando
+        raise SystemExit(f"{config.ARQ_TRAVA} está travado por outro processo do ponto")
+    exportacao.exportador.iniciar()     # antes de qualquer thread: o pool usa fork
+    config.repo = repositorio.criar()
+    config.repo.carregar()
+    config.repo.indices.ouvintes.append(difusao.difusor.publicar_mudancas)
+    difusao.difusor.ligar_barramento(barramento.eventos)
+    if config.ARQ_AUDITORIA:
+        barramento.iniciar_auditoria()
+    terminais.gerenciador.iniciar_supervisor()
+    perfil.iniciar_pelo_ambiente()      # PONTO_PERFIL=N: captura os primeiros N segundos
+
+    async def _ligar_difusor():
+        difusao.difusor.iniciar(asyncio.get_running_loop())
+    app.on_startup(_ligar_difusor)
+
+    @app.get('/metrics')
+    def _metrics():
+        return PlainTextResponse(metricas.registro.texto(), media_type='text/plain; version=0.0.4')
 
 # ===================== UI (NiceGUI) =====================
 with ui.header().classes(replace='row items-center justify-between'):
@@ -39,33 +67,125 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
                 ui.notify('Portas atualizadas', type='positive')
 
             def conectar():
-                global serial_thread_obj
-                
-                if config.serial_connected:
-                    ui.notify('Já conectado', type='warning'); return
-                if not portas_select.value:
+                porta = portas_select.value
+                if not porta:
                     ui.notify('Selecione uma porta', type='warning'); return
-
-                config.PORTA_ATUAL = portas_select.value
-                ui.notify(f'Conectando em {config.PORTA_ATUAL}...', type='info')
-
-                config.serial_stop_flag.clear()
-                
-                serial_thread_obj = threading.Thread(
-                    target=serial_logic.serial_worker,
-                    args=(config.PORTA_ATUAL, True), 
-                    daemon=True
-                )
-                serial_thread_obj.start()
+                if terminais.gerenciador.conectar(porta) is None:
+                    ui.notify(f'{porta} já está conectada', type='warning'); return
+                ui.notify(f'Conectando em {porta}...', type='info')
 
             def desconectar():
-                if not config.serial_connected:
-                    ui.notify('Já desconectado', type='warning'); return
-                config.serial_stop_flag.set()
-                ui.notify('Desconectando...', type='info')
+                porta = portas_select.value
+                if not terminais.gerenciador.desconectar(porta):
+                    ui.notify(f'{porta or "Porta"} já desconectada', type='warning'); return
+                ui.notify(f'Desconectando {porta}...', type='info')
+
+            def desconectar_todos():
+                if not terminais.gerenciador.desconectar_todos():
+                    ui.notify('Nenhum terminal conectado', type='warning'); return
+                ui.notify('Desconectando todos os terminais...', type='info')
 
             ui.button('Conectar', on_click=conectar, color='green')
             ui.button('Desconectar', on_click=desconectar, color='red')
+            ui.button('Desconectar todos', on_click=desconectar_todos, color='red').props('outline')
+            ui.button(icon='refresh', on_click=refresh_ports).props('flat')
+
+        ui.label('Terminais').classes('text-lg font-medium')
+        terminais_table = ui.table(
+            columns=[
+                {'name': 'id', 'label': 'Terminal', 'field': 'id'},
+                {'name': 'status', 'label': 'Status', 'field': 'status'},
+                {'name': 'batidas', 'label': 'Batidas OK', 'field': 'batidas'},
+                {'name': 'erros', 'label': 'Recusadas', 'field': 'erros'},
+                {'name': 'por_minuto', 'label': 'Batidas/min', 'field': 'por_minuto'},
+                {'name': 'ultima', 'label': 'Última', 'field': 'ultima'},
+                {'name': 'reconexoes', 'label': 'Reconexões', 'field': 'reconexoes'},
+                {'name': 'fora', 'label': 'Tempo fora', 'field': 'fora'},
+                {'name': 'pronto', 'label': 'Boot', 'field': 'pronto'},
+            ],
+            rows=[],
+            row_key='id',
+        ).classes('w-full')
+
+        def atualizar_terminais_table():
+            terminais_table.rows = terminais.gerenciador.status()
+            terminais_table.update()
+
+        with ui.expansion('Métricas (também em /metrics)', icon='speed').classes('w-full') as metricas_painel:
+            metricas_filas = ui.label('').classes('text-sm text-gray-600')
+            metricas_table = ui.table(
+                columns=[
+                    {'name': 'metrica', 'label': 'Métrica', 'field': 'metrica', 'align': 'left'},
+                    {'name': 'n', 'label': 'Amostras', 'field': 'n'},
+                    {'name': 'p50', 'label': 'p50', 'field': 'p50'},
+                    {'name': 'p99', 'label': 'p99', 'field': 'p99'},
+                    {'name': 'media', 'label': 'Média', 'field': 'media'},
+                ],
+                rows=[],
+                row_key='metrica',
+            ).props('dense').classes('w-full')
+
+        def _valor_metrica(nome, v):
+            if v is None:
+                return '-'
+            if nome.endswith('_segundos'):
+                return f'{v * 1000:.1f} ms' if v < 1 else f'{v:.2f} s'
+            if nome.endswith('_bytes'):
+                return f'{v / 1024:.1f} KiB'
+            return f'{v:.0f}'
+
+        def atualizar_metricas():
+            if not metricas_painel.value:
+                return      # fechado: nada a calcular
+            rows, filas = [], []
+            for m in metricas.registro.metricas():
+                if isinstance(m, metricas.Histograma):
+                    n = m.total
+                    rows.append({'metrica': m.ajuda, 'n': n,
+                                 'p50': _valor_metrica(m.nome, m.quantil(0.5)),
+                                 'p99': _valor_metrica(m.nome, m.quantil(0.99)),
+                                 'media': _valor_metrica(m.nome, m.soma / n if n else None)})
+                elif isinstance(m, metricas.Medidor) and m.tipo == 'gauge':
+                    filas += [f'{m.nome.removeprefix("ponto_")}{f"[{r}]" if r else ""} = {v}'
+                              for r, v in m.valores().items()]
+            metricas_filas.text = ' • '.join(filas)
+            metricas_table.rows = rows
+            metricas_table.update()
+
+        with ui.expansion('Perfil sob demanda', icon='troubleshoot').classes('w-full'):
+            with ui.row().classes('items-end gap-4'):
+                perfil_segundos = ui.number('Segundos', value=30, min=1, max=600, step=5).classes('w-28')
+                perfil_memoria = ui.checkbox('Memória (tracemalloc, mais lento)', value=False)
+
+                def capturar_perfil():
+                    if perfil.iniciar(float(perfil_segundos.value or 30), memoria=perfil_memoria.value) is None:
+                        ui.notify('Já há uma captura em andamento', type='warning'); return
+                    ui.notify(f'Capturando perfil por {perfil_segundos.value:g} s...', type='info')
+
+                def baixar_perfil():
+                    for caminho in perfil.atual.arquivos:
+                        ui.download(caminho)
+
+                perfil_btn = ui.button('Capturar', on_click=capturar_perfil, icon='play_arrow')
+                perfil_parar_btn = ui.button('Parar agora', on_click=lambda: perfil.atual.parar(timeout=0),
+                                             color='red').props('outline')
+                perfil_baixar_btn = ui.button('Baixar relatório', on_click=baixar_perfil, icon='download')
+            perfil_status = ui.label('').classes('text-sm text-gray-600')
+
+        def atualizar_perfil():
+            captura = perfil.atual
+            capturando = captura is not None and captura.ativa
+            perfil_btn.set_enabled(not capturando)
+            perfil_parar_btn.set_visibility(capturando)
+            perfil_baixar_btn.set_visibility(captura is not None and captura.estado == 'pronto')
+            if captura is None:
+                perfil_status.text = 'Desligado (sem custo). Relatórios em export/perfil_*.'
+            elif capturando:
+                perfil_status.text = f'Capturando: {captura.amostras} amostras de {captura.segundos:g} s...'
+            elif captura.estado == 'pronto':
+                perfil_status.text = 'Último relatório: ' + ', '.join(captura.arquivos)
+            else:
+                perfil_status.text = f'Falha na última captura: {captura.erro}'
 
     # ====== ABA CADASTRO ======
     with ui.tab_panel('Cadastro'):
@@ -75,7 +195,7 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
             uid_in  = ui.input('UID (hex)').classes('min-w-[260px]')
 
             def capturar_uid():
-                if not config.serial_connected:
+                if not terminais.gerenciador.conectados():
                     ui.notify('Conecte à serial para capturar UID', type='warning'); return
                 with config.capture_lock:
                     config.capture_uid_mode = True
@@ -90,13 +210,11 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
                 ui.notify('Preencha nome e UID', type='warning'); return
             if not config.HEX_RE.match(uid):
                 ui.notify('UID inválido (use somente HEX)', type='warning'); return
-            if uid in config.funcionarios:
+            if uid in config.repo.funcionarios():
                 ui.notify('UID já cadastrado', type='warning'); return
-            config.funcionarios[uid] = nome
-            data.salvar_json(config.ARQ_FUNC, config.funcionarios)
+            config.repo.salvar_funcionario(uid, nome)
             ui.notify(f'Cadastrado: {nome} ({uid})', type='positive')
-            atualizar_remover_ui()
-            atualizar_tabela_batidas_por_func()
+            atualizar_remover_ui()     # as demais telas chegam pelo difusao
             nome_in.value = ''
             uid_in.value = ''
 
@@ -108,10 +226,11 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
 
         def _options_por_nome():
             contagem = {}
-            for uid, nome in config.funcionarios.items():
+            por_nome = config.repo.funcionarios_por_nome()
+            for uid, nome in por_nome:
                 contagem[nome] = contagem.get(nome, 0) + 1
             opts = {}
-            for uid, nome in sorted(config.funcionarios.items(), key=lambda x: x[1].lower()):
+            for uid, nome in por_nome:
                 label = nome if contagem[nome] == 1 else f'{nome} ({uid[:6]}...)'
                 opts[uid] = label
             return opts
@@ -119,29 +238,22 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
         sel_nome = ui.select(options=_options_por_nome(), label='Selecione pelo nome').classes('min-w-[420px]')
         apagar_chk = ui.checkbox('Apagar também os registros', value=False)
 
-        def atualizar_remover_ui():
+        def atualizar_remover_ui(manter=False):
             sel_nome.options = _options_por_nome()
-            sel_nome.value = None
+            if not manter or sel_nome.value not in sel_nome.options:
+                sel_nome.value = None
             sel_nome.update()
 
         def remover_agora():
             uid = sel_nome.value
             if not uid:
                 ui.notify('Selecione um funcionário', type='warning'); return
-            nome = config.funcionarios.get(uid)
+            nome = config.repo.funcionarios().get(uid)
             if not nome:
                 ui.notify('Funcionário não encontrado', type='warning'); return
-            config.funcionarios.pop(uid, None)
-            data.salvar_json(config.ARQ_FUNC, config.funcionarios)
-            if apagar_chk.value:
-                config.registros.pop(uid, None)
-                data.salvar_json(config.ARQ_REG, config.registros)
+            config.repo.remover_funcionario(uid, apagar_registros=apagar_chk.value)
             ui.notify(f'Funcionário "{nome}" removido do sistema.', type='positive')
             atualizar_remover_ui()
-            try: atualizar_tabela_batidas_por_func()
-            except: pass
-            try: atualizar_lobby_table()
-            except: pass
 
         ui.button('Remover funcionário', color='red', on_click=remover_agora)
 
@@ -151,14 +263,11 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
 
         def coletar_datas_disponiveis():
             """Retorna (options_dict, default_iso): options = {ISO: 'DD/MM/AAAA'}, ordenadas por mais recente."""
-            datas = set()
-            for _uid, dias in config.registros.items():
-                datas.update(dias.keys())
-            if not datas:
+            ordenadas = config.repo.datas()
+            if not ordenadas:
                 hoje_iso = datetime.now().strftime("%Y-%m-%d")
                 return {hoje_iso: datetime.strptime(hoje_iso, "%Y-%m-%d").strftime("%d/%m/%Y")}, hoje_iso
 
-            ordenadas = sorted(datas, reverse=True)
             options = {iso: datetime.strptime(iso, "%Y-%m-%d").strftime("%d/%m/%Y") for iso in ordenadas}
             return options, ordenadas[0]
 
@@ -170,33 +279,63 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
             label='Data'
         ).classes('min-w-[210px]')
 
-        batidas_container = ui.column().classes('w-full')
+        busca_in = ui.input('Buscar nome ou UID').props('clearable debounce=300').classes('min-w-[260px]')
+
+        # Uma única tabela paginada no servidor: o cliente só recebe as linhas da página.
+        func_table = ui.table(
+            columns=[
+                {'name': 'nome', 'label': 'Nome', 'field': 'nome', 'sortable': True, 'align': 'left'},
+                {'name': 'uid', 'label': 'UID', 'field': 'uid', 'sortable': True, 'align': 'left'},
+                {'name': 'entrada', 'label': 'Entrada', 'field': 'entrada', 'sortable': True},
+                {'name': 'saida_intervalo', 'label': 'Saída Intervalo', 'field': 'saida_intervalo', 'sortable': True},
+                {'name': 'volta_intervalo', 'label': 'Volta Intervalo', 'field': 'volta_intervalo', 'sortable': True},
+                {'name': 'saida', 'label': 'Saída', 'field': 'saida', 'sortable': True},
+                {'name': 'horas_mes', 'label': 'Horas no Mês', 'field': 'horas_mes', 'sortable': True,
+                 ':format': '(m) => Math.floor(m / 60) + ":" + String(m % 60).padStart(2, "0")'},
+            ],
+            rows=[],
+            row_key='uid',
+            pagination={'rowsPerPage': 25, 'sortBy': 'nome', 'descending': False, 'page': 1, 'rowsNumber': 0},
+        ).classes('w-full').props(':rows-per-page-options="[25, 50, 100]"')
+
+        def carregar_pagina(pagination=None):
+            """Busca no repositório só a página pedida (ordem, filtro e paginação no servidor)."""
+            pag = dict(pagination or func_table.pagination)
+            data_iso = datas_select.value or datetime.now().strftime("%Y-%m-%d")
+            por_pagina = pag.get('rowsPerPage') or 0
+            inicio = (max(1, pag.get('page') or 1) - 1) * por_pagina
+            total, rows = config.repo.pagina_do_dia(data_iso, busca_in.value or '', pag.get('sortBy') or 'nome',
+                                                    bool(pag.get('descending')), inicio, por_pagina)
+            pag['rowsNumber'] = total
+            func_table.pagination = pag
+            func_table.rows = rows
+            func_table.update()
+
+        func_table.on('request', lambda e: carregar_pagina(e.args), js_handler='(p) => emit(p.pagination)')
 
         def desenhar_batidas_por_func():
-            batidas_container.clear()
-            data_iso = datas_select.value or datetime.now().strftime("%Y-%m-%d")
-            data_br = datetime.strptime(data_iso, "%Y-%m-%d").strftime("%d/%m/%Y")
-
-            for uid, nome in sorted(config.funcionarios.items(), key=lambda x: x[1].lower()):
-                dia = config.registros.get(uid, {}).get(data_iso, {})
-                with batidas_container:
-                    with ui.expansion(f'{nome} ({uid}) - {data_br}', value=False).classes('w-full'):
-                        with ui.card().classes('w-full'):
-                            rows = [{
-                                'entrada': dia.get('entrada', ''),
-                                'saida_intervalo': dia.get('saida_intervalo', ''),
-                                'volta_intervalo': dia.get('volta_intervalo', ''),
-                                'saida': dia.get('saida', ''),
-                            }]
-                            ui.table(
-                                columns=[
-                                    {'name': 'entrada', 'label': 'Entrada', 'field': 'entrada'},
-                                    {'name': 'saida_intervalo', 'label': 'Saída Intervalo', 'field': 'saida_intervalo'},
-                                    {'name': 'volta_intervalo', 'label': 'Volta Intervalo', 'field': 'volta_intervalo'},
-                                    {'name': 'saida', 'label': 'Saída', 'field': 'saida'},
-                                ],
-                                rows=rows,
-                            ).classes('w-full')
+            carregar_pagina({**func_table.pagination, 'page': 1})
+
+        def patch_batidas_por_func(batidas):
+            """Corrige as linhas da página atual; se a ordem é por horário/horas, relê a página."""
+            mes = (datas_select.value or '')[:7]
+            no_mes = [b for b in batidas if b[1][:7] == mes]
+            if not no_mes:
+                return
+            ordem = func_table.pagination.get('sortBy')
+            if ordem == 'horas_mes' or (ordem in config.EVENTOS and any(b[1] == datas_select.value for b in no_mes)):
+                carregar_pagina()
+                return
+            linhas = {r['uid']: r for r in func_table.rows}
+            if not any(b[0] in linhas for b in no_mes):
+                return
+            horas_mes = config.repo.horas.totais_do_mes(mes)
+            for uid, data_iso, ev, hora in no_mes:
+                if uid in linhas:
+                    if data_iso == datas_select.value:
+                        linhas[uid][ev] = hora
+                    linhas[uid]['horas_mes'] = horas_mes.get(uid, 0)
+            func_table.update()
 
         def atualizar_datas_select():
             """Recarrega as datas disponíveis e mantém a seleção quando possível."""
@@ -210,6 +349,7 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
             desenhar_batidas_por_func()
 
         datas_select.on_value_change(lambda _: desenhar_batidas_por_func())
+        busca_in.on_value_change(lambda _: desenhar_batidas_por_func())
 
         desenhar_batidas_por_func()
 
@@ -227,19 +367,42 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
                 rows=[],
             ).classes('w-1/2')
 
+        lobby_dia = None    # data mostrada no lobby_table
+
+        def _linha_lobby(hora, uid, ev, funcionarios):
+            return {'hora': hora, 'nome': funcionarios.get(uid, uid), 'evento': ev.replace('_', ' '), 'uid': uid}
+
         def atualizar_lobby_table():
             hoje = datetime.now().strftime("%Y-%m-%d")
-            items = []
-            for uid, dias in config.registros.items():
-                nome = config.funcionarios.get(uid, uid)
-                dia = dias.get(hoje, {})
-                for ev in config.EVENTOS:
-                    if ev in dia:
-                        items.append({'hora': dia[ev], 'nome': nome, 'evento': ev.replace('_', ' '), 'uid': uid})
-            items.sort(key=lambda r: r['hora'])
+            funcionarios = config.repo.funcionarios()
+            global lobby_dia
+            items = [_linha_lobby(hora, uid, ev, funcionarios) for hora, uid, ev in config.repo.batidas_do_dia(hoje)]
+            lobby_dia = hoje
             lobby_table.rows = items
             lobby_table.update()
 
+        def patch_lobby(batidas):
+            """
+            Insere na posição (por hora) as batidas novas de hoje; um evento regravado
+            (mesmo uid e evento, hora nova) sai da posição antiga antes.
+            """
+            hoje = datetime.now().strftime("%Y-%m-%d")
+            if lobby_dia != hoje:
+                atualizar_lobby_table()
+                return
+            novas = {(uid, ev): hora for uid, data_iso, ev, hora in batidas if data_iso == hoje}   # a última vale
+            if not novas:
+                return
+            funcionarios = config.repo.funcionarios()
+            trocados = {(uid, ev.replace('_', ' ')) for uid, ev in novas}
+            lobby_table.rows[:] = [r for r in lobby_table.rows if (r['uid'], r['evento']) not in trocados]
+            horas = [r['hora'] for r in lobby_table.rows]
+            for hora, uid, ev in sorted((hora, uid, ev) for (uid, ev), hora in novas.items()):
+                i = bisect.bisect_right(horas, hora)
+                horas.insert(i, hora)
+                lobby_table.rows.insert(i, _linha_lobby(hora, uid, ev, funcionarios))
+            lobby_table.update()
+
         ui.button('Atualizar', on_click=atualizar_lobby_table)
         atualizar_lobby_table()
 
@@ -249,21 +412,23 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
         def coletar_meses_disponiveis():
             """Retorna (options_dict, default_iso):
             options_dict = { 'YYYY-MM': 'MM/YYYY' }, ordenado do mais recente para o mais antigo."""
-            meses = set()
-            for _uid, dias in config.registros.items():
-                for data_iso in dias.keys():
-                    if len(data_iso) >= 7:
-                        meses.add(data_iso[:7])
-            if not meses:
+            ordenados = config.repo.meses()
+            if not ordenados:
                 atual_iso = datetime.now().strftime("%Y-%m")
                 return {atual_iso: datetime.strptime(atual_iso, "%Y-%m").strftime("%m/%Y")}, atual_iso
 
-            ordenados = sorted(meses, reverse=True)
             options = {m: datetime.strptime(m, "%Y-%m").strftime("%m/%Y") for m in ordenados}
             return options, ordenados[0]
 
         mes_options, mes_default = coletar_meses_disponiveis()
         mes_select = ui.select(options=mes_options, value=mes_default, label='Mês (MM/YYYY)').classes('min-w-[200px]')
+
+        def atualizar_meses_select():
+            new_opts, new_default = coletar_meses_disponiveis()
+            mes_select.options = new_opts
+            if mes_select.value not in new_opts:
+                mes_select.value = new_default
+            mes_select.update()
         abrir_btn = ui.button('Abrir no Excel', icon='folder_open', on_click=lambda: abrir_no_excel())
         abrir_btn.disable()
         
@@ -284,29 +449,92 @@ with ui.tab_panels(tabs, value='Conexão').classes('w-full'):
             except Exception as e:
                 ui.notify(f'Erro ao abrir: {e}', type='negative')
 
+        trabalho_atual = {'id': None}     # exportação disparada por este cliente
+
         def exportar_xlsx_ui():
-            import os, sys, subprocess
-            global last_export_path
             mes_iso = (mes_select.value or '').strip()   # já é 'YYYY-MM'
+            if trabalho_atual['id'] is not None:
+                ui.notify('Já existe uma exportação em andamento', type='warning'); return
             try:
-                caminho = export_excel.exportar_mes_xlsx(mes_iso, config.funcionarios, config.registros, config.EVENTOS)
-                ui.notify(f'Arquivo gerado: {caminho}', type='positive')
+                export_excel.calendario_mes(mes_iso)     # valida antes de copiar os dados
+                trabalho = exportacao.exportador.enviar(mes_iso, config.repo.funcionarios(),
+                                                        config.repo.minutos_do_mes(mes_iso), config.EVENTOS)
+            except Exception as e:
+                ui.notify(f'Erro: {e}', type='negative'); return
+            trabalho_atual['id'] = trabalho.id
+            atualizar_exportacao(trabalho.resumo())
+
+        def exportar_periodo_ui():
+            if trabalho_atual['id'] is not None:
+                ui.notify('Já existe uma exportação em andamento', type='warning'); return
+            inicio, fim = (inicio_in.value or '').strip(), (fim_in.value or '').strip()
+            uids = [u.strip().upper() for u in (uids_in.value or '').split(',') if u.strip()] or None
+            try:
+                export_excel.calendario_periodo(inicio, fim)     # valida antes de copiar os dados
+                trabalho = exportacao.exportador.enviar_periodo(
+                    inicio, fim, config.repo.funcionarios(), config.repo.minutos_do_periodo(inicio, fim),
+                    config.EVENTOS, uids=uids, mensal=mensal_sw.value)
+            except Exception as e:
+                ui.notify(f'Erro: {e}', type='negative'); return
+            trabalho_atual['id'] = trabalho.id
+            atualizar_exportacao(trabalho.resumo())
 
-                # dispara o download pelo navegador
-                ui.download(caminho)
+        def cancelar_exportacao():
+            if trabalho_atual['id'] is not None:
+                exportacao.exportador.cancelar(trabalho_atual['id'])
+                cancelar_btn.disable()
 
+        def atualizar_exportacao(resumo):
+            """Progresso/fim do trabalho deste cliente (mensagem 'exportacao' do difusor)."""
+            global last_export_path
+            if resumo['id'] != trabalho_atual['id']:
+                return
+            estado = resumo['estado']
+            if estado in ('na fila', 'gerando'):
+                exportar_btn.disable()
+                periodo_btn.disable()
+                cancelar_btn.enable()
+                progresso_box.set_visibility(True)
+                export_progress.value = resumo['feitos'] / max(1, resumo['total'])
+                export_status.text = f"{resumo['descricao']}: {estado} ({resumo['feitos']}/{resumo['total']} abas)"
+                return
+
+            trabalho_atual['id'] = None
+            exportar_btn.enable()
+            periodo_btn.enable()
+            progresso_box.set_visibility(False)
+            if estado == 'pronto':
+                import os
+                caminho = resumo['caminho']
+                ui.notify(f'Arquivo gerado: {caminho}', type='positive')
+                ui.download(caminho)    # dispara o download pelo navegador
                 # guarda caminho absoluto para o botão "Abrir no Excel"
                 last_export_path = os.path.abspath(caminho)
-                abrir_btn.enable()  # habilita o botão agora que existe um arquivo
+                abrir_btn.enable()
+            elif estado == 'cancelado':
+                ui.notify('Exportação cancelada', type='warning')
+            else:
+                ui.notify(f"Erro: {resumo['erro']}", type='negative')
 
-            except Exception as e:
-                ui.notify(f'Erro: {e}', type='negative')
+        exportar_btn = ui.button('Exportar mês (xlsx)', on_click=exportar_xlsx_ui, color='primary')
 
-        ui.button('Exportar mês (xlsx)', on_click=exportar_xlsx_ui, color='primary')
+        ui.label('Relatório de período').classes('text-lg font-medium')
+        with ui.row().classes('w-full items-end gap-4'):
+            inicio_in = ui.input('De (AAAA-MM-DD)').classes('w-40')
+            fim_in = ui.input('Até (AAAA-MM-DD)').classes('w-40')
+            uids_in = ui.input('UIDs (opcional, separados por vírgula)').classes('min-w-[280px]')
+            mensal_sw = ui.switch('Um arquivo por mês (.zip)')
+        periodo_btn = ui.button('Exportar período', on_click=exportar_periodo_ui, color='primary')
+
+        with ui.row().classes('w-full items-center gap-4') as progresso_box:
+            export_progress = ui.linear_progress(value=0, show_value=False).classes('w-64')
+            export_status = ui.label('')
+            cancelar_btn = ui.button('Cancelar', on_click=cancelar_exportacao, color='red').props('outline')
+        progresso_box.set_visibility(False)
         ui.label('Gera 1 arquivo por mês, com 1 aba por funcionário + aba Resumo. "Horas" no formato [h]:mm.')
 
 # ====== Downloads (estáticos) ======
-app.add_static_files('/data', '.')   # /data/funcionarios.json, /data/registros.json e /data/export/...
+app.add_static_files('/data', '.')   # /data/funcionarios.json, /data/registros/YYYY-MM.json e /data/export/...
 
 # ===================== Timers e Handlers =====================
 def push_log(texto, tipo="info"):
@@ -315,63 +543,61 @@ def push_log(texto, tipo="info"):
     elif tipo == "err":
         ui.notify(texto, type='negative', position='top-right')
 
-def ui_tick():
+def atualizar_status():
     # status destacado do canto superior direito
-    if config.serial_connected:
-        status_label.text = f'CONECTADO ({config.PORTA_ATUAL})'
+    conectados = terminais.gerenciador.conectados()
+    if conectados:
+        status_label.text = (f'CONECTADO ({conectados[0].id})' if len(conectados) == 1
+                             else f'CONECTADO ({len(conectados)} terminais)')
         status_label.classes(replace='text-white bg-green-600 px-3 py-1 rounded font-bold shadow')
     else:
         status_label.text = 'DESCONECTADO'
         status_label.classes(replace='text-white bg-red-600 px-3 py-1 rounded font-bold shadow pulse')
 
-    def _refresh_views():
-        try:
-            atualizar_tabela_batidas_por_func()
-        except:
-            pass
-        try:
-            atualizar_lobby_table()
-        except:
-            pass
-        try:
-            atualizar_datas_select()
-        except:
-            pass
-        try:
-            new_opts, new_default = coletar_meses_disponiveis()
-            mes_select.options = new_opts
-            if mes_select.value not in new_opts:
-                mes_select.value = new_default
-            mes_select.update()
-        except Exception as e:
-            print(f"[WARN] Falha ao atualizar lista de meses: {e}")
-
-    try:
-        while True:
-            kind, payload = config.serial_queue.get_nowait()
-
-            if kind == "ok":
-                push_log(payload, "ok")
-                _refresh_views()
-
-            elif kind == "err":
-                push_log(payload, "err")
-                _refresh_views()
-
-            elif kind == "log":
-                push_log(payload, "info")
-
+def aplicar_lote(lote):
+    """Lote agrupado do difusao: notifica as mensagens e corrige só o que mudou."""
+    with status_label:      # contexto deste cliente para o ui.notify
+        if lote['descartados']:
+            ver = f" (ver {config.ARQ_AUDITORIA})" if config.ARQ_AUDITORIA else ""
+            ui.notify(f"{lote['descartados']} avisos antigos descartados{ver}", type='warning', position='top-right')
+        for ev in lote['mensagens']:
+            kind, payload = ev
+            if kind in ("ok", "err"):
+                push_log(payload if ev.vezes == 1 else f"{payload} (x{ev.vezes})", kind)
+            elif kind == "exportacao":
+                atualizar_exportacao(payload)
             elif kind == "uid_captured":
                 uid_in.value = payload
                 uid_in.update()
                 ui.notify(f'UID capturado: {payload}', type='positive')
 
-            elif kind == "update_data": 
-                push_log("Dados de registro atualizados. Aplicando atualizações na UI.", "info")
-                _refresh_views() 
-
-    except queue.Empty:
-        pass
+        if lote['funcionarios']:
+            atualizar_remover_ui(manter=True)
+        if lote['completo'] or lote['funcionarios']:
+            carregar_pagina()
+            atualizar_lobby_table()
+            atualizar_datas_select()
+            atualizar_meses_select()
+            return
 
-ui.timer(0.2, ui_tick)
-ui.run(title='Ponto NFC', reload=False)
+        batidas = lote['batidas']
+        if not batidas:
+            return
+        if any(data_iso not in datas_select.options for _u, data_iso, _ev, _h in batidas):
+            atualizar_datas_select()
+        if any(data_iso[:7] not in mes_select.options for _u, data_iso, _ev, _h in batidas):
+            atualizar_meses_select()
+        patch_batidas_por_func(batidas)
+        patch_lobby(batidas)
+
+_assinatura = difusao.difusor.assinar(aplicar_lote)
+ui.context.client.on_delete(lambda: difusao.difusor.cancelar(_assinatura))
+
+def atualizar_conexao():
+    atualizar_status()
+    atualizar_terminais_table()
+    atualizar_metricas()
+    atualizar_perfil()
+
+ui.timer(1.0, atualizar_conexao)
+ui.run(title='Ponto NFC', reload=False, port=config.UI_PORTA)
@@ -0,0 +1,169 @@
+import bisect, threading
+
+# MÉTRICAS
+# Histogramas e medidores do processo, servidos em /metrics (formato texto do
+# Prometheus) e resumidos no painel da aba Conexão. Os histogramas têm limites fixos:
+# observar() é um bisect e três somas sob um lock sem disputa (~1 µs), barato o bastante
+# para o caminho da batida. Medidores (profundidade de filas, descartes) não custam nada
+# até alguém ler: são funções chamadas só na hora de exportar.
+LATENCIA_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.5)
+DURACAO_S = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BYTES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+QUANTIDADE = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histograma:
+    """Contagens por faixa (le = limite superior), soma e total, como no Prometheus."""
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, limites):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = tuple(limites)
+        self._lock = threading.Lock()
+        self._contagens = [0] * (len(self.limites) + 1)     # a última faixa é +Inf
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self._contagens[i] += 1
+            self.soma += valor
+            self.total += 1
+
+    def copia(self):
+        """(contagens, soma, total) lidos juntos."""
+        with self._lock:
+            return list(self._contagens), self.soma, self.total
+
+    def quantil(self, q):
+        """Estimativa (interpolada dentro da faixa) do quantil q; None sem observações."""
+        contagens, _soma, total = self.copia()
+        if not total:
+            return None
+        alvo, acumulado = q * total, 0
+        for i, n in enumerate(contagens):
+            if n and acumulado + n >= alvo:
+                if i == len(self.limites):
+                    return self.limites[-1]     # acima do último limite: só se sabe que passou dele
+                inicio = self.limites[i - 1] if i else 0
+                return inicio + (self.limites[i] - inicio) * (alvo - acumulado) / n
+            acumulado += n
+        return self.limites[-1]
+
+    def linhas(self):
+        contagens, soma, total = self.copia()
+        out, acumulado = [], 0
+        for limite, n in zip(self.limites + ("+Inf",), contagens):
+            acumulado += n
+            out.append(f'{self.nome}_bucket{{le="{limite if limite == "+Inf" else _num(limite)}"}} {acumulado}')
+        out.append(f"{self.nome}_sum {_num(soma)}")
+        out.append(f"{self.nome}_count {total}")
+        return out
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._lock = threading.Lock()
+        self.valor = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+    def linhas(self):
+        return [f"{self.nome} {_num(self.valor)}"]
+
+
+class Medidor:
+    """
+    Valor lido na hora de exportar: `ler()` devolve um número ou, com `rotulo`, um dict
+    {valor do rótulo: número} (ex.: pendentes por assinante do barramento). `tipo`
+    'counter' para totais que só crescem.
+    """
+    def __init__(self, nome, ajuda, ler, rotulo=None, tipo="gauge"):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.ler = ler
+        self.rotulo = rotulo
+        self.tipo = tipo
+
+    def valores(self):
+        v = self.ler()
+        return v if self.rotulo else {None: v}
+
+    def linhas(self):
+        return [f'{self.nome}{{{self.rotulo}="{r}"}} {_num(v)}' if r is not None else f"{self.nome} {_num(v)}"
+                for r, v in self.valores().items()]
+
+
+class Registro:
+    """Todas as métricas do processo, por nome. Registrar de novo o mesmo nome devolve a existente."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def histograma(self, nome, ajuda, limites):
+        return self._registrar(Histograma(nome, ajuda, limites))
+
+    def contador(self, nome, ajuda):
+        return self._registrar(Contador(nome, ajuda))
+
+    def medidor(self, nome, ajuda, ler, rotulo=None, tipo="gauge"):
+        return self._registrar(Medidor(nome, ajuda, ler, rotulo, tipo))
+
+    def metricas(self):
+        with self._lock:
+            return list(self._metricas.values())
+
+    def texto(self):
+        """Exposição no formato texto do Prometheus (version=0.0.4)."""
+        out = []
+        for m in self.metricas():
+            try:
+                linhas = m.linhas()
+            except Exception as e:      # um medidor quebrado não derruba o resto
+                out.append(f"# {m.nome}: {e}")
+                continue
+            out += [f"# HELP {m.nome} {m.ajuda}", f"# TYPE {m.nome} {m.tipo}"] + linhas
+        return "\n".join(out) + "\n"
+
+
+registro = Registro()
+
+# caminho da batida
+ack = registro.histograma("ponto_batida_ack_segundos",
+                          "UID lido na serial até o OK/ERR escrito de volta", LATENCIA_S)
+decisao = registro.histograma("ponto_decisao_segundos",
+                              "funcoes.decidir_batida (anti-dupe, cadastro, próximo evento)", LATENCIA_S)
+# gravação
+commit_segundos = registro.histograma("ponto_commit_segundos",
+                                      "repo.persistir_eventos de um lote da persistência em grupo", LATENCIA_S)
+commit_batidas = registro.histograma("ponto_commit_batidas", "Registros por lote gravado", QUANTIDADE)
+json_segundos = registro.histograma("ponto_salvar_json_segundos", "data.salvar_json (escrita + os.replace)", DURACAO_S)
+json_bytes = registro.histograma("ponto_salvar_json_bytes", "Bytes escritos por data.salvar_json", BYTES)
+journal_segundos = registro.histograma("ponto_journal_segundos",
+                                       "data.anexar_journal (escrita + fsync)", LATENCIA_S)
+journal_bytes = registro.histograma("ponto_journal_bytes", "Bytes anexados ao journal por chamada", BYTES)
+# sincronização EDUMP
+sync_segundos = registro.histograma("ponto_sync_segundos", "Sincronização EDUMP após conectar", DURACAO_S)
+sync_registros = registro.histograma("ponto_sync_registros", "Registros recebidos por sincronização", QUANTIDADE)
+sync_importados = registro.contador("ponto_sync_importados_total", "Batidas offline importadas pelo EDUMP")
+# telas e exportação
+entrega_segundos = registro.histograma("ponto_ui_entrega_segundos",
+                                       "Difusor: montar e entregar um lote às telas", LATENCIA_S)
+export_segundos = registro.histograma("ponto_export_segundos",
+                                      "Exportação concluída, do pedido ao arquivo pronto", DURACAO_S)
@@ -0,0 +1,208 @@
+from array import array
+from datetime import date
+import config
+
+
+# BATIDAS EM MINUTOS (representação compacta para cálculo de horas)
+# Os registros ficam como {"entrada": "HH:MM", ...} por dia (JSON/SQLite). Para somar
+# horas de meses inteiros, cada funcionário vira um BatidasMinutos: um array('h') com 4
+# slots por dia, na ordem de config.EVENTOS, em minutos desde 00:00 (VAZIO = sem batida).
+# A conversão só acontece na fronteira (de_dias/para_dias); as contas de horas são feitas
+# sobre o array inteiro de uma vez e ficam guardadas (trabalhados) até o próximo preencher().
+# Um turno que vira a meia-noite fica no dia da entrada: horários menores que a entrada
+# são do dia seguinte.
+VAZIO = -1
+_N = len(config.EVENTOS)
+_ENTRADA, _SAIDA_INT, _VOLTA_INT, _SAIDA = (config.EVENTOS.index(ev) for ev in
+                                             ("entrada", "saida_intervalo", "volta_intervalo", "saida"))
+_DIA = 24 * 60
+_np = None
+
+def numpy():
+    """O módulo numpy, ou None se não estiver instalado (importado só no primeiro cálculo)."""
+    global _np
+    if _np is None:
+        try:
+            import numpy as np      # opcional: sem ele as mesmas contas rodam em Python puro
+        except ImportError:
+            np = False
+        _np = np
+    return _np or None
+
+def minutos_hhmm(s):
+    """'HH:MM' -> minutos desde 00:00 (None se vazio/inválido)."""
+    try:
+        h, m = s.split(":")
+        h, m = int(h), int(m)
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= h < 24 and 0 <= m < 60:
+        return h * 60 + m
+    return None
+
+def hhmm(minutos):
+    """Minutos desde 00:00 -> 'HH:MM' ('' se VAZIO)."""
+    return "" if minutos < 0 else f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def duracao(minutos):
+    """Minutos -> 'H:MM' (horas podem passar de 24)."""
+    return f"{minutos // 60}:{minutos % 60:02d}"
+
+def fracao_dia(minutos):
+    """Minutos -> fração de dia (padrão Excel)."""
+    return minutos * 60 / 86400.0
+
+def minutos_trabalhados(e, si, vi, s):
+    """
+    (saida - entrada) - (volta_intervalo - saida_intervalo) de um dia, em minutos: 0 sem
+    entrada ou saída, o intervalo só desconta com as duas batidas, nunca negativo.
+    """
+    if e == VAZIO or s == VAZIO:
+        return 0
+    base = (s - e) % _DIA
+    if si != VAZIO and vi != VAZIO:
+        base -= (vi - e) % _DIA - (si - e) % _DIA
+    return base if base > 0 else 0
+
+
+class DiaMinutos:
+    """Visão de um dia dentro de BatidasMinutos (não copia nada)."""
+    __slots__ = ("_batidas", "_i")
+
+    def __init__(self, batidas, i):
+        self._batidas = batidas
+        self._i = i
+
+    def _get(self, k):
+        v = self._batidas.valores[self._i * _N + k]
+        return None if v == VAZIO else v
+
+    @property
+    def data(self):
+        return date.fromordinal(self._batidas.inicio + self._i).isoformat()
+
+    entrada = property(lambda self: self._get(_ENTRADA))
+    saida_intervalo = property(lambda self: self._get(_SAIDA_INT))
+    volta_intervalo = property(lambda self: self._get(_VOLTA_INT))
+    saida = property(lambda self: self._get(_SAIDA))
+
+    def como_dict(self):
+        v = self._batidas.valores[self._i * _N:(self._i + 1) * _N]
+        return {ev: hhmm(m) for ev, m in zip(config.EVENTOS, v) if m != VAZIO}
+
+
+class BatidasMinutos:
+    """
+    Batidas de um funcionário em dias consecutivos a partir de `inicio` (ordinal de
+    date). `valores[i * 4 + k]` = minutos do evento config.EVENTOS[k] no i-ésimo dia.
+    """
+    __slots__ = ("inicio", "valores", "_trabalhados")
+
+    def __init__(self, inicio, valores, trabalhados=None):
+        self.inicio = inicio
+        self.valores = valores
+        self._trabalhados = trabalhados     # array('i') por dia, ou None (calcula na 1ª consulta)
+
+    @classmethod
+    def vazio(cls, inicio, n_dias):
+        """n_dias sem batidas a partir de `inicio` (ISO)."""
+        return cls(date.fromisoformat(inicio).toordinal(), array("h", [VAZIO]) * (n_dias * _N),
+                   array("i", [0]) * n_dias)
+
+    @classmethod
+    def juntar(cls, partes):
+        """Concatena BatidasMinutos de intervalos consecutivos."""
+        valores = array("h")
+        trabalhados = array("i")
+        for parte in partes:
+            valores += parte.valores
+            trabalhados += parte.trabalhados()
+        return cls(partes[0].inicio, valores, trabalhados)
+
+    @classmethod
+    def de_dias(cls, dias, inicio, n_dias):
+        """{data_iso: {evento: 'HH:MM'}} -> BatidasMinutos de n_dias a partir de `inicio` (ISO)."""
+        batidas = cls.vazio(inicio, n_dias)
+        batidas.preencher(dias)
+        return batidas
+
+    def preencher(self, dias):
+        """Grava os eventos de {data_iso: {evento: 'HH:MM'}}; dias fora do intervalo são ignorados."""
+        valores, n_dias = self.valores, len(self)
+        self._trabalhados = None
+        for data_iso, dia in dias.items():
+            try:
+                i = date.fromisoformat(data_iso).toordinal() - self.inicio
+            except ValueError:
+                continue
+            if 0 <= i < n_dias:
+                for k, ev in enumerate(config.EVENTOS):
+                    m = minutos_hhmm(dia.get(ev))
+                    if m is not None:
+                        valores[i * _N + k] = m
+
+    def definir(self, data_iso, evento, hora):
+        """Grava um evento e recalcula só aquele dia; devolve a variação dos minutos trabalhados."""
+        i = date.fromisoformat(data_iso).toordinal() - self.inicio
+        m = minutos_hhmm(hora)
+        if not 0 <= i < len(self) or m is None or evento not in config.EVENTOS:
+            return 0
+        trabalhados = self.trabalhados()
+        v = self.valores
+        v[i * _N + config.EVENTOS.index(evento)] = m
+        b = i * _N
+        novo = minutos_trabalhados(v[b + _ENTRADA], v[b + _SAIDA_INT], v[b + _VOLTA_INT], v[b + _SAIDA])
+        delta, trabalhados[i] = novo - trabalhados[i], novo
+        return delta
+
+    def copia(self):
+        """Cópia independente (valores e minutos por dia)."""
+        return BatidasMinutos(self.inicio, self.valores[:], self.trabalhados()[:])
+
+    def para_dias(self):
+        """Volta para {data_iso: {evento: 'HH:MM'}} (só os dias com batida)."""
+        out = {}
+        for i in range(len(self)):
+            dia = self[i].como_dict()
+            if dia:
+                out[self[i].data] = dia
+        return out
+
+    def __len__(self):
+        return len(self.valores) // _N
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return DiaMinutos(self, i)
+
+    def fatia(self, inicio, n_dias):
+        """Os n_dias a partir de `inicio` (ISO) como um novo BatidasMinutos (dias de fora ficam vazios)."""
+        i = date.fromisoformat(inicio).toordinal() - self.inicio
+        if 0 <= i and i + n_dias <= len(self):
+            trabalhados = self._trabalhados[i:i + n_dias] if self._trabalhados is not None else None
+            return BatidasMinutos(self.inicio + i, self.valores[i * _N:(i + n_dias) * _N], trabalhados)
+        return BatidasMinutos.de_dias(self.para_dias(), inicio, n_dias)
+
+    def trabalhados(self):
+        """Minutos trabalhados de cada dia (minutos_trabalhados), calculados de uma vez para o array todo."""
+        if self._trabalhados is None:
+            self._trabalhados = array("i", self._calcular())
+        return self._trabalhados
+
+    def _calcular(self):
+        v = self.valores
+        np = numpy()
+        if np is not None:
+            m = np.frombuffer(v, dtype=np.int16).reshape(-1, _N).astype(np.int32)
+            e, si, vi, s = m[:, _ENTRADA], m[:, _SAIDA_INT], m[:, _VOLTA_INT], m[:, _SAIDA]
+            com_turno = (e != VAZIO) & (s != VAZIO)
+            base = np.where(com_turno, (s - e) % _DIA, 0)
+            intervalo = (vi - e) % _DIA - (si - e) % _DIA
+            base -= np.where(com_turno & (si != VAZIO) & (vi != VAZIO), intervalo, 0)
+            return np.maximum(base, 0).tolist()
+        return list(map(minutos_trabalhados, v[_ENTRADA::_N], v[_SAIDA_INT::_N], v[_VOLTA_INT::_N], v[_SAIDA::_N]))
+
+    def chave(self):
+        """Bytes que identificam as batidas (para chaves de cache)."""
+        return self.valores.tobytes()
@@ -0,0 +1,246 @@
+import os, sys, time, atexit, threading, tracemalloc
+from collections import Counter
+from datetime import datetime
+import config
+import barramento
+
+# PERFIL SOB DEMANDA
+# Para descobrir por que uma estação ficou lenta sem anexar um depurador. Desligado,
+# não custa nada: não há hook, checagem nem thread no caminho da batida. Uma captura de
+# N segundos (botão na aba Conexão, ou PONTO_PERFIL=N no ambiente ao iniciar) sobe uma
+# thread que amostra a pilha de todas as threads a cada config.PERFIL_INTERVALO_MS
+# (sys._current_frames). Uma amostragem serve igual para as threads da serial, o loop da
+# interface e a exportação sem instrumentar cada chamada, e o cProfile, que observa uma
+# thread só, não serviria. Com `memoria`, o tracemalloc compara o heap ao longo da
+# captura (opcional: deixa o processo várias vezes mais lento enquanto dura).
+# Exportações pedidas durante a captura rodam sob cProfile no processo do pool
+# (exportacao._executar) e deixam um .pstats ao lado.
+# Saída em export/: perfil_<instante>.txt (relatório) e .folded (pilhas para flamegraph).
+AREAS = {       # área -> funções (nome ou Classe.nome) que, na pilha, classificam a amostra
+    # cada estágio da serial roda na sua thread: leitura (serial_worker), decisão + ACK e
+    # o commit em grupo, que não têm serial_worker na pilha
+    "serial": ("serial_worker", "_ler_uids", "_do_initial_sync", "_estagio_decisao",
+               "PersistenciaEmGrupo._loop", "persistir_eventos"),
+    "telas": ("_entregar", "aplicar_lote"),     # entrega do difusor e atualização das telas
+    "exportacao": ("exportar_mes_xlsx", "exportar_periodo_xlsx"),
+}
+ESPERA = {"threading.py", "queue.py", "selectors.py", "serialposix.py", "connection.py", "popen_fork.py",
+          "thread.py", "runners.py"}     # arquivo da função no topo -> parada numa espera em C (uvloop, pool)
+PASTA = "export"
+
+
+def _quadro(f):
+    codigo = f.f_code
+    return f"{os.path.basename(codigo.co_filename)}:{getattr(codigo, 'co_qualname', codigo.co_name)}"
+
+def _area(pilha):
+    nomes = set()
+    for q in pilha:
+        nome = q.rsplit(":", 1)[1]
+        nomes.update((nome, nome.rsplit(".", 1)[-1]))      # Classe.metodo e só metodo
+    for area, funcoes in AREAS.items():
+        if nomes.intersection(funcoes):
+            return area
+    return "outros"
+
+def _cpu_threads():
+    """{(ident, nome): segundos de CPU da thread}; vazio onde não há relógio por thread (fora do Linux)."""
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return {}
+    out = {}
+    for t in threading.enumerate():
+        try:
+            out[(t.ident, t.name)] = time.clock_gettime(time.pthread_getcpuclockid(t.ident))
+        except (OSError, TypeError):
+            pass    # terminou entre enumerate() e a leitura
+    return out
+
+def _esperando(pilha):
+    """Estimativa: a função no topo é de espera (lock, fila, select, leitura da serial)."""
+    return pilha[-1].split(":", 1)[0] in ESPERA
+
+
+class Captura:
+    """Uma captura; `estado` vai de 'capturando' a 'pronto' (ou 'erro'), com `arquivos` gerados."""
+    def __init__(self, segundos, memoria=False, intervalo_ms=None):
+        self.segundos = segundos
+        self.memoria = memoria
+        self.intervalo_s = (intervalo_ms or config.PERFIL_INTERVALO_MS) / 1000.0
+        self.nome = f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.estado = "capturando"
+        self.arquivos = []
+        self.erro = None
+        self.amostras = 0
+        self._pilhas = Counter()        # (thread, pilha da raiz ao topo) -> amostras
+        self._heap = []                 # (segundos desde o início, tracemalloc.Snapshot)
+        self._cpu = {}
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def ativa(self):
+        return self.estado == "capturando"
+
+    def arquivo(self, sufixo):
+        return os.path.join(PASTA, self.nome + sufixo)
+
+    def iniciar(self):
+        self._inicio = time.time()
+        self._ligou_tracemalloc = self.memoria and not tracemalloc.is_tracing()
+        if self._ligou_tracemalloc:
+            tracemalloc.start()
+        self._thread = threading.Thread(target=self._rodar, name="perfil", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self, timeout=30.0):
+        """Encerra antes do tempo (ou espera o fim) e devolve os arquivos gerados."""
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return self.arquivos
+
+    def _rodar(self):
+        fim = time.monotonic() + self.segundos
+        marcas = [self.segundos * i / 4 for i in range(5)]      # snapshots do heap: 0, 1/4 ... fim
+        proprio = threading.get_ident()
+        cpu_inicio = _cpu_threads()
+        try:
+            while True:
+                agora = time.monotonic()
+                decorrido = self.segundos - (fim - agora)
+                if self.memoria and marcas and decorrido >= marcas[0]:
+                    marcas.pop(0)
+                    self._heap.append((decorrido, tracemalloc.take_snapshot()))
+                if agora >= fim or self._parar.wait(self.intervalo_s):
+                    break
+                self._amostrar(proprio)
+            if self.memoria and (not self._heap or self._heap[-1][0] < decorrido):
+                self._heap.append((self.segundos - (fim - time.monotonic()), tracemalloc.take_snapshot()))
+            self._fim = time.time()
+            self._cpu = {chave: cpu - cpu_inicio.get(chave, 0.0) for chave, cpu in _cpu_threads().items()
+                         if chave[0] != proprio}
+            self._gravar()
+            self.estado = "pronto"
+            barramento.eventos.publicar("ok", f"[PERFIL] Relatório em {self.arquivos[0]}")
+        except Exception as e:
+            self.estado, self.erro = "erro", str(e)
+            barramento.eventos.publicar("err", f"[PERFIL] Falha na captura: {e}")
+        finally:
+            if self._ligou_tracemalloc:
+                tracemalloc.stop()
+
+    def _amostrar(self, proprio):
+        nomes = {t.ident: t.name for t in threading.enumerate()}
+        for ident, f in sys._current_frames().items():
+            if ident == proprio:
+                continue
+            pilha = []
+            while f is not None:
+                pilha.append(_quadro(f))
+                f = f.f_back
+            self._pilhas[(nomes.get(ident, str(ident)), tuple(reversed(pilha)))] += 1
+        self.amostras += 1
+
+    # ---- relatório ----
+    def _gravar(self):
+        os.makedirs(PASTA, exist_ok=True)
+        exportacoes = [os.path.join(PASTA, a) for a in sorted(os.listdir(PASTA))
+                       if a.startswith(self.nome + "_export") and a.endswith(".pstats")]
+        with open(self.arquivo(".folded"), "w", encoding="utf-8") as f:
+            for (thread, pilha), n in self._pilhas.most_common():
+                f.write(";".join((thread,) + pilha) + f" {n}\n")
+        relatorio = self._relatorio()
+        if exportacoes:
+            relatorio += ["", "== Exportações sob cProfile (python -m pstats ARQUIVO) =="] + exportacoes
+        with open(self.arquivo(".txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(relatorio) + "\n")
+        self.arquivos = [self.arquivo(".txt"), self.arquivo(".folded")] + exportacoes
+
+    def _relatorio(self):
+        inicio = datetime.fromtimestamp(self._inicio).isoformat(timespec="seconds")
+        out = [f"Perfil {self.nome}: {inicio}, {self._fim - self._inicio:.1f} s, "
+               f"{self.amostras} amostras a cada {self.intervalo_s * 1000:g} ms",
+               "Amostras 'executando' excluem as que estavam numa função de espera (lock, fila, select,",
+               "leitura da serial). Pilhas completas no .folded (flamegraph.pl, speedscope).", ""]
+        por_area = {}
+        for (_thread, pilha), n in self._pilhas.items():
+            a = por_area.setdefault(_area(pilha), [0, 0, Counter(), Counter()])
+            a[0] += n
+            if not _esperando(pilha):
+                a[1] += n
+                a[2][pilha[-1]] += n                    # no topo (tempo próprio)
+                for q in set(pilha):
+                    a[3][q] += n                        # na pilha (cumulativo)
+        out.append(f"{'área':<12} {'amostras':>9} {'executando':>11}")
+        for area in list(AREAS) + ["outros"]:
+            total, ativo, _t, _c = por_area.get(area, (0, 0, None, None))
+            out.append(f"{area:<12} {total:>9} {ativo:>11}")
+        for area in list(AREAS) + ["outros"]:
+            if area not in por_area or not por_area[area][1]:
+                continue
+            total, ativo, topo, cumulativo = por_area[area]
+            out += ["", f"== {area}: no topo da pilha (executando) =="]
+            out += [f"{n:>7} {n / ativo:>6.1%}  {q}" for q, n in topo.most_common(15)]
+            out += ["", f"== {area}: na pilha (cumulativo) =="]
+            out += [f"{n:>7} {n / ativo:>6.1%}  {q}" for q, n in cumulativo.most_common(15)]
+        if self._cpu:
+            duracao = self._fim - self._inicio
+            out += ["", "== CPU por thread (threads vivas no fim) =="]
+            for (_ident, nome), cpu in sorted(self._cpu.items(), key=lambda x: -x[1])[:15]:
+                out.append(f"{cpu:>8.2f} s {cpu / duracao:>6.1%}  {nome}")
+        if self._heap:
+            out += self._relatorio_memoria()
+        return out
+
+    def _relatorio_memoria(self):
+        filtros = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        fotos = [(t, s.filter_traces(filtros)) for t, s in self._heap]
+        out = ["", "== Memória (tracemalloc) =="]
+        for t, s in fotos:
+            out.append(f"{t:>7.1f} s  {sum(st.size for st in s.statistics('filename')) / 1024:>10.1f} KiB")
+        out += ["", f"== Maior crescimento entre {fotos[0][0]:.1f} s e {fotos[-1][0]:.1f} s =="]
+        crescimento = [st for st in fotos[-1][1].compare_to(fotos[0][1], "lineno") if st.size_diff > 0]
+        for st in crescimento[:20]:
+            quadro = st.traceback[0]
+            out.append(f"{st.size_diff / 1024:>+10.1f} KiB {st.count_diff:>+8} blocos  "
+                       f"{os.path.basename(quadro.filename)}:{quadro.lineno}")
+        return out
+
+
+atual = None        # captura em andamento ou a última feita
+_lock = threading.Lock()
+
+def iniciar(segundos, memoria=False, intervalo_ms=None):
+    """Começa uma captura de `segundos`; None se já houver uma em andamento."""
+    global atual
+    with _lock:
+        if atual is not None and atual.ativa:
+            return None
+        atual = Captura(segundos, memoria, intervalo_ms).iniciar()
+        return atual
+
+def em_andamento():
+    captura = atual
+    return captura is not None and captura.ativa
+
+def arquivo_export(trabalho_id):
+    """Caminho do .pstats de uma exportação pedida durante a captura (None fora dela)."""
+    captura = atual
+    if captura is None or not captura.ativa:
+        return None
+    return os.path.abspath(captura.arquivo(f"_export{trabalho_id}.pstats"))
+
+def iniciar_pelo_ambiente():
+    """PONTO_PERFIL=N captura N segundos ao iniciar (PONTO_PERFIL_MEMORIA=1 liga o tracemalloc)."""
+    try:
+        segundos = float(os.environ.get("PONTO_PERFIL") or 0)
+    except ValueError:
+        print("[WARN] PONTO_PERFIL deve ser um número de segundos", file=sys.stderr)
+        return None
+    if segundos <= 0:
+        return None
+    captura = iniciar(segundos, memoria=os.environ.get("PONTO_PERFIL_MEMORIA", "0") != "0")
+    if captura is not None:
+        atexit.register(captura.parar)      # processo curto (CLI): grava o que houver ao sair
+    return captura
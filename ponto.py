@@ -0,0 +1,198 @@
+"""
+Ponto sem a interface: tarefas em lote (cron) e o servidor da tela, por linha de comando.
+
+    python -m ponto import-dump ARQUIVO [--placa 1A2B3C4D] [--terminal COM3] [--binario]
+    python -m ponto export 2024-03
+    python -m ponto export --inicio 2024-01-01 --fim 2024-03-31 [--mensal] [--uids A1B2C3D4,...]
+    python -m ponto stats [--mes 2024-03] [--funcionarios]
+    python -m ponto serve [--porta 8080]
+    python -m ponto migrate
+
+`--dados PASTA` (antes do subcomando) troca a pasta dos dados (funcionarios.json,
+registros/, ponto.db, export/); o padrão é a pasta atual. Cada subcomando importa só o
+que usa: import-dump e stats não carregam openpyxl, nicegui nem pyserial, export carrega
+só o openpyxl e serve sobe interface.py como antes.
+import-dump, export e stats abrem os dados sem efeitos colaterais: não migram o formato
+antigo nem sobem o compactador do journal. Isso fica com o serve e com o migrate.
+O serve segura a trava ponto.lock (config.ARQ_TRAVA) enquanto roda. import-dump e migrate
+escrevem no journal e no sync_cursor.json, que o serve também escreve e compacta, e o
+serve não veria os registros importados: com a trava ocupada eles param com erro (saída 2)
+sem tocar nos dados. Importe com o serve parado ou deixe a placa sincronizar pela serial.
+export e stats só leem e rodam a qualquer hora.
+"""
+import os, sys, argparse
+from contextlib import contextmanager
+
+_AQUI = os.path.dirname(os.path.abspath(__file__))
+if _AQUI not in sys.path:
+    sys.path.insert(0, _AQUI)     # os módulos continuam importáveis depois do chdir de --dados
+
+
+def _repo():
+    import config
+    import data
+    import repositorio
+    if config.BACKEND == "json" and data.precisa_migrar(config.ARQ_REG, config.DIR_REG):
+        raise ValueError(f"{config.ARQ_REG} ainda está no formato antigo; rode `python -m ponto migrate` antes")
+    config.repo = repositorio.criar()
+    config.repo.carregar(manutencao=False)
+    return config.repo
+
+@contextmanager
+def _exclusivo(comando):
+    """Segura a trava dos dados durante `comando`; recusa se o serve (ou outro lote) a tem."""
+    import config
+    import data
+    if not data.travar(config.ARQ_TRAVA):
+        raise ValueError(f"{config.ARQ_TRAVA} está travado (o serve está rodando?); "
+                         f"{comando} precisa dos dados só para si")
+    try:
+        yield
+    finally:
+        data.destravar(config.ARQ_TRAVA)
+
+
+# SUBCOMANDOS
+def importar_dump(args):
+    """Mescla um EDUMP salvo em arquivo (linhas JSON ou quadros do EDUMP_BIN)."""
+    import config
+    import data
+    import funcoes
+    with open(args.arquivo, "rb") as f:
+        buf = f.read()
+    with _exclusivo("import-dump"):
+        repo = _repo()
+        placa = args.placa.upper() if args.placa else None
+        desde = data.ler_cursor(config.ARQ_CURSOR, placa) if placa else None
+        m = funcoes.MescladorIncremental(repo, terminal=args.terminal, lote=config.EDUMP_LOTE, desde_seq=desde)
+        invalidos = 0
+        if args.binario:
+            regs, invalidos = funcoes.decodificar_edump_bin(buf)
+            for uid, data_iso, hora, seq in regs:
+                m.adicionar_registro(uid, data_iso, hora, seq)
+        else:
+            for linha in buf.decode("utf-8", errors="ignore").splitlines():
+                m.adicionar(linha)
+        m.confirmar()
+        if placa and m.ultimo_seq is not None:
+            data.salvar_cursor(config.ARQ_CURSOR, placa, m.ultimo_seq + 1)
+    print(f"{m.recebidos} registros lidos: {m.novos} novos, {m.repetidos} repetidos, "
+          f"{m.ignorados} ignorados" + (f", {invalidos} quadros com CRC inválido" if invalidos else ""))
+    return 0
+
+def exportar(args):
+    """Gera o .xlsx de um mês ou o relatório de um período em export/."""
+    import config
+    import export_excel
+    if bool(args.mes) == bool(args.inicio and args.fim):
+        print("informe MES (YYYY-MM) ou --inicio e --fim (YYYY-MM-DD)", file=sys.stderr)
+        return 2
+    repo = _repo()
+    if args.mes:
+        export_excel.calendario_mes(args.mes)       # valida antes de ler os dados
+        caminho = export_excel.exportar_mes_xlsx(args.mes, repo.funcionarios(), repo.minutos_do_mes(args.mes),
+                                                 config.EVENTOS)
+    else:
+        export_excel.calendario_periodo(args.inicio, args.fim)
+        uids = [u.strip().upper() for u in args.uids.split(",") if u.strip()] if args.uids else None
+        caminho = export_excel.exportar_periodo_xlsx(args.inicio, args.fim, repo.funcionarios(),
+                                                     repo.minutos_do_periodo(args.inicio, args.fim),
+                                                     config.EVENTOS, uids=uids, mensal=args.mensal)
+    print(caminho)
+    return 0
+
+def estatisticas(args):
+    """Resumo dos dados e das horas trabalhadas de um mês."""
+    from datetime import datetime
+    import config
+    import minutos
+    repo = _repo()
+    mes = args.mes or datetime.now().strftime("%Y-%m")
+    datas = repo.datas()
+    totais = repo.horas.totais_do_mes(mes)
+    print(f"backend: {config.BACKEND}")
+    print(f"funcionários: {len(repo.funcionarios())}")
+    print(f"dias com registro: {len(datas)}" + (f" ({datas[-1]} a {datas[0]})" if datas else ""))
+    print(f"meses com registro: {len(repo.meses())}")
+    print(f"{mes}: {sum(1 for m in totais.values() if m)} funcionários com horas, "
+          f"total {minutos.duracao(sum(totais.values()))}")
+    if args.funcionarios:
+        for uid, nome in repo.funcionarios_por_nome():
+            print(f"  {nome[:36]:<36} {uid:<20} {minutos.duracao(totais.get(uid, 0)):>8}")
+    return 0
+
+def migrar(args):
+    """Converte o registros.json antigo em shards e compacta o journal (o que o serve faz ao abrir)."""
+    import config
+    import data
+    import repositorio
+    with _exclusivo("migrate"):
+        if config.BACKEND == "sqlite":
+            repositorio.RepositorioSQLite().carregar()      # atualiza o esquema do banco
+            print(f"{config.ARQ_DB} atualizado")
+            return 0
+        if data.migrar_arquivo_unico(config.ARQ_REG, config.DIR_REG):
+            print(f"{config.ARQ_REG} dividido em shards mensais em {config.DIR_REG}/")
+        if data.compactar(config.DIR_REG, config.ARQ_JOURNAL):
+            print(f"{config.ARQ_JOURNAL} compactado em {config.DIR_REG}/")
+    return 0
+
+def servir(args):
+    """Sobe a interface (NiceGUI) como `python interface.py`."""
+    import runpy
+    import config
+    if args.porta:
+        config.UI_PORTA = args.porta
+    interface = os.path.join(_AQUI, "interface.py")
+    sys.argv = [interface]      # o script mode do NiceGUI reexecuta sys.argv[0] a cada cliente
+    runpy.run_path(interface, run_name="__main__")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m ponto", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--dados", help="pasta dos dados (padrão: a atual)")
+    sub = ap.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("import-dump", help=importar_dump.__doc__)
+    p.add_argument("arquivo")
+    p.add_argument("--placa", help="id da placa (READY/STATUS): usa e avança o cursor dela em sync_cursor.json")
+    p.add_argument("--terminal", help="terminal gravado nos registros importados")
+    p.add_argument("--binario", action="store_true", help="quadros de 20 bytes do EDUMP_BIN, sem as linhas EBIN/EEND")
+    p.set_defaults(fn=importar_dump)
+
+    p = sub.add_parser("export", help=exportar.__doc__)
+    p.add_argument("mes", nargs="?", help="YYYY-MM")
+    p.add_argument("--inicio", help="YYYY-MM-DD")
+    p.add_argument("--fim", help="YYYY-MM-DD")
+    p.add_argument("--mensal", action="store_true", help="um .xlsx por mês, num .zip")
+    p.add_argument("--uids", help="só estes UIDs (separados por vírgula)")
+    p.set_defaults(fn=exportar)
+
+    p = sub.add_parser("stats", help=estatisticas.__doc__)
+    p.add_argument("--mes", help="YYYY-MM (padrão: o atual)")
+    p.add_argument("--funcionarios", action="store_true", help="lista as horas de cada funcionário")
+    p.set_defaults(fn=estatisticas)
+
+    p = sub.add_parser("serve", help=servir.__doc__)
+    p.add_argument("--porta", type=int)
+    p.set_defaults(fn=servir)
+
+    p = sub.add_parser("migrate", help=migrar.__doc__)
+    p.set_defaults(fn=migrar)
+
+    args = ap.parse_args(argv)
+    if args.dados:
+        os.chdir(args.dados)
+    if os.environ.get("PONTO_PERFIL") and args.fn is not servir:      # serve: interface.py inicia
+        import perfil
+        perfil.iniciar_pelo_ambiente()
+    try:
+        return args.fn(args)
+    except ValueError as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
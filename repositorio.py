@@ -0,0 +1,643 @@
+import os, time, sqlite3, calendar, threading
+from datetime import datetime, date
+import config
+import data
+import indices
+import minutos
+
+# REPOSITÓRIO DE DADOS (INTERFACE)
+# Toda leitura/escrita de funcionários e batidas passa por aqui; o backend é
+# escolhido por config.BACKEND ("json" ou "sqlite"). As consultas das telas (datas,
+# meses, batidas de hoje, funcionários por nome) saem de indices.IndicesBatidas, que
+# cada backend atualiza em aplicar_eventos(); as horas trabalhadas, de
+# indices.HorasTrabalhadas, que ouve os mesmos registros. Leituras não pegam o lock
+# de escrita (ver INSTANTÂNEOS).
+class Repositorio:
+    def _criar_indices(self):
+        self.indices = indices.IndicesBatidas(self._todas_datas, self._ler_dia, self.funcionarios)
+        self.horas = indices.HorasTrabalhadas(self.registros_do_mes)
+        self.indices.ouvintes.append(self.horas.aplicar)
+
+    def carregar(self, manutencao=True):
+        """
+        Abre os dados. `manutencao` (a interface) também migra formatos antigos e sobe as
+        tarefas de fundo (compactador); o CLI só lê e grava com manutencao=False.
+        """
+        raise NotImplementedError
+
+    # ---- funcionários ----
+    def funcionarios(self) -> dict:
+        """{uid: nome} (somente leitura)."""
+        raise NotImplementedError
+
+    def salvar_funcionario(self, uid, nome):
+        raise NotImplementedError
+
+    def remover_funcionario(self, uid, apagar_registros=False):
+        raise NotImplementedError
+
+    # ---- batidas ----
+    def dia(self, uid, data_iso) -> dict:
+        """{evento: 'HH:MM'} de um funcionário em um dia (somente leitura)."""
+        raise NotImplementedError
+
+    def aplicar_eventos(self, recs):
+        """Aplica uma lista de data.registro_batida(...) só em memória (visível para dia())."""
+        raise NotImplementedError
+
+    def persistir_eventos(self, recs):
+        """Torna duráveis eventos já aplicados com aplicar_eventos (os mesmos dicts; um commit por lote)."""
+        raise NotImplementedError
+
+    def registrar_eventos(self, recs):
+        """Aplica e persiste de uma vez."""
+        if not recs:
+            return
+        self.aplicar_eventos(recs)
+        self.persistir_eventos(recs)
+
+    def registros_do_mes(self, ano_mes) -> dict:
+        """{uid: {data_iso: dia}} só com os dias de 'YYYY-MM' (cópia: pode sair de thread/processo)."""
+        raise NotImplementedError
+
+    def registros_do_periodo(self, inicio, fim) -> dict:
+        """{uid: {data_iso: dia}} dos dias entre inicio e fim (ISO, inclusivo), lido mês a mês."""
+        out = {}
+        ano, mes = int(inicio[:4]), int(inicio[5:7])
+        while f"{ano:04d}-{mes:02d}" <= fim[:7]:
+            for uid, dias in self.registros_do_mes(f"{ano:04d}-{mes:02d}").items():
+                dias = {d: dia for d, dia in dias.items() if inicio <= d <= fim}
+                if dias:
+                    out.setdefault(uid, {}).update(dias)
+            ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        return out
+
+    def minutos_do_periodo(self, inicio, fim) -> dict:
+        """
+        {uid: minutos.BatidasMinutos} dos dias entre inicio e fim: a forma compacta usada nas
+        exportações (um array por funcionário em vez de um dict por dia), copiada das horas
+        materializadas em self.horas, com os minutos trabalhados por dia já calculados.
+        """
+        partes = []     # (início, n_dias, {uid: BatidasMinutos}) de cada mês
+        ano, mes = int(inicio[:4]), int(inicio[5:7])
+        while f"{ano:04d}-{mes:02d}" <= fim[:7]:
+            ano_mes = f"{ano:04d}-{mes:02d}"
+            de = max(inicio, f"{ano_mes}-01")
+            ate = min(fim, f"{ano_mes}-{calendar.monthrange(ano, mes)[1]:02d}")
+            n_dias = date.fromisoformat(ate).toordinal() - date.fromisoformat(de).toordinal() + 1
+            partes.append((de, n_dias, self.horas.fatias(ano_mes, de, n_dias)))
+            ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        uids = {uid for _de, _n, do_mes in partes for uid in do_mes}
+        return {uid: minutos.BatidasMinutos.juntar([do_mes.get(uid) or minutos.BatidasMinutos.vazio(de, n_dias)
+                                                    for de, n_dias, do_mes in partes])
+                for uid in uids}
+
+    def minutos_do_mes(self, ano_mes) -> dict:
+        ano, mes = int(ano_mes[:4]), int(ano_mes[5:7])
+        return self.minutos_do_periodo(f"{ano_mes}-01", f"{ano_mes}-{calendar.monthrange(ano, mes)[1]:02d}")
+
+    def datas(self) -> list:
+        """Datas ISO com algum registro, da mais recente para a mais antiga."""
+        return self.indices.datas()
+
+    def meses(self) -> list:
+        """Meses 'YYYY-MM' com algum registro, do mais recente para o mais antigo."""
+        return self.indices.meses()
+
+    def batidas_do_dia(self, data_iso) -> list:
+        """[(hora, uid, evento)] de todos os funcionários no dia, ordenadas por hora."""
+        return self.indices.batidas_do_dia(data_iso)
+
+    def uids_do_dia(self, data_iso) -> set:
+        """UIDs com alguma batida no dia."""
+        return self.indices.uids_do_dia(data_iso)
+
+    def funcionarios_por_nome(self) -> list:
+        """[(uid, nome)] em ordem alfabética."""
+        return self.indices.funcionarios_por_nome()
+
+    def pagina_do_dia(self, data_iso, busca="", ordenar="nome", desc=False, inicio=0, qtd=25):
+        """
+        Uma página da visão funcionários x dia: (total, [{'uid', 'nome', evento: hora,
+        'horas_mes'}]), com 'horas_mes' = minutos trabalhados no mês da data (self.horas).
+        `busca` filtra por trecho do nome ou do UID; `ordenar` é 'nome', 'uid', 'horas_mes'
+        ou um evento (dias sem o evento vão para o fim). Só são lidos os dias da página e,
+        na ordem por evento, os dos funcionários com batida na data.
+        """
+        lista = self.funcionarios_por_nome()
+        busca = (busca or "").strip().lower()
+        if busca:
+            lista = [(u, n) for u, n in lista if busca in n.lower() or busca in u.lower()]
+        com_batida = self.uids_do_dia(data_iso)
+        horas_mes = self.horas.totais_do_mes(data_iso[:7])
+        dias = {}
+        if ordenar in config.EVENTOS:
+            dias = {u: self.dia(u, data_iso) for u, _n in lista if u in com_batida}
+            vazio = "" if desc else "99:99"
+            lista = sorted(lista, key=lambda x: dias.get(x[0], {}).get(ordenar) or vazio, reverse=desc)
+        elif ordenar == "horas_mes":
+            lista = sorted(lista, key=lambda x: horas_mes.get(x[0], 0), reverse=desc)
+        elif ordenar == "uid":
+            lista = sorted(lista, key=lambda x: x[0], reverse=desc)
+        elif desc:
+            lista = lista[::-1]
+        pagina = lista[inicio:inicio + qtd] if qtd else lista[inicio:]
+        rows = []
+        for uid, nome in pagina:
+            dia = dias[uid] if uid in dias else (self.dia(uid, data_iso) if uid in com_batida else {})
+            rows.append({'uid': uid, 'nome': nome, **{ev: dia.get(ev, '') for ev in config.EVENTOS},
+                         'horas_mes': horas_mes.get(uid, 0)})
+        return len(lista), rows
+
+    # ---- fontes dos índices (leitura direta do backend) ----
+    def _todas_datas(self):
+        raise NotImplementedError
+
+    def _ler_dia(self, data_iso):
+        raise NotImplementedError
+
+
+# INSTANTÂNEOS (cópia na escrita)
+# A thread serial escreve enquanto as telas e a exportação leem. Em vez de um lock que
+# os dois lados disputam, cada escrita monta uma versão nova do que mudou e a publica
+# trocando uma referência: quem já pegou a versão anterior continua lendo um estado
+# inteiro e imutável, sem lock, e o escritor nunca espera um leitor.
+class Instantaneo:
+    """
+    Uma versão publicada dos dados em memória: `funcionarios` {uid: nome}, `registros`
+    {uid: {data_iso: dia}} dos meses em `meses` e `indice` {mes: frozenset(datas)}.
+    Nada aqui muda depois de publicado; com() copia só os campos trocados.
+    """
+    __slots__ = ("versao", "funcionarios", "registros", "meses", "indice")
+
+    def __init__(self, versao=0, funcionarios=None, registros=None, meses=frozenset(), indice=None):
+        self.versao = versao
+        self.funcionarios = funcionarios if funcionarios is not None else {}
+        self.registros = registros if registros is not None else {}
+        self.meses = meses
+        self.indice = indice if indice is not None else {}
+
+    def com(self, **mudancas):
+        """A próxima versão, com os campos de `mudancas` trocados."""
+        campos = {k: getattr(self, k) for k in self.__slots__}
+        campos.update(mudancas, versao=self.versao + 1)
+        return Instantaneo(**campos)
+
+
+# BACKEND JSON (shards mensais + journal; só os meses em uso ficam em memória)
+class RepositorioJSON(Repositorio):
+    """
+    Os dados em memória são um Instantaneo: um escritor por vez (_escrita, disputado só
+    entre escritores) publica versões novas; dia(), registros_do_mes() e as fontes dos
+    índices leem a versão atual sem lock. config.funcionarios e config.registros apontam
+    sempre para a última versão publicada.
+    Só os meses em uso ficam em memória: o mês atual sempre, os demais sob demanda,
+    descartando o menos usado acima de config.SHARDS_EM_MEMORIA. A leitura de um mês do
+    disco acontece fora do lock de escrita; as batidas aplicadas enquanto isso, e as ainda
+    não gravadas no journal (`_pendentes`), são reaplicadas por cima antes de publicar.
+    Um del_uid tira do `indice` as datas que ficaram vazias: nos meses carregados na hora;
+    nos demais, relidos do disco depois que o del_uid chega ao journal (_reindexar).
+    """
+    def __init__(self, arq_func=None, dir_reg=None, arq_journal=None):
+        self.arq_func = arq_func or config.ARQ_FUNC
+        self.dir_reg = dir_reg or config.DIR_REG
+        self.arq_journal = arq_journal or config.ARQ_JOURNAL
+        self._escrita = threading.RLock()
+        self._arquivo_func = threading.Lock()
+        self._atual = Instantaneo()
+        self._uso = {}              # mes carregado -> último uso (LRU)
+        self._carregando = {}       # mes -> (Event, [recs aplicados durante a leitura do disco])
+        self._pendentes = []        # recs aplicados e ainda não anexados ao journal
+        self._gravacao = threading.Lock()   # journal na ordem em que os recs saem de _pendentes
+        self._indice_sujo = set()   # meses fora da memória com datas a conferir após um del_uid
+        self._criar_indices()
+
+    def instantaneo(self):
+        """A versão atual (não muda: para ver escritas novas, chame de novo)."""
+        return self._atual
+
+    def _publicar(self, **mudancas):
+        self._atual = self._atual.com(**mudancas)
+        config.funcionarios, config.registros = self._atual.funcionarios, self._atual.registros
+
+    def carregar(self, manutencao=True):
+        funcionarios = data.carregar_json(self.arq_func, {})
+        if manutencao and data.migrar_arquivo_unico(config.ARQ_REG, self.dir_reg):
+            print(f"[DADOS] {config.ARQ_REG} dividido em shards mensais em {self.dir_reg}/")
+        indice = data.carregar_indice(self.dir_reg, self.arq_journal)
+        with self._escrita:
+            self._uso.clear()
+            self._pendentes = []
+            self._indice_sujo = set()
+            self._publicar(funcionarios=funcionarios, registros={}, meses=frozenset(),
+                           indice={m: frozenset(ds) for m, ds in indice.items()})
+        self._garantir_mes(datetime.now().strftime("%Y-%m"))
+        self.indices.reconstruir()
+        self.horas.reconstruir()
+        if manutencao:
+            data.iniciar_compactador(self.dir_reg, self.arq_journal,
+                                     config.JOURNAL_MAX_BYTES, config.JOURNAL_MAX_SEGUNDOS)
+
+    def _garantir_mes(self, mes):
+        """Carrega o mês se preciso e devolve o instantâneo que o contém."""
+        atual = self._atual
+        if mes in atual.meses:
+            self._uso[mes] = time.monotonic()
+            return atual
+        with self._escrita:
+            if mes in self._atual.meses:
+                return self._atual
+            espera = self._carregando.get(mes)
+            dono = espera is None
+            if dono:
+                espera = self._carregando[mes] = (threading.Event(), [])
+                pendentes = list(self._pendentes)
+        if not dono:
+            espera[0].wait()        # outro leitor já está lendo este mês
+            return self._atual
+        try:
+            lidos = data.carregar_meses(self.dir_reg, self.arq_journal, [mes])
+            with self._escrita:
+                for rec in pendentes + espera[1]:
+                    if rec.get("op") == "del_uid" or rec["data"][:7] == mes:
+                        data.aplicar_registro(lidos, rec)
+                registros = dict(self._atual.registros)
+                for uid, dias in lidos.items():
+                    registros[uid] = {**registros.get(uid, {}), **dias}
+                self._uso[mes] = time.monotonic()
+                self._publicar(registros=registros, meses=self._atual.meses | {mes})
+                self._descartar()
+                return self._atual
+        finally:
+            with self._escrita:
+                del self._carregando[mes]
+            espera[0].set()
+
+    def _descartar(self):
+        atual = datetime.now().strftime("%Y-%m")
+        meses = self._atual.meses
+        velhos = set()
+        while len(meses) - len(velhos) > config.SHARDS_EM_MEMORIA:
+            candidatos = [(self._uso.get(m, 0), m) for m in meses if m != atual and m not in velhos]
+            if not candidatos:
+                break
+            velhos.add(min(candidatos)[1])
+        if not velhos:
+            return
+        registros = {}
+        for uid, dias in self._atual.registros.items():
+            dias = {d: dia for d, dia in dias.items() if d[:7] not in velhos}
+            if dias:
+                registros[uid] = dias
+        for mes in velhos:
+            self._uso.pop(mes, None)
+        self._publicar(registros=registros, meses=meses - velhos)
+
+    def funcionarios(self):
+        return self._atual.funcionarios
+
+    def _salvar_funcionarios(self):
+        with self._arquivo_func:    # grava sempre a última versão, fora do lock de escrita
+            data.salvar_json(self.arq_func, self._atual.funcionarios)
+
+    def salvar_funcionario(self, uid, nome):
+        with self._escrita:
+            self._publicar(funcionarios={**self._atual.funcionarios, uid: nome})
+        self._salvar_funcionarios()
+        self.indices.funcionarios_alterados()
+
+    def remover_funcionario(self, uid, apagar_registros=False):
+        with self._escrita:
+            funcionarios = dict(self._atual.funcionarios)
+            funcionarios.pop(uid, None)
+            self._publicar(funcionarios=funcionarios)
+        self._salvar_funcionarios()
+        self.indices.funcionarios_alterados()
+        if apagar_registros:
+            self.registrar_eventos([{"op": "del_uid", "uid": uid}])
+
+    def dia(self, uid, data_iso):
+        return self._garantir_mes(data_iso[:7]).registros.get(uid, {}).get(data_iso, {})
+
+    def aplicar_eventos(self, recs):
+        """Aplica em memória só nos meses carregados; os demais são lidos do journal na próxima carga."""
+        with self._escrita:
+            atual = self._atual
+            indice = atual.indice
+            nos_carregados = []
+            apagados = set()
+            for rec in recs:
+                if rec.get("op") == "del_uid":
+                    # o que ainda não foi para o journal deste uid não vai mais
+                    self._pendentes = [r for r in self._pendentes
+                                       if r.get("op") == "del_uid" or r["uid"] != rec["uid"]]
+                    apagados.add(rec["uid"])
+                self._pendentes.append(rec)
+                for mes, (_ev, durante) in self._carregando.items():
+                    if rec.get("op") == "del_uid" or rec["data"][:7] == mes:
+                        durante.append(rec)
+                if rec.get("op") == "del_uid":
+                    nos_carregados.append(rec)
+                    continue
+                mes = rec["data"][:7]
+                if rec["data"] not in indice.get(mes, ()):
+                    if indice is atual.indice:
+                        indice = dict(indice)
+                    indice[mes] = indice.get(mes, frozenset()) | {rec["data"]}
+                if mes in atual.meses:
+                    nos_carregados.append(rec)
+            registros = data.aplicar_copiando(atual.registros, nos_carregados)
+            if apagados:
+                indice = self._podar_indice(atual, registros, indice, apagados, recs)
+            self._publicar(registros=registros, indice=indice)
+        self.indices.aplicar(recs)      # fora do _escrita: os índices têm o lock deles
+
+    def _podar_indice(self, atual, registros, indice, apagados, recs):
+        """
+        Índice sem as datas dos meses carregados que ficaram sem batida depois de apagar os
+        uids `apagados`; os meses fora da memória ficam marcados para _reindexar().
+        """
+        candidatas = {d for uid in apagados for d in atual.registros.get(uid, {})}
+        candidatas.update(r["data"] for r in recs if r.get("op") is None and r["uid"] in apagados)
+        vazias = {d for d in candidatas
+                  if d[:7] in atual.meses and not any(d in dias for dias in registros.values())}
+        novo = dict(indice)
+        for mes in {d[:7] for d in vazias}:
+            datas = novo[mes] - vazias
+            if datas:
+                novo[mes] = datas
+            else:
+                del novo[mes]
+        self._indice_sujo.update(m for m in novo if m not in atual.meses)
+        return novo
+
+    def _reindexar(self):
+        """Refaz, do disco + _pendentes, as datas dos meses marcados por _podar_indice."""
+        with self._escrita:
+            meses, self._indice_sujo = self._indice_sujo, set()
+        for mes in sorted(meses):
+            with self._escrita:
+                antes = self._atual.indice.get(mes, frozenset())
+                pendentes = list(self._pendentes)
+            lidos = data.carregar_meses(self.dir_reg, self.arq_journal, [mes])
+            for rec in pendentes:
+                if rec.get("op") == "del_uid" or rec["data"][:7] == mes:
+                    data.aplicar_registro(lidos, rec)
+            datas = {d for dias in lidos.values() for d in dias if d[:7] == mes}
+            with self._escrita:
+                indice = dict(self._atual.indice)
+                datas |= indice.get(mes, frozenset()) - antes      # batidas aplicadas durante a leitura
+                if datas:
+                    indice[mes] = frozenset(datas)
+                else:
+                    indice.pop(mes, None)
+                self._publicar(indice=indice)
+        if meses:
+            self.indices.reconstruir()
+
+    def persistir_eventos(self, recs):
+        if not recs:
+            return
+        with self._gravacao:
+            with self._escrita:
+                vivos = {id(rec) for rec in self._pendentes}
+            # um rec que saiu de _pendentes sem ser gravado foi apagado por um del_uid depois
+            # de enfileirado: no journal ele viria depois do del_uid e ressuscitaria a batida
+            recs = [rec for rec in recs if id(rec) in vivos]
+            data.anexar_journal(self.arq_journal, recs)
+            gravados = {id(rec) for rec in recs}
+            with self._escrita:
+                self._pendentes = [rec for rec in self._pendentes if id(rec) not in gravados]
+        if any(rec.get("op") == "del_uid" for rec in recs):
+            self._reindexar()
+
+    def registros_do_mes(self, ano_mes):
+        out = {}
+        for uid, dias in self._garantir_mes(ano_mes).registros.items():
+            mes = {d: dict(dia) for d, dia in dias.items() if d.startswith(ano_mes)}
+            if mes:
+                out[uid] = mes
+        return out
+
+    def _todas_datas(self):
+        return [d for ds in self._atual.indice.values() for d in ds]
+
+    def _ler_dia(self, data_iso):
+        items = []
+        for uid, dias in self._garantir_mes(data_iso[:7]).registros.items():
+            dia = dias.get(data_iso)
+            if dia:
+                for ev in config.EVENTOS:
+                    if ev in dia:
+                        items.append((dia[ev], uid, ev))
+        items.sort(key=lambda r: r[0])
+        return items
+
+
+# BACKEND SQLITE (stdlib sqlite3, WAL)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS funcionarios (
+    uid  TEXT PRIMARY KEY,
+    nome TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batidas (
+    uid    TEXT NOT NULL,
+    data   TEXT NOT NULL,
+    evento TEXT NOT NULL,
+    hora   TEXT NOT NULL,
+    terminal TEXT,
+    PRIMARY KEY (uid, data, evento)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_batidas_data ON batidas (data);
+"""
+
+class RepositorioSQLite(Repositorio):
+    """
+    Escrita por uma conexão só, serializada por _lock (disputado só entre escritores);
+    cada thread que lê tem a sua conexão (_leitura) e o WAL dá a cada consulta uma
+    versão consistente do banco, sem esperar o escritor.
+    A chave primária (uid, data, evento) serve de índice por (uid, data);
+    idx_batidas_data atende as consultas por dia/mês.
+    Eventos aplicados e ainda não persistidos ficam em `_pendentes` e entram em dia();
+    persistir_eventos grava só os que ainda estão lá, então um evento enfileirado para
+    o commit em grupo e apagado antes (del_uid, remover_funcionario) não volta ao banco.
+    `_pendentes` e `_func` são trocados inteiros a cada escrita (cópia na escrita); quem
+    lê pega `_pendentes` antes de consultar o banco, e um evento gravado no meio da
+    leitura aparece em um dos dois.
+    """
+    def __init__(self, arq_db=None):
+        self.arq_db = arq_db or config.ARQ_DB
+        self._lock = threading.Lock()
+        self._conn = None
+        self._leitores = threading.local()
+        self._func = {}
+        self._pendentes = {}    # (uid, data) -> {evento: hora}
+        self._criar_indices()
+
+    def carregar(self, manutencao=True):
+        self._conn = sqlite3.connect(self.arq_db, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        colunas = {r[1] for r in self._conn.execute("PRAGMA table_info(batidas)")}
+        if manutencao and "terminal" not in colunas:     # bancos criados antes da coluna terminal
+            self._conn.execute("ALTER TABLE batidas ADD COLUMN terminal TEXT")
+        self._func = dict(self._conn.execute("SELECT uid, nome FROM funcionarios"))
+        self.indices.reconstruir()
+        self.horas.reconstruir()
+
+    def _leitura(self):
+        """A conexão de leitura desta thread."""
+        conn = getattr(self._leitores, "conn", None)
+        if conn is None:
+            conn = self._leitores.conn = sqlite3.connect(self.arq_db)
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _query(self, sql, args=()):
+        return self._leitura().execute(sql, args).fetchall()
+
+    def funcionarios(self):
+        return self._func
+
+    def salvar_funcionario(self, uid, nome):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO funcionarios (uid, nome) VALUES (?, ?)", (uid, nome))
+            self._func = {**self._func, uid: nome}
+        self.indices.funcionarios_alterados()
+
+    def remover_funcionario(self, uid, apagar_registros=False):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM funcionarios WHERE uid = ?", (uid,))
+                if apagar_registros:
+                    self._conn.execute("DELETE FROM batidas WHERE uid = ?", (uid,))
+            self._func = {u: n for u, n in self._func.items() if u != uid}
+            if apagar_registros:
+                self._pendentes = {k: pend for k, pend in self._pendentes.items() if k[0] != uid}
+        self.indices.funcionarios_alterados()
+        if apagar_registros:
+            self.indices.reconstruir()
+            self.horas.reconstruir()
+
+    def dia(self, uid, data_iso):
+        pend = self._pendentes.get((uid, data_iso))
+        dia = dict(self._query("SELECT evento, hora FROM batidas WHERE uid = ? AND data = ?", (uid, data_iso)))
+        if pend:
+            dia.update(pend)
+        return dia
+
+    def aplicar_eventos(self, recs):
+        with self._lock:
+            pendentes = dict(self._pendentes)
+            for rec in recs:
+                if rec.get("op") == "del_uid":
+                    for k in [k for k in pendentes if k[0] == rec["uid"]]:
+                        del pendentes[k]
+                else:
+                    k = (rec["uid"], rec["data"])
+                    pendentes[k] = {**pendentes.get(k, {}), rec["ev"]: rec["hora"]}
+            self._pendentes = pendentes
+        self.indices.aplicar(recs)
+
+    def persistir_eventos(self, recs):
+        if not recs:
+            return
+        with self._lock:
+            pendentes = self._pendentes
+            # um evento que saiu de _pendentes sem ser gravado foi apagado (ou substituído)
+            # depois de enfileirado: gravá-lo agora ressuscitaria a batida
+            recs = [rec for rec in recs if rec.get("op") == "del_uid"
+                    or pendentes.get((rec["uid"], rec["data"]), {}).get(rec["ev"]) == rec["hora"]]
+            with self._conn:
+                for rec in recs:
+                    if rec.get("op") == "del_uid":
+                        self._conn.execute("DELETE FROM batidas WHERE uid = ?", (rec["uid"],))
+                        continue
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO batidas (uid, data, evento, hora, terminal) VALUES (?, ?, ?, ?, ?)",
+                        (rec["uid"], rec["data"], rec["ev"], rec["hora"], rec.get("term")))
+            pendentes = dict(self._pendentes)     # só depois do commit: os leitores já veem no banco
+            for rec in recs:
+                if rec.get("op") == "del_uid":
+                    continue
+                k = (rec["uid"], rec["data"])
+                pend = pendentes.get(k)
+                if pend and pend.get(rec["ev"]) == rec["hora"]:
+                    pend = {ev: h for ev, h in pend.items() if ev != rec["ev"]}
+                    if pend:
+                        pendentes[k] = pend
+                    else:
+                        del pendentes[k]
+            self._pendentes = pendentes
+
+    def registros_do_mes(self, ano_mes):
+        pendentes = self._pendentes
+        out = {}
+        rows = self._query("SELECT uid, data, evento, hora FROM batidas WHERE data >= ? AND data < ?",
+                           (ano_mes + "-01", ano_mes + "-32"))
+        for uid, data_iso, ev, hora in rows:
+            out.setdefault(uid, {}).setdefault(data_iso, {})[ev] = hora
+        for (uid, data_iso), pend in pendentes.items():
+            if data_iso.startswith(ano_mes):
+                out.setdefault(uid, {}).setdefault(data_iso, {}).update(pend)
+        return out
+
+    def _todas_datas(self):
+        pendentes = self._pendentes
+        return [r[0] for r in self._query("SELECT DISTINCT data FROM batidas")] + [d for _uid, d in pendentes]
+
+    def _ler_dia(self, data_iso):
+        pendentes = self._pendentes
+        rows = {(uid, ev): hora for hora, uid, ev in
+                self._query("SELECT hora, uid, evento FROM batidas WHERE data = ?", (data_iso,))}
+        for (uid, d), pend in pendentes.items():
+            if d == data_iso:
+                for ev, hora in pend.items():
+                    rows[(uid, ev)] = hora
+        return sorted((hora, uid, ev) for (uid, ev), hora in rows.items())
+
+
+def criar(backend=None):
+    backend = backend or config.BACKEND
+    if backend == "sqlite":
+        return RepositorioSQLite()
+    if backend == "json":
+        return RepositorioJSON()
+    raise ValueError(f"Backend desconhecido: {backend}")
+
+
+# MIGRAÇÃO JSON -> SQLITE (uma vez)
+def migrar_json_para_sqlite(arq_func=None, dir_reg=None, arq_journal=None, arq_db=None):
+    """Copia funcionarios.json e os registros (shards + journal) para o banco. Retorna (funcionarios, batidas)."""
+    dir_reg = dir_reg or config.DIR_REG
+    arq_journal = arq_journal or config.ARQ_JOURNAL
+    funcionarios = data.carregar_json(arq_func or config.ARQ_FUNC, {})
+    data.migrar_arquivo_unico(config.ARQ_REG, dir_reg)
+    meses = set(data.meses_em_disco(dir_reg)) | set(data.carregar_indice(dir_reg, arq_journal))
+    registros = data.carregar_meses(dir_reg, arq_journal, meses)
+
+    repo = RepositorioSQLite(arq_db)
+    repo.carregar()
+    for uid, nome in funcionarios.items():
+        repo.salvar_funcionario(uid.strip().upper(), nome)
+    recs = [data.registro_batida(uid.strip().upper(), data_iso, ev, hora)
+            for uid, dias in registros.items()
+            for data_iso, dia in dias.items()
+            for ev, hora in dia.items() if ev in config.EVENTOS and hora]
+    repo.registrar_eventos(recs)
+    return len(funcionarios), len(recs)
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:2] != ["migrar"]:
+        print("uso: python repositorio.py migrar")
+        sys.exit(2)
+    if os.path.exists(config.ARQ_DB):
+        print(f"[MIGRAR] {config.ARQ_DB} já existe; remova-o para migrar de novo.")
+        sys.exit(1)
+    n_func, n_bat = migrar_json_para_sqlite()
+    print(f"[MIGRAR] {n_func} funcionários e {n_bat} batidas copiados para {config.ARQ_DB}.")
+    print('[MIGRAR] Ajuste BACKEND = "sqlite" em config.py para usar o banco.')
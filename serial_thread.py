@@ -1,39 +1,294 @@
-import time
+import time, queue, threading, atexit
+from collections import deque
 import serial
 import serial.tools.list_ports
 import config
+import barramento
 import funcoes
 import data
+import metricas
+
+# ESTADO DE UM TERMINAL (um leitor RC522 por porta serial)
+class Terminal:
+    def __init__(self, porta, ident=None):
+        self.id = ident or porta
+        self.porta = porta
+        self.stop_flag = threading.Event()
+        self.pause_flag = threading.Event()
+        self._liberado = threading.Event()  # inverso do pause_flag, para a leitura esperar sem polling
+        self._liberado.set()
+        self.thread = None
+        self.ser = None
+        self.conectado = False
+        self.batidas = 0
+        self.erros = 0
+        self.ultima_batida = None
+        self.acordar = threading.Event()    # interrompe o backoff (porta voltou / desconectar)
+        self.sessoes = 0
+        self.reconexoes = 0
+        self.fora_desde = None      # instante da queda atual (None se conectado)
+        self.tempo_fora = 0.0       # soma das quedas já encerradas, em segundos
+        self.ultimo_pronto_s = None     # abertura da porta -> firmware pronto
+        self.placa = None           # id gravado na EEPROM da placa conectada (READY/STATUS)
+        self._janela = deque()      # instantes das batidas no último minuto
+        self._lock = threading.Lock()
+
+    def pausar(self):
+        """Suspende a leitura da porta (a thread fica parada num Event, sem polling)."""
+        self.pause_flag.set()
+        self._liberado.clear()
+        self._interromper_leitura()
+
+    def retomar(self):
+        self.pause_flag.clear()
+        self._liberado.set()
+
+    def parar(self):
+        self.stop_flag.set()
+        self.acordar.set()
+        self._liberado.set()
+        self._interromper_leitura()
+
+    def _interromper_leitura(self):
+        ser = self.ser
+        if ser is not None:
+            try:
+                ser.cancel_read()   # acorda o read() bloqueado na hora
+            except Exception:
+                pass
+
+    def marcar_queda(self):
+        with self._lock:
+            if self.fora_desde is None:
+                self.fora_desde = time.time()
+
+    def marcar_conexao(self, pronto_s):
+        with self._lock:
+            self.ultimo_pronto_s = pronto_s
+            self.sessoes += 1
+            if self.fora_desde is not None:
+                self.tempo_fora += time.time() - self.fora_desde
+                self.fora_desde = None
+                self.reconexoes += 1
+
+    def tempo_fora_total(self):
+        with self._lock:
+            atual = time.time() - self.fora_desde if self.fora_desde is not None else 0.0
+            return self.tempo_fora + atual
+
+    def contar(self, ok):
+        agora = time.time()
+        with self._lock:
+            if ok:
+                self.batidas += 1
+            else:
+                self.erros += 1
+            self.ultima_batida = agora
+            self._janela.append(agora)
+            while self._janela and agora - self._janela[0] > 60:
+                self._janela.popleft()
+
+    def batidas_por_minuto(self):
+        agora = time.time()
+        with self._lock:
+            while self._janela and agora - self._janela[0] > 60:
+                self._janela.popleft()
+            return len(self._janela)
+
+# ENQUADRAMENTO DAS LINHAS DA SERIAL
+class LeitorLinhas:
+    """
+    Lê de uma vez o que `in_waiting` indica (ou bloqueia por 1 byte até o timeout da
+    porta / cancel_read()) para um bytearray reaproveitado e devolve as linhas completas.
+    O resto de linha fica no buffer para a próxima leitura.
+    """
+    def __init__(self, ser):
+        self.ser = ser
+        self._buf = bytearray()
+
+    @property
+    def incompleto(self):
+        """Há um pedaço de linha no buffer esperando o resto."""
+        return bool(self._buf)
+
+    def ler(self):
+        chunk = self.ser.read(self.ser.in_waiting or 1)
+        if not chunk:
+            return []
+        buf = self._buf
+        buf += chunk
+        if b"\n" not in chunk:
+            return []
+        linhas = []
+        ini = 0
+        with memoryview(buf) as mv:
+            while True:
+                i = buf.find(b"\n", ini)
+                if i < 0:
+                    break
+                linha = str(mv[ini:i], "utf-8", "ignore").strip()
+                if linha:
+                    linhas.append(linha)
+                ini = i + 1
+        del buf[:ini]
+        return linhas
 
 # FUNÇÕES DE SINCRONIZAÇÃO (FORA DA THREAD)
+def _placa(campo):
+    """Id da placa ('ID=1A2B3C4D' ou só '1A2B3C4D') em maiúsculas; None se não for um id."""
+    campo = (campo or "").rsplit("=", 1)[-1].strip().upper()
+    if len(campo) != 8:
+        return None
+    try:
+        return campo if int(campo, 16) not in (0, 0xFFFFFFFF) else None
+    except ValueError:
+        return None
+
+def _placa_na_linha(linha):
+    """Id de uma linha READY/STATUS ('... ID=1A2B3C4D'); None em firmware sem id."""
+    for campo in linha.split():
+        if campo.startswith("ID="):
+            return _placa(campo)
+    return None
+
+class _EdumpStream:
+    """
+    Envia EDUMP (ou EDUMP_SINCE <desde>) e itera sobre as linhas entre EBEGIN e EEND
+    conforme chegam. Não há prazo total: o dump só é abortado se ficar `ocioso`
+    segundos sem linha (ou `timeout_inicio` sem EBEGIN). Depois da iteração:
+    `iniciado`, `completo`, `uids_avulsos` (UIDs de cartão lidos no meio da
+    sincronização) e, no EDUMP_SINCE, `seq_primeira`/`seq_proxima` e `placa` (linha ESEQ).
+    A entrada não é descartada antes do comando: um UID que já estava lá é um cartão
+    esperando ACK (o comando vale como ACK) e também vai para `uids_avulsos`.
+    """
+    def __init__(self, ser, timeout_inicio=5.0, ocioso=3.0, desde=None):
+        self.ser = ser
+        self.timeout_inicio = timeout_inicio
+        self.ocioso = ocioso
+        self.desde = desde
+        self.iniciado = False
+        self.completo = False
+        self.uids_avulsos = []
+        self.seq_primeira = None
+        self.seq_proxima = None
+        self.placa = None
+
+    def __iter__(self):
+        if self.desde is None:
+            self.ser.write(b"EDUMP\r\n")
+        else:
+            self.ser.write(f"EDUMP_SINCE {self.desde}\r\n".encode())
+
+        ultimo = time.time()
+        while time.time() - ultimo < (self.ocioso if self.iniciado else self.timeout_inicio):
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+            ultimo = time.time()
+            if line == 'EBEGIN':
+                self.iniciado = True
+                continue
+            if not self.iniciado:
+                if funcoes.extrair_uid(line):
+                    self.uids_avulsos.append(line)
+                continue
+            if line == 'EEND':
+                self.completo = True
+                return
+            if line.startswith('{'):
+                yield line
+            elif line.startswith('ESEQ '):
+                campos = line.split()
+                try:
+                    self.seq_primeira, self.seq_proxima = (int(x) for x in campos[1:3])
+                except ValueError:
+                    pass
+                if len(campos) > 3:
+                    self.placa = _placa(campos[3])
+            elif funcoes.extrair_uid(line):
+                self.uids_avulsos.append(line)
+
+class _EdumpBinStream:
+    """
+    Envia EDUMP_BIN <desde> e itera, em blocos de até `bloco` quadros, as listas de
+    registros decodificados por funcoes.decodificar_edump_bin conforme os bytes chegam.
+    Mesmos atributos de _EdumpStream, mais `invalidos` (quadros com CRC errado). Como lá,
+    a entrada não é descartada: UIDs que chegam antes do EBIN vão para `uids_avulsos`.
+    """
+    def __init__(self, ser, desde=0, timeout_inicio=2.0, ocioso=3.0, bloco=50):
+        self.ser = ser
+        self.desde = desde
+        self.timeout_inicio = timeout_inicio
+        self.ocioso = ocioso
+        self.bloco = bloco
+        self.iniciado = False
+        self.completo = False
+        self.uids_avulsos = []
+        self.seq_primeira = None
+        self.seq_proxima = None
+        self.placa = None
+        self.invalidos = 0
+
+    def __iter__(self):
+        self.ser.write(f"EDUMP_BIN {self.desde}\r\n".encode())
+
+        total = 0
+        t0 = time.time()
+        while time.time() - t0 < self.timeout_inicio:
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            if line.startswith('EBIN '):
+                campos = line.split()
+                try:
+                    total, self.seq_primeira, self.seq_proxima = (int(x) for x in campos[1:4])
+                except ValueError:
+                    return
+                if len(campos) > 4:
+                    self.placa = _placa(campos[4])
+                self.iniciado = True
+                break
+            if funcoes.extrair_uid(line):
+                self.uids_avulsos.append(line)
+        if not self.iniciado:
+            return
+
+        tam = funcoes.FRAME_BIN.size
+        faltam = total * tam
+        pendente = bytearray()
+        ultimo = time.time()
+        while faltam > 0 and time.time() - ultimo < self.ocioso:
+            chunk = self.ser.read(min(faltam, self.bloco * tam - len(pendente)))
+            if not chunk:
+                continue
+            ultimo = time.time()
+            faltam -= len(chunk)
+            pendente += chunk
+            inteiros = len(pendente) // tam * tam
+            if inteiros and (len(pendente) >= self.bloco * tam or faltam == 0):
+                regs, ruins = funcoes.decodificar_edump_bin(memoryview(pendente)[:inteiros])
+                del pendente[:inteiros]
+                self.invalidos += ruins
+                yield regs
+        if faltam > 0:
+            return
+
+        t0 = time.time()
+        while time.time() - t0 < self.ocioso:
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            if line == 'EEND':
+                self.completo = True
+                return
+            if line:
+                return
+
 def _edump_core(ser, timeout_total=15.0):
     """Executa o EDUMP e retorna (started: bool, linhas: list)."""
-    try:
-        ser.reset_input_buffer()
-    except Exception:
-        pass
-    
-    ser.write(b"EDUMP\r\n") 
-    
-    linhas, started = [], False
-    t0 = time.time()
-    
-    while time.time() - t0 < timeout_total:
-        line = ser.readline().decode('utf-8', errors='ignore').strip()
-        if not line:
-            continue
-        if line == 'EBEGIN':
-            started = True
-            continue
-        if line == 'EEND':
-            break
-        if started:
-            linhas.append(line)
-            
-    return started, linhas
+    dump = _EdumpStream(ser, timeout_inicio=timeout_total)
+    linhas = list(dump)
+    return dump.iniciado, linhas
 
 def _drain_serial(port, dur=0.8):
-    """Drena o lixo do buffer serial após o reset do Arduino."""
+    """Drena o lixo do buffer serial; devolve as linhas de UID encontradas (batidas, não lixo)."""
+    uids = []
     end = time.time() + dur
     while time.time() < end:
         try:
@@ -42,120 +297,468 @@ def _drain_serial(port, dur=0.8):
                 break
         except Exception:
             break
+        if funcoes.extrair_uid(line):
+            uids.append(line)
+    return uids
 
-def _do_initial_sync(ar, port_name):
-    """Lógica completa de sincronização EDUMP após a conexão."""
-    config.serial_queue.put(("log", f"[SYNC] Conectado em {port_name}. Aguardando reset do Arduino (3.0s)..."))
-    
-    time.sleep(3.0) 
-    
-    _drain_serial(ar)
-    
+def _aguardar_pronto(port, timeout=None, sonda=None):
+    """
+    Espera o firmware terminar o boot (abrir a porta reseta o Arduino): vale a linha
+    READY impressa no fim do setup() ou, em firmware antigo / placa que não resetou,
+    a resposta a um STATUS enviado a cada `sonda` segundos.
+    Retorna (pronto, uids, placa): os UIDs lidos na espera (um STATUS durante a espera
+    do ACK vale como OK no firmware, então essas batidas precisam ser registradas) e o
+    id da placa informado na linha (None em firmware sem id). Os UIDs que chegaram no
+    mesmo pedaço que o READY, depois dele, também entram: a leitura seguinte é de outro
+    leitor, e o que ficasse no buffer deste se perderia.
+    """
+    timeout = config.PRONTO_TIMEOUT_S if timeout is None else timeout
+    sonda = config.PRONTO_SONDA_S if sonda is None else sonda
+    uids = []
+    leitor = LeitorLinhas(port)
+    fim = time.time() + timeout
+    proxima_sonda = time.time() + sonda
+    timeout_ant = port.timeout
+    port.timeout = 0.05
     try:
-        started, linhas = _edump_core(ar, timeout_total=15.0)
+        while time.time() < fim:
+            if time.time() >= proxima_sonda:
+                port.write(b"STATUS\r\n")
+                proxima_sonda = time.time() + sonda
+            linhas = leitor.ler()
+            for i, line in enumerate(linhas):
+                if line.startswith(("READY", "MAX_SLOTS=")):
+                    resto = linhas[i + 1:]
+                    limite = time.time() + sonda
+                    while leitor.incompleto and time.time() < limite:
+                        resto += leitor.ler()       # termina a linha cortada no fim do pedaço
+                    uids += [u for u in map(funcoes.extrair_uid, resto) if u]
+                    return True, uids, _placa_na_linha(line)
+                uid = funcoes.extrair_uid(line)
+                if uid:
+                    uids.append(uid)
+        return False, uids, None
+    finally:
+        port.timeout = timeout_ant
+
+def _uid_chegando(port, dur=0.15):
+    """Olha rapidamente a entrada; True se o leitor mandou um UID (cartão esperando ACK)."""
+    end = time.time() + dur
+    while time.time() < end:
+        try:
+            if not port.in_waiting:
+                time.sleep(0.02)
+                continue
+            line = port.readline().decode("utf-8", errors="ignore").strip()
+        except Exception:
+            return False
+        if funcoes.extrair_uid(line):
+            return True
+    return False
 
-        if not started:
-            config.serial_queue.put(("log", "[SYNC] 1ª tentativa sem EBEGIN; tentando novamente (1.0s)..."))
-            time.sleep(1.0) 
-            _drain_serial(ar, dur=0.5)
-            started, linhas = _edump_core(ar, timeout_total=15.0)
+def _ingerir_edump(ar, terminal=None, desde=None, binario=False, placa=None):
+    """
+    Consome o EDUMP em streaming, aplicando e gravando a cada config.EDUMP_LOTE registros.
+    Com `desde` usa EDUMP_SINCE (ou EDUMP_BIN, se `binario`) e avança após cada commit
+    o cursor da placa (o id que veio no próprio dump ou, na falta dele, `placa`). Sem id
+    conhecido não há cursor a avançar.
+    """
+    tid = terminal.id if terminal else None
+    if binario:
+        dump = _EdumpBinStream(ar, desde or 0, ocioso=config.EDUMP_OCIOSO_S, bloco=config.EDUMP_LOTE)
+    else:
+        dump = _EdumpStream(ar, ocioso=config.EDUMP_OCIOSO_S, desde=desde,
+                            timeout_inicio=2.0 if desde is not None else 5.0)
+    merger = funcoes.MescladorIncremental(config.repo, terminal=tid, lote=config.EDUMP_LOTE,
+                                          desde_seq=desde)
 
-        if not started:
-            config.serial_queue.put(("log", "[SYNC] Arduino não respondeu ao EDUMP na conexão."))
-            return
+    def _confirmar():
+        merger.confirmar()
+        chave = dump.placa or placa
+        if desde is not None and chave and merger.ultimo_seq is not None:
+            data.salvar_cursor(config.ARQ_CURSOR, chave, merger.ultimo_seq + 1)
 
-        try:
-            novos, ignorados = funcoes.mesclar_scans_jsonl(linhas, config.registros, config.funcionarios)
-        except TypeError:
-            novos = funcoes.mesclar_scans_jsonl(linhas, config.registros)
-            ignorados = 0
+    def _progresso():
+        barramento.eventos.publicar("log", f"[SYNC] {merger.recebidos} registros recebidos "
+                                           f"({merger.novos} importados)...", chave=("sync", tid))
 
-        if novos > 0:
-            data.salvar_json(config.ARQ_REG, config.registros)
-            try:
-                ar.write(b"ECLEAR\r\n")
-            except Exception:
-                pass
+    try:
+        if binario:
+            for regs in dump:
+                for uid, data_iso, hora, seq in regs:
+                    merger.adicionar_registro(uid, data_iso, hora, seq)
+                _confirmar()
+                _progresso()
+        else:
+            for linha in dump:
+                merger.adicionar(linha)
+                if merger.recebidos % config.EDUMP_LOTE == 0:
+                    _confirmar()
+                    _progresso()
+    finally:
+        _confirmar()      # o que já chegou fica gravado mesmo se o dump cair no meio
+    return dump, merger
+
+def _do_initial_sync(ar, port_name, terminal=None):
+    """
+    Lógica completa de sincronização EDUMP após a conexão.
+
+    Chamada com o firmware já pronto (_aguardar_pronto). Retorna os UIDs de cartões
+    lidos no meio da sincronização: o firmware tomou o comando como ACK, então essas
+    batidas não foram para a EEPROM e precisam passar pela decisão.
+
+    Firmware com sequência: pede EDUMP_BIN <cursor da placa> (quadros binários; se
+    não houver resposta, EDUMP_SINCE em JSON) e recebe só o que é novo; o cursor avança
+    a cada commit e não há ECLEAR (o buffer circular sobrescreve registros já aplicados).
+    O cursor é do id gravado na EEPROM (terminal.placa, vindo do READY), não da porta:
+    placas trocadas de porta continuam cada uma com o seu. Sem id conhecido (firmware
+    sem id, READY perdido) pede desde 0, e o que já estava gravado sai como repetido;
+    se o dump trouxer o id, o cursor dessa placa é gravado para a próxima conexão. Se a
+    EEPROM voltar a uma sequência menor que o cursor (placa zerada), o cursor recomeça
+    da primeira sequência disponível.
+
+    Firmware antigo (sem EDUMP_SINCE): EDUMP completo. Regra do ECLEAR: só é enviado se
+    (1) o EEND chegou, (2) todos os registros do dump já foram gravados (confirmar()) e
+    (3) nenhum cartão foi lido durante a sincronização. Um UID pendente receberia o
+    ECLEAR como se fosse ACK e a batida sumiria; nesse caso a EEPROM é mantida e o
+    próximo dump é reaplicado sem duplicar (horas repetidas são descartadas pelo
+    MescladorIncremental).
+    """
+    tid = terminal.id if terminal else None
+    placa = terminal.placa if terminal else None
+    avulsos = []
+    t0 = time.perf_counter()
+
+    def _ingerir(**kw):
+        dump, merger = _ingerir_edump(ar, terminal, placa=placa, **kw)
+        avulsos.extend(funcoes.extrair_uid(l) for l in dump.uids_avulsos)
+        return dump, merger
+
+    try:
+        cursor = data.ler_cursor(config.ARQ_CURSOR, placa) if placa else 0
+        binario = config.EDUMP_BINARIO
+        dump, merger = _ingerir(desde=cursor, binario=binario)
+
+        if binario and not dump.iniciado:
+            barramento.eventos.publicar("log", "[SYNC] Sem resposta ao EDUMP_BIN; usando dump JSON.")
+            binario = False
+            dump, merger = _ingerir(desde=cursor)
+
+        if getattr(dump, "placa", None) and dump.placa != placa:
+            # id só no dump (READY perdido) ou placa trocada desde o READY: vale o do dump
+            placa = dump.placa
+            if terminal:
+                terminal.placa = placa
+
+        if dump.iniciado and dump.seq_proxima is not None and dump.seq_proxima < cursor:
+            barramento.eventos.publicar("log", f"[SYNC] {tid}: EEPROM reiniciada (seq {dump.seq_proxima} < cursor {cursor}); "
+                                               "sincronizando desde o início.")
+            cursor = dump.seq_primeira or 0
+            if placa:
+                data.salvar_cursor(config.ARQ_CURSOR, placa, cursor)
+            dump, merger = _ingerir(desde=cursor, binario=binario)
+
+        if getattr(dump, "invalidos", 0):
+            barramento.eventos.publicar("err", f"[SYNC] {tid}: {dump.invalidos} registros descartados (CRC inválido).")
+
+        if not dump.iniciado:
+            barramento.eventos.publicar("log", "[SYNC] 1ª tentativa sem EBEGIN; tentando EDUMP completo...")
+            avulsos.extend(funcoes.extrair_uid(l) for l in _drain_serial(ar, dur=0.5))
+            dump, merger = _ingerir()
+
+        if not dump.iniciado:
+            barramento.eventos.publicar("log", "[SYNC] Arduino não respondeu ao EDUMP na conexão.")
+            return avulsos
+
+        novos, ignorados = merger.novos, merger.ignorados
+        metricas.sync_segundos.observar(time.perf_counter() - t0)
+        metricas.sync_registros.observar(merger.recebidos)
+        metricas.sync_importados.inc(novos)
+        incremental = dump.seq_proxima is not None
+
+        if incremental and dump.seq_primeira is not None and dump.seq_primeira > cursor:
+            barramento.eventos.publicar("err", f"[SYNC] {tid}: {dump.seq_primeira - cursor} batidas offline "
+                                               "sobrescritas na EEPROM antes da sincronização.")
+
+        if not dump.completo:
+            barramento.eventos.publicar("err", f"[SYNC] EDUMP interrompido após {merger.recebidos} registros; "
+                                               f"{novos} gravados, EEPROM mantida.")
+        elif novos > 0:
+            if incremental:
+                pass    # sem ECLEAR: o cursor já marca o que foi aplicado
+            elif dump.uids_avulsos or _uid_chegando(ar):
+                barramento.eventos.publicar("log", "[SYNC] Cartão lido durante o sync; ECLEAR adiado para a próxima conexão.")
+            else:
+                try:
+                    ar.write(b"ECLEAR\r\n")
+                except Exception:
+                    pass
             msg = f"[SYNC] Importadas {novos} batidas pendentes"
             if ignorados:
                 msg += f" • {ignorados} ignoradas (UID não cadastrado)"
-            config.serial_queue.put(("ok", msg))
-            config.serial_queue.put(("update_data", "sync_completo")) # Sinal para UI
+            barramento.eventos.publicar("ok", msg)
         else:
             if ignorados:
-                config.serial_queue.put(("log", f"[SYNC] 0 válidas, {ignorados} ignoradas (UID não cadastrado)."))
+                barramento.eventos.publicar("log", f"[SYNC] 0 válidas, {ignorados} ignoradas (UID não cadastrado).")
             else:
-                config.serial_queue.put(("log", "[SYNC] Sem batidas pendentes na EEPROM."))
+                barramento.eventos.publicar("log", "[SYNC] Sem batidas pendentes na EEPROM.")
+
+        if novos > 0:
+            barramento.eventos.publicar("update_data", "sync_completo") # Sinal para UI
 
     except Exception as e:
-        config.serial_queue.put(("err", f"[SYNC] Falha ao processar EDUMP: {e}"))
+        barramento.eventos.publicar("err", f"[SYNC] Falha ao processar EDUMP: {e}")
+    return avulsos
+
+
+# PIPELINE DE BATIDAS
+# leitura/decodificação (thread da serial) -> decisão em memória + ACK imediato
+# -> persistência em grupo (um commit a cada config.GROUP_COMMIT_MS).
+#
+# Regra de recuperação para batidas com ACK ainda não persistidas:
+#   - parada normal (Desconectar, fim da thread, saída do processo): a fila de
+#     persistência é drenada e gravada antes de a conexão ser dada por encerrada;
+#   - queda do processo: perde-se no máximo o lote em andamento. Para limitar essa
+#     janela, se houver mais de config.PIPELINE_MAX_PENDENTES batidas sem commit
+#     (disco travado), a decisão deixa de responder: o Arduino estoura o
+#     ACK_TIMEOUT_MS, grava na EEPROM e a batida volta pelo EDUMP da próxima conexão.
+class PersistenciaEmGrupo:
+    """
+    Uma única thread de commit compartilhada por todos os terminais. Cada thread tem o
+    seu Event de parada: parada pedida (último terminal saiu), a thread só drena a fila e
+    sai, e um terminal que chegue nesse meio tempo sobe uma thread nova, que espera a
+    anterior terminar antes de gravar (os lotes continuam em ordem).
+    """
+    def __init__(self):
+        self._fila = queue.Queue()
+        self._thread = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._usuarios = 0
+        self._espera_s = 0.5        # sem lote, confere a parada a cada N segundos
+        self._batidas = 0           # registros enfileirados ou em commit (não lotes)
+        self._contagem = threading.Lock()
 
+    def iniciar(self):
+        with self._lock:
+            self._usuarios += 1
+            if self._thread and self._thread.is_alive() and not self._parar.is_set():
+                return
+            self._parar = threading.Event()
+            self._thread = threading.Thread(target=self._loop, args=(self._parar, self._thread), daemon=True)
+            self._thread.start()
 
-# FUNÇÃO DA THREAD PRINCIPAL
-def serial_worker(port_name, do_initial_sync: bool = True):
+    def liberar(self, timeout=5.0):
+        """Chamado por cada terminal ao encerrar; o último drena a fila."""
+        with self._lock:
+            self._usuarios = max(0, self._usuarios - 1)
+            if self._usuarios:
+                return
+            self._parar.set()
+            t = self._thread
+        if t and t.is_alive():
+            t.join(timeout)
+
+    def enfileirar(self, recs):
+        if recs:
+            with self._contagem:
+                self._batidas += len(recs)
+            self._fila.put(recs)
+
+    def pendentes(self):
+        """Batidas com ACK ainda sem commit: as da fila e as do commit em andamento."""
+        return self._batidas
+
+    def drenar(self, timeout=5.0):
+        """Para a thread depois de gravar tudo o que estiver na fila."""
+        with self._lock:
+            self._parar.set()
+            t = self._thread
+        if t and t.is_alive():
+            t.join(timeout)
+
+    def _loop(self, parar, anterior=None):
+        if anterior is not None:
+            anterior.join()     # ainda drenando: grava o que pegou antes desta começar
+        while True:
+            try:
+                lote = list(self._fila.get(timeout=self._espera_s))
+            except queue.Empty:
+                if parar.is_set():
+                    return
+                continue
+            fim = time.time() + config.GROUP_COMMIT_MS / 1000.0
+            while True:
+                restante = fim - time.time()
+                try:
+                    lote.extend(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            while True:
+                try:
+                    t0 = time.perf_counter()
+                    config.repo.persistir_eventos(lote)
+                    with self._contagem:
+                        self._batidas -= len(lote)
+                    metricas.commit_segundos.observar(time.perf_counter() - t0)
+                    metricas.commit_batidas.observar(len(lote))
+                    break
+                except Exception as e:
+                    # batidas já confirmadas ao Arduino: insiste até conseguir gravar
+                    barramento.eventos.publicar("err", f"[ERRO] Falha ao gravar {len(lote)} batidas: {e}")
+                    time.sleep(1.0)
+
+persistencia = PersistenciaEmGrupo()
+atexit.register(persistencia.drenar)
+metricas.registro.medidor("ponto_persistencia_pendentes", "Batidas decididas (com ACK) ainda sem commit",
+                          persistencia.pendentes)
+
+def _enviar(ar, msg):
     try:
-        with serial.Serial(
-            port_name, 
-            config.BAUDRATE, 
-            timeout=config.TIMEOUT,
-            dsrdtr=True, 
-            rtscts=True
-        ) as ar:
-            config.serial_port = ar
-            config.serial_connected = True
-            
+        ar.write(msg)
+    except Exception as ew:
+        barramento.eventos.publicar("log", f"[WARN] Falha ao enviar ACK: {ew}")
+
+def _estagio_decisao(ar, fila_uids, terminal):
+    """
+    Consome (uid, instante da leitura), decide em memória, responde OK/ERR e enfileira
+    a persistência. Mede a decisão e a latência leitura -> ACK (metricas).
+    """
+    while True:
+        item = fila_uids.get()
+        if item is None:
+            return
+        uid, lido = item
+
+        with config.capture_lock:
+            if config.capture_uid_mode:
+                _enviar(ar, b"OK\r\n")
+                barramento.eventos.publicar("uid_captured", uid)
+                config.capture_uid_mode = False
+                continue
+
+        if persistencia.pendentes() >= config.PIPELINE_MAX_PENDENTES:
+            barramento.eventos.publicar("err", f"[ERR] {terminal.id} UID {uid}: disco atrasado; batida fica na EEPROM do leitor")
+            continue
+
+        t0 = time.perf_counter()
+        try:
+            ok, info, evento, recs = funcoes.decidir_batida(uid, terminal.id)
+        except Exception as e:
+            ok, info, recs = False, f"Falha interna: {e}", []
+        t1 = time.perf_counter()
+        _enviar(ar, b"OK\r\n" if ok else b"ERR\r\n")
+        metricas.decisao.observar(t1 - t0)
+        metricas.ack.observar(time.perf_counter() - lido)
+        persistencia.enfileirar(recs)
+        terminal.contar(ok)
+
+        if ok:
+            barramento.eventos.publicar("ok", f"[OK] {terminal.id}: {info}")
+            barramento.eventos.publicar("update_data", "nova_batida")
+        else:
+            barramento.eventos.publicar("err", f"[ERR] {terminal.id} UID {uid}: {info}")
+
+
+# FUNÇÃO DA THREAD PRINCIPAL (estágio de leitura)
+def _ler_uids(ar, terminal, fila_uids):
+    """
+    Estágio de leitura: enquadra as linhas com LeitorLinhas e entrega os UIDs à decisão.
+    Pausa e parada chegam por Event + cancel_read(), sem laço de espera.
+    """
+    leitor = LeitorLinhas(ar)
+    while not terminal.stop_flag.is_set():
+        if terminal.pause_flag.is_set():
+            terminal._liberado.wait()
+            continue
+        try:
+            linhas = leitor.ler()
+        except (serial.SerialException, OSError):
+            raise       # porta caiu: o serial_worker reconecta
+        except Exception as e:
+            barramento.eventos.publicar("log", f"[WARN] Leitura: {e}")
+            continue
+        for linha in linhas:
+            uid = funcoes.extrair_uid(linha)
+            if uid is not None:
+                fila_uids.put((uid, time.perf_counter()))
+
+def _sessao(port_name, do_initial_sync, terminal):
+    """Uma conexão: abre a porta, espera o firmware, sincroniza e lê até parar ou cair."""
+    fila_uids = queue.Queue()
+    decisao = None
+    t_abertura = time.time()
+    with serial.Serial(
+        port_name, 
+        config.BAUDRATE, 
+        timeout=config.TIMEOUT,
+        dsrdtr=True, 
+        rtscts=True
+    ) as ar:
+        terminal.ser = ar
+        barramento.eventos.publicar("log", f"[SYNC] Conectado em {port_name}. Aguardando o firmware...")
+        pronto, uids, terminal.placa = _aguardar_pronto(ar)
+        if pronto:
+            terminal.marcar_conexao(time.time() - t_abertura)
+            barramento.eventos.publicar("log", f"[SERIAL] {terminal.id} pronto em {terminal.ultimo_pronto_s:.2f}s"
+                                               + (f" (placa {terminal.placa})" if terminal.placa else ""))
+        else:
+            terminal.marcar_conexao(None)
+            barramento.eventos.publicar("log", f"[SERIAL] {terminal.id}: firmware não confirmou o boot "
+                                               f"em {config.PRONTO_TIMEOUT_S:.0f}s; seguindo assim mesmo.")
+        terminal.conectado = True
+
+        try:
             if do_initial_sync:
-                _do_initial_sync(ar, port_name)
+                uids += _do_initial_sync(ar, port_name, terminal)
 
-            while not config.serial_stop_flag.is_set():
-                
-                if config.serial_pause_flag.is_set():
-                    time.sleep(0.05)
-                    continue
+            decisao = threading.Thread(target=_estagio_decisao, args=(ar, fila_uids, terminal), daemon=True)
+            decisao.start()
+            agora = time.perf_counter()     # lidos durante a sincronização: contam a partir daqui
+            for uid in uids:
+                fila_uids.put((uid, agora))
 
-                try:
-                    linha = ar.readline().decode("utf-8", errors="ignore").strip()
-                    if not linha:
-                        continue
-                        
-                    uid = funcoes.extrair_uid(linha)
-                    if uid is None:
-                        continue
-
-                    with config.capture_lock:
-                        if config.capture_uid_mode: 
-                            try:
-                                ar.write(b"OK\r\n")
-                            except Exception as ew:
-                                config.serial_queue.put(("log", f"[WARN] Falha ACK (captura): {ew}"))
-                            config.serial_queue.put(("uid_captured", uid))
-                            config.capture_uid_mode = False
-                            continue
-
-                    ok, info, evento = funcoes.registrar_batida(uid)
-                    try:
-                        ar.write(b"OK\r\n" if ok else b"ERR\r\n")
-                    except Exception as ew:
-                        config.serial_queue.put(("log", f"[WARN] Falha ao enviar ACK: {ew}"))
-
-                    if ok:
-                        config.serial_queue.put(("ok", f"[OK] {info}"))
-                        config.serial_queue.put(("update_data", "nova_batida"))
-                    else:
-                        config.serial_queue.put(("err", f"[ERR] UID {uid}: {info}"))
+            _ler_uids(ar, terminal, fila_uids)
+        finally:
+            if decisao:
+                fila_uids.put(None)
+                decisao.join(2.0)
+            terminal.conectado = False
+            terminal.ser = None
 
-                except Exception as e:
-                    config.serial_queue.put(("log", f"[WARN] Leitura: {e}"))
-                    time.sleep(0.3)
-                    
-    except serial.SerialException as e:
-        config.serial_queue.put(("err", f"[ERRO GRAVE] Falha ao abrir a porta {port_name}: {e}"))
-    except Exception as e:
-        config.serial_queue.put(("err", f"[ERRO] Falha geral na thread: {e}"))
+def serial_worker(port_name, do_initial_sync: bool = True, terminal=None):
+    """
+    Uma thread por porta; `terminal` guarda as flags de parada/pausa e os contadores.
+    Se a porta cair (cabo solto, reset) ou não abrir, tenta de novo com backoff
+    exponencial até o stop_flag; o supervisor de terminais antecipa a tentativa
+    (terminal.acordar) quando a porta reaparece em listar_portas().
+    """
+    terminal = terminal or Terminal(port_name)
+    persistencia.iniciar()
+    espera = config.RECONEXAO_MIN_S
+    try:
+        while not terminal.stop_flag.is_set():
+            sessoes = terminal.sessoes
+            try:
+                _sessao(port_name, do_initial_sync, terminal)
+            except serial.SerialException as e:
+                if terminal.fora_desde is None:     # avisa só a primeira falha de cada queda
+                    barramento.eventos.publicar("err", f"[ERRO GRAVE] Porta {port_name}: {e}. Reconectando...")
+            except Exception as e:
+                barramento.eventos.publicar("err", f"[ERRO] Falha geral na thread: {e}")
+            if terminal.stop_flag.is_set():
+                break
+            if terminal.sessoes != sessoes:
+                espera = config.RECONEXAO_MIN_S     # caiu depois de conectar: volta rápido
+            terminal.marcar_queda()
+            terminal.acordar.wait(espera)
+            terminal.acordar.clear()
+            espera = min(espera * 2, config.RECONEXAO_MAX_S)
     finally:
-        config.serial_connected = False
-        config.serial_port = None
-        config.serial_queue.put(("log", "[SERIAL] Desconectado"))
+        persistencia.liberar()
+        terminal.conectado = False
+        terminal.ser = None
+        barramento.eventos.publicar("log", f"[SERIAL] {terminal.id} desconectado")
 
 
 def listar_portas():
@@ -0,0 +1,478 @@
+"""
+Simulador do Arduino (Arduino-final.ino) sobre um pseudo-terminal + teste de carga.
+
+O simulador fala o mesmo protocolo do firmware: envia o UID lido, espera OK/ERR
+por ACK_TIMEOUT_MS e, sem resposta, grava na "EEPROM" (buffer circular com
+anti-dupe offline); aceita STATUS, EDUMP, EDUMP_SINCE, EDUMP_BIN, EDUMP_UID, EDUMP_CSV, ECLEAR e SETTIME,
+inclusive recebidos durante a espera do ACK (tratados como comando pendente).
+Ao fim do boot imprime "READY ID=<placa>"; desplugar()/replugar() simulam o cabo USB solto.
+
+Uso (Linux/macOS, precisa de pty):
+  python simulador.py --funcionarios 500 --minutos 5 --terminais 8
+  python simulador.py --funcionarios 50 --minutos 0.5 --eeprom 4096 --eeprom-cheia
+  python simulador.py --replug 5 --boot 1.5
+"""
+import os, sys, json, time, queue, random, select, calendar, tempfile, threading, tty, argparse
+from collections import deque
+from datetime import datetime, timedelta
+from funcoes import FRAME_BIN, crc8
+
+# Constantes do firmware
+ACK_TIMEOUT_MS = 1500
+LED_MS = 1000
+OFFLINE_MIN_GAP_SEC = 60
+HDR_SIZE = 16
+SLOT_SIZE = 16
+_EPOCH_0 = datetime(1970, 1, 1)
+
+
+def _epoch(dt):
+    """Epoch do RTC: hora local sem fuso, como DateTime::unixtime() no firmware."""
+    return calendar.timegm(dt.timetuple())
+
+def _data(epoch):
+    return _EPOCH_0 + timedelta(seconds=epoch)
+
+def _quadro(seq, epoch, uid):
+    b = bytes.fromhex(uid)
+    f = FRAME_BIN.pack(seq, epoch, len(b), b, 0)[:-1]
+    return f + bytes([crc8(f)])
+
+
+class ArduinoSimulado:
+    def __init__(self, eeprom_bytes=1024, baud=9600, boot_s=0.0, led_ms=LED_MS,
+                 ack_timeout_ms=ACK_TIMEOUT_MS, link=None, placa=None):
+        self.link = link        # caminho fixo (symlink) para a porta sobreviver ao replug
+        self._abrir_pty()
+        self.max_slots = (eeprom_bytes - HDR_SIZE) // SLOT_SIZE
+        self.eeprom = deque(maxlen=self.max_slots)     # (epoch, uid_hex, seq), mais antigo primeiro
+        self.seq = 0                                    # sequência do próximo registro
+        self.placa = placa or f"{random.getrandbits(32) or 1:08X}"     # id do header da EEPROM
+        self.baud = baud
+        self.boot_s = boot_s
+        self.led_ms = led_ms
+        self.ack_timeout_ms = ack_timeout_ms
+        self.offset_relogio = timedelta(0)
+        self.resultados = []        # (uid, latencia_s | None, 'OK'|'ERR'|'TIMEOUT'|'DUPE')
+        self.tempos_dump = []       # (t_edump, t_eend)
+        self.t_eclear = None
+        self._taps = queue.Queue()
+        self._buf = bytearray()
+        self._pendente = None
+        self._cache_offline = {}
+        self._parar = threading.Event()
+        self._thread = None
+        self.t_pronto = None        # perf_counter do último READY
+
+    # ---- ciclo de vida ----
+    def _abrir_pty(self):
+        self.master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.porta = os.ttyname(self._slave)
+        if self.link:
+            tmp = self.link + ".novo"
+            os.symlink(self.porta, tmp)
+            os.replace(tmp, self.link)
+            self.porta = self.link
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(2.0)
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def desplugar(self):
+        """Cabo solto: fecha o pty, e a leitura do lado do PC passa a falhar."""
+        self.parar()
+
+    def replugar(self):
+        """Cabo de volta: pty novo (mesma `porta` se houver `link`) e um novo boot."""
+        self._parar.clear()
+        self._buf.clear()
+        self._pendente = None
+        self._abrir_pty()
+        return self.iniciar()
+
+    def tocar(self, uid):
+        """Agenda a leitura de um cartão (processada em ordem, como no leitor real)."""
+        self._taps.put(uid.upper())
+
+    def taps_pendentes(self):
+        return self._taps.qsize()
+
+    def preencher_eeprom(self, uids, inicio=None, passo_s=300, n=None):
+        """Enche a EEPROM (até a capacidade) com batidas offline dos `uids`."""
+        inicio = inicio or (datetime.now() - timedelta(days=1)).replace(hour=7, minute=0, second=0)
+        n = self.max_slots if n is None else min(n, self.max_slots)
+        for i in range(n):
+            ts = inicio + timedelta(seconds=passo_s * (i // max(1, len(uids))))
+            self._gravar(_epoch(ts), uids[i % len(uids)])
+
+    def _gravar(self, epoch, uid):
+        self.eeprom.append((epoch, uid, self.seq))
+        self.seq += 1
+
+    # ---- E/S no pty ----
+    def _agora(self):
+        return datetime.now() + self.offset_relogio
+
+    def _escrever(self, texto):
+        b = (texto + "\r\n").encode()
+        os.write(self.master, b)
+        if self.baud:
+            time.sleep(len(b) * 10 / self.baud)     # 8N1: 10 bits por byte
+
+    def _ler_linha(self, timeout):
+        fim = time.perf_counter() + timeout
+        while True:
+            i = self._buf.find(b"\n")
+            if i >= 0:
+                linha = bytes(self._buf[:i]).decode(errors="ignore").strip()
+                del self._buf[:i + 1]
+                return linha
+            restante = fim - time.perf_counter()
+            if restante <= 0:
+                return None
+            r, _, _ = select.select([self.master], [], [], restante)
+            if not r:
+                return None
+            try:
+                self._buf += os.read(self.master, 4096)
+            except OSError:
+                return None
+
+    # ---- firmware ----
+    def _loop(self):
+        if self.boot_s:
+            time.sleep(self.boot_s)
+            while select.select([self.master], [], [], 0)[0]:    # o que chegou durante o boot se perde
+                try:
+                    os.read(self.master, 4096)
+                except OSError:
+                    break
+            self._buf.clear()
+        self._escrever(f"READY ID={self.placa}")
+        self.t_pronto = time.perf_counter()
+        while not self._parar.is_set():
+            linha = self._ler_linha(0.01)
+            if linha:
+                self._comando(linha)
+                continue
+            if self._pendente:
+                cmd, self._pendente = self._pendente, None
+                self._comando(cmd)
+                continue
+            try:
+                uid = self._taps.get_nowait()
+            except queue.Empty:
+                continue
+            self._tap(uid)
+
+    def _tap(self, uid):
+        t0 = time.perf_counter()
+        self._escrever(uid)
+        ack = self._esperar_ack()
+        lat = time.perf_counter() - t0
+        if ack == 1:
+            self.resultados.append((uid, lat, "OK"))
+        elif ack == 0:
+            self.resultados.append((uid, lat, "ERR"))
+        else:
+            epoch = _epoch(self._agora())
+            ultimo = self._cache_offline.get(uid)
+            if ultimo is not None and epoch - ultimo < OFFLINE_MIN_GAP_SEC:
+                self.resultados.append((uid, None, "DUPE"))
+            else:
+                self._cache_offline[uid] = epoch
+                self._gravar(epoch, uid)
+                self.resultados.append((uid, None, "TIMEOUT"))
+        time.sleep(self.led_ms / 1000.0)
+
+    def _esperar_ack(self):
+        fim = time.perf_counter() + self.ack_timeout_ms / 1000.0
+        while True:
+            restante = fim - time.perf_counter()
+            if restante <= 0:
+                return -1
+            linha = self._ler_linha(restante)
+            if linha is None:
+                continue
+            if linha == "OK":
+                return 1
+            if linha == "ERR":
+                return 0
+            if linha in ("EDUMP", "ECLEAR", "STATUS", "EDUMP_CSV") or linha.startswith(("EDUMP_UID ", "EDUMP_SINCE ", "EDUMP_BIN ", "SETTIME ")):
+                self._pendente = linha      # firmware trata comando durante o ACK como OK
+                return 1
+
+    @staticmethod
+    def _json(epoch, uid, seq):
+        ts = _data(epoch).strftime("%Y-%m-%dT%H:%M:%S")
+        return json.dumps({"uid": uid, "ts": ts, "seq": seq, "src": "eeprom"}, separators=(",", ":"))
+
+    def _comando(self, linha):
+        if linha == "STATUS":
+            self._escrever(f"MAX_SLOTS={self.max_slots} HEAD={len(self.eeprom) % self.max_slots} "
+                           f"COUNT={len(self.eeprom)} SEQ={self.seq} ID={self.placa}")
+        elif linha == "EDUMP" or linha.startswith(("EDUMP_UID ", "EDUMP_SINCE ")):
+            filtro = linha[10:].strip().upper() if linha.startswith("EDUMP_UID ") else None
+            desde = 0
+            t0 = time.perf_counter()
+            self._escrever("EBEGIN")
+            if linha.startswith("EDUMP_SINCE "):
+                try:
+                    desde = int(linha[12:].strip() or 0)
+                except ValueError:
+                    desde = 0
+                self._escrever(f"ESEQ {self.seq - len(self.eeprom)} {self.seq} {self.placa}")
+            for epoch, uid, seq in list(self.eeprom):
+                if seq >= desde and (filtro is None or uid == filtro):
+                    self._escrever(self._json(epoch, uid, seq))
+            self._escrever("EEND")
+            self.tempos_dump.append((t0, time.perf_counter()))
+        elif linha.startswith("EDUMP_BIN "):
+            try:
+                desde = int(linha[10:].strip() or 0)
+            except ValueError:
+                desde = 0
+            t0 = time.perf_counter()
+            slots = [r for r in list(self.eeprom) if r[2] >= desde]
+            self._escrever(f"EBIN {len(slots)} {self.seq - len(self.eeprom)} {self.seq} {self.placa}")
+            for epoch, uid, seq in slots:
+                q = _quadro(seq, epoch, uid)
+                os.write(self.master, q)
+                if self.baud:
+                    time.sleep(len(q) * 10 / self.baud)
+            self._escrever("EEND")
+            self.tempos_dump.append((t0, time.perf_counter()))
+        elif linha == "EDUMP_CSV":
+            self._escrever("uid,ts,src")
+            for epoch, uid, _seq in list(self.eeprom):
+                self._escrever(f"{uid},{_data(epoch).strftime('%Y-%m-%dT%H:%M:%S')},eeprom")
+        elif linha == "ECLEAR":
+            self.eeprom.clear()
+            self.t_eclear = time.perf_counter()
+            self._escrever("ECLEARED")
+        elif linha.startswith("SETTIME "):
+            try:
+                alvo = datetime.strptime(linha[8:].strip()[:19], "%Y-%m-%dT%H:%M:%S")
+            except ValueError:
+                self._escrever("ERR Bad ISO time")
+                return
+            self.offset_relogio = alvo - datetime.now()
+            self._escrever("TIMESET")
+
+
+# TESTE DE CARGA
+def _percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100.0 * (len(valores) - 1))))]
+
+def executar_carga(funcionarios=500, minutos=5.0, terminais=1, eeprom_bytes=1024,
+                   eeprom_cheia=False, baud=9600, led_ms=LED_MS, sync=True, dir_trabalho=None):
+    """
+    Sobe `terminais` simuladores, conecta um serial_worker em cada (num diretório de
+    dados temporário), dispara uma batida por funcionário espalhada em `minutos` e
+    devolve o relatório (latências, perdas e duração do sync).
+    """
+    dir_trabalho = dir_trabalho or tempfile.mkdtemp(prefix="ponto_sim_")
+    os.chdir(dir_trabalho)
+    import config, data, repositorio, serial_thread, barramento, metricas
+
+    uids = [f"{0xA0000000 + i:08X}" for i in range(funcionarios)]
+    data.salvar_json(config.ARQ_FUNC, {u: f"Func {i:04d}" for i, u in enumerate(uids)})
+    config.repo = repositorio.RepositorioJSON()
+    config.repo.carregar()
+    config.ultimas_batidas.clear()
+    terminal_de = {u: i % terminais for i, u in enumerate(uids)}
+
+    sims = [ArduinoSimulado(eeprom_bytes, baud=baud, led_ms=led_ms).iniciar() for _ in range(terminais)]
+    if eeprom_cheia:
+        for i, sim in enumerate(sims):
+            sim.preencher_eeprom(uids[i::terminais] or uids)
+
+    msgs = {"ok": 0, "err": 0}
+    fim_sync = {}
+    coletando = threading.Event()
+
+    mensagens = barramento.eventos.assinar("simulador", capacidade=funcionarios * 4 + 1000)
+
+    def _coletar():
+        while not coletando.is_set():
+            try:
+                ev = mensagens.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            kind, payload = ev
+            if kind in msgs:
+                msgs[kind] += ev.vezes
+            if str(payload).startswith("[SYNC]") and ("Importadas" in payload or "Sem batidas" in payload
+                                                     or "ignoradas" in payload or "não respondeu" in payload):
+                fim_sync[len(fim_sync)] = time.perf_counter()
+    threading.Thread(target=_coletar, daemon=True).start()
+
+    t_conexao = time.perf_counter()
+    terms = []
+    for sim in sims:
+        term = serial_thread.Terminal(sim.porta)
+        term.thread = threading.Thread(target=serial_thread.serial_worker,
+                                       args=(sim.porta, sync, term), daemon=True)
+        term.thread.start()
+        terms.append(term)
+
+    while sync and len(fim_sync) < terminais and time.perf_counter() - t_conexao < 120:
+        time.sleep(0.05)
+    t_sync = time.perf_counter() - t_conexao if sync else 0.0
+    time.sleep(0.2)
+
+    # tempestade: uma batida por funcionário em instantes aleatórios dentro da janela
+    agenda = sorted((random.uniform(0, minutos * 60.0), u) for u in uids)
+    t0 = time.perf_counter()
+    for quando, uid in agenda:
+        espera = t0 + quando - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        sims[terminal_de[uid]].tocar(uid)
+    while any(s.taps_pendentes() for s in sims):
+        time.sleep(0.05)
+    time.sleep((ACK_TIMEOUT_MS + led_ms) / 1000.0 + 0.5)
+    duracao = time.perf_counter() - t0
+
+    for term in terms:
+        term.parar()
+    for term in terms:
+        term.thread.join(5.0)
+    coletando.set()
+    barramento.eventos.cancelar(mensagens)
+
+    resultados = [r for s in sims for r in s.resultados]
+    lat = [r[1] * 1000.0 for r in resultados if r[1] is not None]
+    ok = sum(1 for r in resultados if r[2] == "OK")
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    gravadas = sum(1 for _h, _u, _ev in config.repo.batidas_do_dia(hoje))
+    dumps = [fim - ini for s in sims for ini, fim in s.tempos_dump]
+
+    for sim in sims:
+        sim.parar()
+    return {
+        "dir": dir_trabalho,
+        "terminais": terminais,
+        "taps": len(agenda),
+        "duracao_s": round(duracao, 2),
+        "ack_ok": ok,
+        "ack_err": sum(1 for r in resultados if r[2] == "ERR"),
+        "sem_ack_eeprom": sum(1 for r in resultados if r[2] in ("TIMEOUT", "DUPE")),
+        "ok_sem_gravacao": max(0, ok - gravadas),
+        "latencia_ms": {p: (round(_percentil(lat, p), 1) if lat else None) for p in (50, 90, 99, 100)},
+        "sync_s": round(t_sync, 2),
+        "edump_s": [round(d, 2) for d in dumps],
+        "msgs_ui": msgs,
+        # o que o próprio processo mediu (metricas): da linha lida ao ACK escrito, sem a serial
+        "metricas_ms": {nome: _ms_quantis(h) for nome, h in (("ack", metricas.ack), ("decisao", metricas.decisao),
+                                                             ("commit", metricas.commit_segundos))},
+    }
+
+
+def _ms_quantis(histograma):
+    return {p: (round(histograma.quantil(p / 100) * 1000, 2) if histograma.total else None) for p in (50, 99)}
+
+
+def medir_reconexao(vezes=5, boot_s=1.5, fora_s=1.0, baud=9600, atraso_s=0.0, dir_trabalho=None):
+    """
+    Solta e recoloca o cabo `vezes` vezes com um serial_worker conectado. Em cada replug
+    um cartão é lido `atraso_s` depois de o firmware imprimir READY; mede o tempo do
+    READY até o ACK (OK) e confere se a batida foi gravada. Devolve o relatório com as estatísticas do terminal.
+    """
+    dir_trabalho = dir_trabalho or tempfile.mkdtemp(prefix="ponto_sim_")
+    os.chdir(dir_trabalho)
+    import config, data, repositorio, serial_thread
+
+    uids = [f"{0xB0000000 + i:08X}" for i in range(vezes)]
+    data.salvar_json(config.ARQ_FUNC, {u: f"Func {i:04d}" for i, u in enumerate(uids)})
+    config.repo = repositorio.RepositorioJSON()
+    config.repo.carregar()
+    config.ultimas_batidas.clear()
+
+    sim = ArduinoSimulado(baud=baud, boot_s=boot_s, link=os.path.join(dir_trabalho, "ttySIM0")).iniciar()
+    term = serial_thread.Terminal(sim.porta)
+    term.thread = threading.Thread(target=serial_thread.serial_worker, args=(sim.porta, True, term), daemon=True)
+    term.thread.start()
+    while not term.conectado and term.thread.is_alive():
+        time.sleep(0.05)
+
+    latencias = []
+    for uid in uids:
+        sim.desplugar()
+        time.sleep(fora_s)
+        t_ready = sim.t_pronto
+        sim.replugar()
+        term.acordar.set()      # o supervisor faz isso ao ver a porta voltar (pty não aparece em listar_portas)
+        while sim.t_pronto == t_ready:
+            time.sleep(0.001)
+        time.sleep(atraso_s)
+        sim.tocar(uid)
+        while len(sim.resultados) < uids.index(uid) + 1:
+            time.sleep(0.01)
+        _, lat, res = sim.resultados[-1]
+        latencias.append((lat + atraso_s) * 1000 if res == "OK" else None)
+        time.sleep(sim.led_ms / 1000.0 + 0.3)
+
+    term.parar()
+    term.thread.join(5.0)
+    sim.parar()
+    serial_thread.persistencia.drenar()
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    gravadas = sum(1 for u in uids if config.repo.dia(u, hoje))
+    ok = [l for l in latencias if l is not None]
+    return {
+        "dir": dir_trabalho,
+        "replugs": vezes,
+        "boot_s": boot_s,
+        "ready_ate_ok_ms": [round(l, 1) if l is not None else None for l in latencias],
+        "ready_ate_ok_max_ms": round(max(ok), 1) if ok else None,
+        "gravadas": gravadas,
+        "reconexoes": term.reconexoes,
+        "tempo_fora_s": round(term.tempo_fora_total(), 2),
+        "pronto_s": round(term.ultimo_pronto_s, 2) if term.ultimo_pronto_s is not None else None,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Simulador de leitor RFID + teste de carga do serial_worker")
+    ap.add_argument("--funcionarios", type=int, default=500)
+    ap.add_argument("--minutos", type=float, default=5.0)
+    ap.add_argument("--terminais", type=int, default=1)
+    ap.add_argument("--eeprom", type=int, default=1024, help="tamanho da EEPROM em bytes (1024 UNO, 4096 MEGA)")
+    ap.add_argument("--eeprom-cheia", action="store_true", help="começa com a EEPROM cheia de batidas offline")
+    ap.add_argument("--baud", type=int, default=9600, help="0 desliga a limitação de velocidade")
+    ap.add_argument("--led-ms", type=int, default=LED_MS)
+    ap.add_argument("--sem-sync", action="store_true", help="não faz o EDUMP inicial")
+    ap.add_argument("--replug", type=int, default=0, metavar="N",
+                    help="em vez da carga, solta/recoloca o cabo N vezes e mede a reconexão")
+    ap.add_argument("--boot", type=float, default=1.5, help="duração do boot do Arduino no --replug (s)")
+    ap.add_argument("--atraso", type=float, default=0.0, help="no --replug, espera N s após o READY para ler o cartão")
+    args = ap.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.replug:
+        rel = medir_reconexao(args.replug, args.boot, baud=args.baud, atraso_s=args.atraso)
+    else:
+        rel = executar_carga(args.funcionarios, args.minutos, args.terminais, args.eeprom,
+                             args.eeprom_cheia, args.baud, args.led_ms, not args.sem_sync)
+    for k, v in rel.items():
+        print(f"{k:>16}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import threading, time
+import config
+import barramento
+import serial_thread
+
+# GERENCIADOR DE TERMINAIS
+# Uma serial_worker por porta; todas compartilham a decisão (config.decisao_lock),
+# a persistência em grupo (serial_thread.persistencia) e o barramento.eventos.
+# A própria serial_worker reconecta com backoff; o supervisor (iniciar_supervisor)
+# varre listar_portas() e, quando uma porta volta, acorda o terminal dela na hora.
+class GerenciadorTerminais:
+    def __init__(self):
+        self._terminais = {}    # porta -> serial_thread.Terminal
+        self._lock = threading.Lock()
+        self._supervisor = None
+        self._parar = threading.Event()
+
+    def conectar(self, porta, do_initial_sync=True):
+        """Inicia a thread da porta. Retorna o Terminal, ou None se a porta já estiver ativa."""
+        with self._lock:
+            atual = self._terminais.get(porta)
+            if atual and atual.thread and atual.thread.is_alive():
+                return None
+            terminal = serial_thread.Terminal(porta)
+            terminal.thread = threading.Thread(
+                target=serial_thread.serial_worker,
+                args=(porta, do_initial_sync, terminal),
+                daemon=True
+            )
+            self._terminais[porta] = terminal
+        terminal.thread.start()
+        return terminal
+
+    def desconectar(self, porta):
+        with self._lock:
+            terminal = self._terminais.get(porta)
+        if not terminal or not _ativo(terminal):
+            return False
+        terminal.parar()
+        return True
+
+    def desconectar_todos(self):
+        with self._lock:
+            ativos = [t for t in self._terminais.values() if _ativo(t)]
+        for t in ativos:
+            t.parar()
+        return len(ativos)
+
+    def terminais(self):
+        with self._lock:
+            return list(self._terminais.values())
+
+    def conectados(self):
+        return [t for t in self.terminais() if t.conectado]
+
+    # ---- hot-plug ----
+    def iniciar_supervisor(self, intervalo=None):
+        """Sobe (uma vez) a thread que acompanha as portas que aparecem e somem."""
+        with self._lock:
+            if self._supervisor and self._supervisor.is_alive():
+                return
+            self._parar.clear()
+            self._supervisor = threading.Thread(target=self._vigiar, args=(intervalo,), daemon=True)
+        self._supervisor.start()
+
+    def parar_supervisor(self):
+        self._parar.set()
+
+    def _vigiar(self, intervalo):
+        intervalo = intervalo or config.HOTPLUG_INTERVALO_S
+        vistas = set(serial_thread.listar_portas())
+        while not self._parar.wait(intervalo):
+            try:
+                atuais = set(serial_thread.listar_portas())
+            except Exception:
+                continue
+            for porta in sorted(vistas - atuais):
+                barramento.eventos.publicar("log", f"[SERIAL] Porta {porta} removida")
+            for porta in sorted(atuais - vistas):
+                with self._lock:
+                    terminal = self._terminais.get(porta)
+                if terminal and _ativo(terminal):
+                    barramento.eventos.publicar("log", f"[SERIAL] Porta {porta} voltou; reconectando")
+                    terminal.acordar.set()
+                elif terminal is None and config.AUTO_CONECTAR:
+                    barramento.eventos.publicar("log", f"[SERIAL] Porta nova {porta}; conectando")
+                    self.conectar(porta)
+            vistas = atuais
+
+    def status(self):
+        """Linhas para a tabela de terminais da aba Conexão."""
+        rows = []
+        for t in sorted(self.terminais(), key=lambda t: t.id):
+            ultima = time.strftime("%H:%M:%S", time.localtime(t.ultima_batida)) if t.ultima_batida else ''
+            if t.conectado:
+                estado = 'conectado'
+            elif _ativo(t):
+                estado = 'reconectando'
+            else:
+                estado = 'desconectado'
+            rows.append({
+                'id': t.id,
+                'status': estado,
+                'batidas': t.batidas,
+                'erros': t.erros,
+                'por_minuto': t.batidas_por_minuto(),
+                'ultima': ultima,
+                'reconexoes': t.reconexoes,
+                'fora': f"{t.tempo_fora_total():.1f}s",
+                'pronto': f"{t.ultimo_pronto_s:.2f}s" if t.ultimo_pronto_s is not None else '',
+            })
+        return rows
+
+def _ativo(terminal):
+    return bool(terminal.thread and terminal.thread.is_alive() and not terminal.stop_flag.is_set())
+
+gerenciador = GerenciadorTerminais()
@@ -0,0 +1,29 @@
+import serial_thread
+
+
+class PortaFalsa:
+    """Entrega `pedacos` um por read(), como a serial faz quando o SO junta bytes."""
+    def __init__(self, pedacos):
+        self.pedacos = list(pedacos)
+        self.timeout = 1.0
+        self.escritos = []
+
+    @property
+    def in_waiting(self):
+        return len(self.pedacos[0]) if self.pedacos else 0
+
+    def read(self, n=1):
+        return self.pedacos.pop(0) if self.pedacos else b""
+
+    def write(self, b):
+        self.escritos.append(b)
+
+
+def test_uids_no_mesmo_pedaco_que_o_ready_nao_se_perdem():
+    porta = PortaFalsa([b"lixo do boot\r\nA1B2C3D4\r\nREADY ID=0000000A\r\nB1B2C3D4\r\nC1C2",
+                        b"C3C4\r\n"])
+    pronto, uids, placa = serial_thread._aguardar_pronto(porta, timeout=1.0, sonda=0.5)
+    assert pronto
+    assert placa == "0000000A"
+    assert uids == ["A1B2C3D4", "B1B2C3D4", "C1C2C3C4"]
+    assert porta.timeout == 1.0
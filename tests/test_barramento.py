@@ -0,0 +1,59 @@
+import threading
+import config
+from barramento import Barramento
+
+
+def test_sinais_chaves_e_repeticoes_se_juntam():
+    bus = Barramento(10)
+    tela = bus.assinar("tela")
+    for _ in range(3):
+        bus.publicar("update_data", "nova_batida")
+    bus.publicar("update_data")
+    bus.publicar("update_data")
+    for feitos in range(1, 4):
+        bus.publicar("exportacao", {"feitos": feitos, "total": 3}, chave="job-1")
+    bus.publicar("log", "porta ocupada")
+    bus.publicar("log", "porta ocupada")
+    evs = tela.drenar()
+    assert [(e.tipo, e.dado, e.vezes) for e in evs[:2]] == [("update_data", "nova_batida", 3),
+                                                            ("update_data", None, 2)]
+    assert [(e.tipo, e.vezes) for e in evs[2:]] == [("exportacao", 3), ("log", 2)]
+    assert evs[2].dado == {"feitos": 3, "total": 3}          # o progresso mais novo substitui o pendente
+    assert tela.estatisticas() == {"pendentes": 0, "recebidos": 10, "agrupados": 6, "descartados": 0}
+
+
+def test_buffer_cheio_descarta_o_mais_antigo():
+    bus = Barramento(config.BARRAMENTO_CAPACIDADE)
+    assert bus.assinar("padrao").capacidade == config.BARRAMENTO_CAPACIDADE
+    tela = bus.assinar("tela", capacidade=5)
+    bus.publicar("log", "repetido")
+    bus.publicar("log", "repetido")                           # 1 pendente, vezes=2
+    for i in range(6):
+        bus.publicar("ok", f"batida {i}")
+    evs = tela.drenar()
+    assert [e.dado for e in evs] == [f"batida {i}" for i in range(1, 6)]
+    assert tela.descartados == 2 + 1                          # o log contava 2, e a batida 0
+
+
+def test_tela_lenta_recebe_eventos_agrupados_sem_travar_quem_publica():
+    bus = Barramento(config.BARRAMENTO_CAPACIDADE)
+    avisos = []
+    tela = bus.assinar("tela", capacidade=50, avisar=lambda: avisos.append(1))
+    n = 20000
+
+    def rajada():
+        for i in range(n):
+            bus.publicar("update_data", "nova_batida")
+            bus.publicar("exportacao", {"feitos": i, "total": n}, chave="job-1")
+            bus.publicar("ok", f"batida {i}")
+    serial = threading.Thread(target=rajada)
+    serial.start()
+    serial.join(10)
+    assert not serial.is_alive()                              # ninguém leu e a publicação não esperou
+    evs = tela.drenar()
+    assert len(evs) == 50 and len(avisos) == 1
+    assert evs[-1].dado == f"batida {n - 1}"
+    stats = tela.estatisticas()
+    assert stats["recebidos"] == 3 * n
+    assert stats["recebidos"] == stats["descartados"] + sum(e.vezes for e in evs)
+    assert sum(1 for e in evs if e.tipo == "update_data") == 1     # um sinal pendente basta
@@ -0,0 +1,50 @@
+import serial_thread
+from simulador import _quadro
+
+
+class PortaLinhas:
+    """Serial falsa: `entrada` é o que já estava na porta; `resposta` chega depois do comando."""
+    def __init__(self, entrada, resposta):
+        self._buf = bytearray(entrada)
+        self._resposta = resposta
+        self.escritos = []
+
+    def reset_input_buffer(self):
+        self._buf.clear()
+
+    def write(self, b):
+        self.escritos.append(b)
+        self._buf += self._resposta
+
+    def readline(self):
+        i = self._buf.find(b"\n")
+        fim = len(self._buf) if i < 0 else i + 1
+        linha = bytes(self._buf[:fim])
+        del self._buf[:fim]
+        return linha
+
+    def read(self, n=1):
+        pedaco = bytes(self._buf[:n])
+        del self._buf[:n]
+        return pedaco
+
+
+def test_edump_json_nao_descarta_uid_que_ja_estava_na_entrada():
+    porta = PortaLinhas(b"A1B2C3D4\r\n",
+                        b'EBEGIN\r\nESEQ 0 1 0000000A\r\n'
+                        b'{"uid":"B1B2C3D4","ts":"2024-03-01T08:00:00","seq":0}\r\nEEND\r\n')
+    dump = serial_thread._EdumpStream(porta, timeout_inicio=0.5, ocioso=0.5, desde=0)
+    linhas = list(dump)
+    assert dump.completo and len(linhas) == 1
+    assert dump.uids_avulsos == ["A1B2C3D4"]
+    assert (dump.seq_primeira, dump.seq_proxima, dump.placa) == (0, 1, "0000000A")
+
+
+def test_edump_bin_nao_descarta_uid_que_ja_estava_na_entrada():
+    quadro = _quadro(5, 1709280000, "B1B2C3D4")
+    porta = PortaLinhas(b"A1B2C3D4\r\n", b"EBIN 1 5 6 0000000A\r\n" + quadro + b"EEND\r\n")
+    dump = serial_thread._EdumpBinStream(porta, desde=5, timeout_inicio=0.5, ocioso=0.5)
+    regs = [r for bloco in dump for r in bloco]
+    assert dump.completo and [r[0] for r in regs] == ["B1B2C3D4"]
+    assert dump.uids_avulsos == ["A1B2C3D4"]
+    assert dump.placa == "0000000A"
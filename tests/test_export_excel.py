@@ -0,0 +1,104 @@
+import json, os
+from datetime import timedelta
+import pytest
+from openpyxl import load_workbook
+import config
+import export_excel
+
+MES = "2024-03"
+FUNCIONARIOS = {"A1B2C3D4": "Ana", "B1B2C3D4": "Bruno", "C1B2C3D4": "Carla"}
+
+
+def _dia(e, s):
+    return {"entrada": e, "saida_intervalo": "12:00", "volta_intervalo": "13:00", "saida": s}
+
+
+def _registros():
+    return {"A1B2C3D4": {"2024-03-01": _dia("08:00", "17:00")},
+            "B1B2C3D4": {"2024-03-04": _dia("09:00", "18:00")},
+            "C1B2C3D4": {"2024-03-05": _dia("07:00", "16:00")}}
+
+
+@pytest.fixture
+def escritas(tmp_path, monkeypatch):
+    """Pasta limpa e a lista de abas geradas do zero (as que não vieram do cache)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(export_excel, "_xml_direto", None)
+    feitas = []
+    escrever = export_excel._escrever_aba
+
+    def contar(ws, batidas, calendario):
+        feitas.append(ws.title)
+        return escrever(ws, batidas, calendario)
+    monkeypatch.setattr(export_excel, "_escrever_aba", contar)
+    return feitas
+
+
+def _exportar(funcionarios, registros):
+    return export_excel.exportar_mes_xlsx(MES, funcionarios, registros, config.EVENTOS)
+
+
+def _resumo(caminho):
+    wb = load_workbook(caminho)
+    return {linha[0]: linha[2] for linha in wb["Resumo"].iter_rows(min_row=2, values_only=True)}, wb
+
+
+def test_mes_sem_mudancas_devolve_o_arquivo_anterior(escritas):
+    caminho = _exportar(FUNCIONARIOS, _registros())
+    antes = os.stat(caminho).st_mtime_ns
+    escritas.clear()
+    assert _exportar(dict(FUNCIONARIOS), _registros()) == caminho
+    assert escritas == []
+    assert os.stat(caminho).st_mtime_ns == antes
+
+
+def test_so_a_aba_de_quem_mudou_e_gerada_de_novo(escritas):
+    _exportar(FUNCIONARIOS, _registros())
+    escritas.clear()
+    registros = _registros()
+    registros["B1B2C3D4"]["2024-03-04"]["saida"] = "20:00"
+    caminho = _exportar(FUNCIONARIOS, registros)
+    assert escritas == ["Bruno"]
+    totais, wb = _resumo(caminho)
+    assert totais == {"Ana": timedelta(hours=8), "Bruno": timedelta(hours=10), "Carla": timedelta(hours=8)}
+    assert [c.value for c in wb["Carla"][6]][:6] == ["05/03/2024", "Ter", "07:00", "12:00", "13:00", "16:00"]
+    assert [c.value for c in wb["Bruno"][5]][5] == "20:00"
+
+
+def test_mudanca_no_cadastro_invalida_o_arquivo(escritas):
+    caminho = _exportar(FUNCIONARIOS, _registros())
+    escritas.clear()
+    funcionarios = dict(FUNCIONARIOS, A1B2C3D4="Ana Paula", D1B2C3D4="Davi")
+    _exportar(funcionarios, _registros())
+    assert escritas == ["Davi"]                 # as abas dos outros vêm do arquivo anterior
+    totais, wb = _resumo(caminho)
+    assert wb.sheetnames == ["Resumo", "Ana Paula", "Bruno", "Carla", "Davi"]
+    assert totais["Ana Paula"] == timedelta(hours=8) and totais["Davi"] == timedelta(0)
+
+
+def test_manifestos_velhos_sao_varridos(escritas):
+    caminho = _exportar(FUNCIONARIOS, _registros())
+    manifesto = os.path.join(export_excel.DIR_CACHE, f"{MES}.json")
+    fev = export_excel.exportar_mes_xlsx("2024-02", FUNCIONARIOS, {}, config.EVENTOS)
+    os.remove(fev)                              # arquivo apagado
+    with open(caminho, "ab") as f:              # arquivo mexido fora daqui
+        f.write(b"\0")
+    with open(os.path.join(export_excel.DIR_CACHE, "2023-12.json"), "w") as f:
+        json.dump({"formato": export_excel.FORMATO_EXPORT - 1, "caminho": caminho}, f)
+    export_excel._varrer_cache()
+    assert os.listdir(export_excel.DIR_CACHE) == []
+    assert not os.path.exists(manifesto)
+
+
+def test_openpyxl_nao_testado_gera_todas_as_abas(escritas, monkeypatch):
+    _exportar(FUNCIONARIOS, _registros())
+    monkeypatch.setattr(export_excel, "OPENPYXL_TESTADO", ((0, 0),))
+    monkeypatch.setattr(export_excel, "_xml_direto", None)
+    assert not export_excel.xml_direto()
+    escritas.clear()
+    registros = _registros()
+    registros["B1B2C3D4"]["2024-03-04"]["saida"] = "20:00"
+    caminho = _exportar(FUNCIONARIOS, registros)
+    assert sorted(escritas) == ["Ana", "Bruno", "Carla"]        # nada reaproveitado do arquivo anterior
+    totais, _wb = _resumo(caminho)
+    assert totais == {"Ana": timedelta(hours=8), "Bruno": timedelta(hours=10), "Carla": timedelta(hours=8)}
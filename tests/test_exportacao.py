@@ -0,0 +1,39 @@
+import threading, time
+import exportacao
+
+
+def test_iniciar_simultaneo_cria_um_pool_so(monkeypatch):
+    monkeypatch.setattr(exportacao, "_fila", None)
+    monkeypatch.setattr(exportacao, "_cancelados", None)
+    monkeypatch.setattr(exportacao.multiprocessing, "get_all_start_methods", lambda: ["spawn"])   # pool de thread
+    criados = []
+    original = exportacao.ThreadPoolExecutor
+
+    def criar(*args, **kw):
+        pool = original(*args, **kw)
+        if kw.get("thread_name_prefix") == "exportacao":
+            time.sleep(0.05)                # alarga a janela entre conferir e criar
+            criados.append(pool)
+        return pool
+    monkeypatch.setattr(exportacao, "ThreadPoolExecutor", criar)
+    exp = exportacao.Exportador(1)
+    largada = threading.Barrier(8)
+    vistos = []
+
+    def primeira_exportacao():
+        largada.wait()
+        exp.iniciar()
+        vistos.append((exp._pool, exp._cancelados, exp._fila))
+    threads = [threading.Thread(target=primeira_exportacao) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    try:
+        assert len(criados) == 1
+        assert all(v == vistos[0] and v[0] is not None for v in vistos)
+        assert exportacao._cancelados is exp._cancelados         # o que _relator confere
+    finally:
+        for pool in criados:
+            pool.shutdown(wait=False)
+        exp._coordenacao.shutdown(wait=False)
@@ -0,0 +1,161 @@
+import json
+from calendar import timegm
+import pytest
+import config
+import funcoes
+import indices
+import minutos
+import repositorio
+from funcoes import FRAME_BIN, crc8, decodificar_edump_bin
+from minutos import minutos_hhmm as m, VAZIO
+from simulador import _quadro
+
+
+def _epoch(ts):
+    return timegm((int(ts[:4]), int(ts[5:7]), int(ts[8:10]), int(ts[11:13]), int(ts[14:16]), int(ts[17:19])))
+
+
+def test_crc8_valor_de_referencia():
+    assert crc8(b"123456789") == 0xF4       # CRC-8/SMBUS (poly 0x07, init 0)
+    assert crc8(b"") == 0
+
+
+def test_quadro_ida_e_volta():
+    q = _quadro(7, _epoch("2024-03-01T08:05:59"), "A1B2C3D4")
+    assert len(q) == FRAME_BIN.size == 20
+    seq, epoch, ln, uid, crc = FRAME_BIN.unpack(q)
+    assert (seq, ln, uid[:ln].hex().upper(), crc) == (7, 4, "A1B2C3D4", crc8(q[:-1]))
+    assert decodificar_edump_bin(q) == ([("A1B2C3D4", "2024-03-01", "08:05", 7)], 0)
+    longo = _quadro(8, _epoch("2024-03-01T08:06:00"), "04A1B2C3D4E5F6")      # UID de 7 bytes
+    assert decodificar_edump_bin(longo)[0] == [("04A1B2C3D4E5F6", "2024-03-01", "08:06", 8)]
+
+
+def test_crc_errado_conta_como_invalido():
+    bom = _quadro(1, _epoch("2024-03-01T08:00:00"), "A1B2C3D4")
+    ruim = bytearray(_quadro(2, _epoch("2024-03-01T09:00:00"), "B1B2C3D4"))
+    ruim[9] ^= 0x01                         # bit trocado no UID, CRC mantido
+    regs, invalidos = decodificar_edump_bin(bytes(ruim) + bom)
+    assert invalidos == 1
+    assert [r[0] for r in regs] == ["A1B2C3D4"]
+
+
+def test_tamanho_de_uid_impossivel_conta_como_invalido():
+    q = FRAME_BIN.pack(1, 0, 11, b"\xAA" * 10, 0)[:-1]
+    assert decodificar_edump_bin(q + bytes([crc8(q)])) == ([], 1)
+
+
+def test_quadro_final_truncado_e_ignorado():
+    quadros = (_quadro(1, _epoch("2024-03-01T08:00:00"), "A1B2C3D4")
+               + _quadro(2, _epoch("2024-03-01T09:00:00"), "B1B2C3D4"))
+    regs, invalidos = decodificar_edump_bin(quadros[:-7])
+    assert [r[3] for r in regs] == [1]
+    assert invalidos == 0                   # o resto chega no próximo pedaço, não é erro
+
+
+def test_epoch_perto_da_meia_noite_e_da_virada_do_mes():
+    casos = {
+        "2024-03-01T23:59:59": ("2024-03-01", "23:59"),
+        "2024-03-02T00:00:00": ("2024-03-02", "00:00"),
+        "2024-02-29T23:59:00": ("2024-02-29", "23:59"),     # ano bissexto
+        "2024-03-01T00:00:59": ("2024-03-01", "00:00"),
+        "2024-04-30T23:59:59": ("2024-04-30", "23:59"),
+        "2024-05-01T00:00:01": ("2024-05-01", "00:00"),
+        "2023-12-31T23:59:59": ("2023-12-31", "23:59"),
+        "2024-01-01T00:00:00": ("2024-01-01", "00:00"),
+    }
+    buf = b"".join(_quadro(i, _epoch(ts), "A1B2C3D4") for i, ts in enumerate(casos))
+    regs, invalidos = decodificar_edump_bin(buf)
+    assert invalidos == 0
+    assert [(d, h) for _uid, d, h, _seq in regs] == list(casos.values())
+
+
+NOITE = {"entrada": "22:00"}
+
+
+def test_minutos_trabalhados_turno_que_vira_a_meia_noite():
+    assert minutos.minutos_trabalhados(m("22:00"), VAZIO, VAZIO, m("06:00")) == 8 * 60
+    assert minutos.minutos_trabalhados(m("22:00"), m("02:00"), m("03:00"), m("06:00")) == 7 * 60
+    # intervalo que atravessa a meia-noite
+    assert minutos.minutos_trabalhados(m("22:00"), m("23:30"), m("00:30"), m("06:00")) == 7 * 60
+    assert minutos.minutos_trabalhados(m("22:00"), m("23:30"), VAZIO, m("06:00")) == 8 * 60
+
+
+def test_batida_depois_da_meia_noite_fecha_o_turno_da_vespera():
+    assert funcoes.pertence_a_vespera({}, "06:00", lambda: dict(NOITE))
+    assert not funcoes.pertence_a_vespera({}, "06:00", lambda: {})                 # véspera sem turno aberto
+    assert not funcoes.pertence_a_vespera({"entrada": "05:00"}, "06:00", lambda: dict(NOITE))
+
+
+def test_limite_de_virada_max_horas(monkeypatch):
+    monkeypatch.setattr(config, "VIRADA_MAX_HORAS", 12)
+    assert funcoes.pertence_a_vespera({}, "09:59", lambda: dict(NOITE))            # 11h59 depois da entrada
+    assert not funcoes.pertence_a_vespera({}, "10:00", lambda: dict(NOITE))        # 12h: já é o dia novo
+    monkeypatch.setattr(config, "VIRADA_MAX_HORAS", 0)
+    assert not funcoes.pertence_a_vespera({}, "06:00", lambda: dict(NOITE))
+
+
+def test_dump_reprocessado_reconhece_a_saida_ja_gravada_na_vespera():
+    fechado = {"entrada": "22:00", "saida_intervalo": "02:00", "volta_intervalo": "03:00", "saida": "06:00"}
+    assert funcoes.pertence_a_vespera({}, "06:00", lambda: fechado)                # hora in vespera.values()
+    assert not funcoes.pertence_a_vespera({}, "06:30", lambda: fechado)
+
+
+UID = "A1B2C3D4"
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    r = repositorio.RepositorioJSON()
+    r.carregar()
+    r.salvar_funcionario(UID, "Fulano")
+    monkeypatch.setattr(config, "repo", r)
+    monkeypatch.setattr(config, "MIN_GAP_SECONDS", 0)
+    monkeypatch.setattr(config, "VIRADA_MAX_HORAS", 12)
+    return r
+
+
+def _linha(ts, seq):
+    return json.dumps({"uid": UID, "ts": ts, "seq": seq})
+
+
+def _mesclar(repo, linhas):
+    m = funcoes.MescladorIncremental(repo, lote=2)
+    for linha in linhas:
+        m.adicionar(linha)
+    m.confirmar()
+    return m
+
+
+def test_dump_noturno_reprocessado_nao_duplica_nem_abre_o_dia_seguinte(repo):
+    linhas = [_linha("2024-03-01T22:00:00", 0), _linha("2024-03-02T02:00:00", 1),
+              _linha("2024-03-02T03:00:00", 2), _linha("2024-03-02T06:00:00", 3)]
+    assert _mesclar(repo, linhas).novos == 4
+    assert repo.dia(UID, "2024-03-01") == {"entrada": "22:00", "saida_intervalo": "02:00",
+                                           "volta_intervalo": "03:00", "saida": "06:00"}
+    de_novo = _mesclar(repo, linhas)
+    assert (de_novo.novos, de_novo.repetidos) == (0, 4)
+    assert repo.dia(UID, "2024-03-02") == {}
+
+
+def test_horas_incrementais_iguais_ao_recalculo_completo(repo, monkeypatch):
+    relogio = []
+    monkeypatch.setattr(funcoes, "agora", lambda: relogio.pop(0))
+    assert repo.horas.totais_do_mes("2024-03") == {}        # mês já montado: o resto é incremental
+    _mesclar(repo, [_linha("2024-03-01T08:00:00", 0), _linha("2024-03-01T12:00:00", 1),
+                    _linha("2024-03-01T13:00:00", 2), _linha("2024-03-01T17:00:00", 3),
+                    _linha("2024-03-04T22:00:00", 4), _linha("2024-03-05T02:00:00", 5),
+                    _linha("2024-03-05T02:30:00", 6), _linha("2024-03-05T06:00:00", 7)])
+    relogio += [("2024-03-05", "22:00"), ("2024-03-06", "01:00"), ("2024-03-06", "02:00"),
+                ("2024-03-06", "05:30"),
+                ("2024-03-31", "21:00"), ("2024-03-31", "23:30"), ("2024-04-01", "00:00"), ("2024-04-01", "03:00")]
+    for _ in range(len(relogio)):
+        assert funcoes.registrar_batida(UID)[0]
+    incremental = repo.horas.totais_do_mes("2024-03")
+    assert incremental == {UID: 8 * 60 + (8 * 60 - 30) + (7 * 60 + 30 - 60) + (6 * 60 - 30)}
+
+    repo.horas.reconstruir()
+    assert repo.horas.totais_do_mes("2024-03") == incremental
+    do_zero = indices.HorasTrabalhadas(repo.registros_do_mes)
+    assert do_zero.totais_do_mes("2024-03") == incremental
+    assert do_zero.totais_do_mes("2024-04") == {}           # as batidas de 01/04 ficaram no turno de 31/03
@@ -0,0 +1,62 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+import config
+import data
+import indices
+import repositorio
+
+UIDS = [f"{0xA1000000 + i:08X}" for i in range(6)]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def repo(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    r = repositorio.RepositorioJSON() if request.param == "json" else repositorio.RepositorioSQLite()
+    r.carregar()
+    for i, uid in enumerate(UIDS):
+        r.salvar_funcionario(uid, f"Funcionário {i}")
+    return r
+
+
+def _fotografia(idx, datas_extras):
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    datas = idx.datas()
+    return {"datas": datas, "meses": idx.meses(), "hoje": idx.batidas_do_dia(hoje),
+            "uids": {d: idx.uids_do_dia(d) for d in sorted(set(datas) | datas_extras)}}
+
+
+def _lote(rnd, dias, n):
+    return [data.registro_batida(rnd.choice(UIDS), rnd.choice(dias), rnd.choice(config.EVENTOS),
+                                 f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}", "COM3")
+            for _ in range(n)]
+
+
+def test_indice_incremental_igual_ao_montado_do_zero(repo):
+    rnd = random.Random(12)
+    hoje = datetime.now()
+    dias = [(hoje - timedelta(days=k)).strftime("%Y-%m-%d") for k in (0, 0, 0, 1, 2, 31, 45, 400)]
+    extras = set(dias)
+
+    def conferir():
+        do_zero = indices.IndicesBatidas(repo._todas_datas, repo._ler_dia, repo.funcionarios)
+        assert _fotografia(repo.indices, extras) == _fotografia(do_zero, extras)
+        assert repo.indices.funcionarios_por_nome() == do_zero.funcionarios_por_nome()
+
+    for rodada in range(6):
+        novo = (hoje - timedelta(days=100 * (rodada + 5))).strftime("%Y-%m-%d")     # mês ainda sem batidas
+        dias.append(novo)
+        extras.add(novo)
+        lote = _lote(rnd, dias, 15) + [data.registro_batida(UIDS[-1], novo, "entrada", "08:00")]
+        if rodada % 2:
+            repo.registrar_eventos(lote)            # aplica e grava
+        else:
+            repo.aplicar_eventos(lote)              # decidido, commit em grupo ainda pendente
+            repo.persistir_eventos(lote)
+        conferir()                                  # consultas deixam os índices montados
+        if rodada == 2:
+            repo.remover_funcionario(UIDS[0], apagar_registros=True)
+            conferir()
+        if rodada == 4:
+            repo.registrar_eventos([{"op": "del_uid", "uid": UIDS[1]}] + _lote(rnd, dias, 5))
+            conferir()
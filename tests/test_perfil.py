@@ -0,0 +1,34 @@
+import time
+import config
+import perfil
+import serial_thread
+
+
+def test_area_serial_inclui_os_estagios_em_outras_threads():
+    base = ("threading.py:Thread._bootstrap", "threading.py:Thread.run")
+    assert perfil._area(base + ("serial_thread.py:_estagio_decisao", "funcoes.py:decidir_batida")) == "serial"
+    assert perfil._area(base + ("serial_thread.py:PersistenciaEmGrupo._loop",
+                                "repositorio.py:RepositorioJSON.persistir_eventos")) == "serial"
+    assert perfil._area(base + ("data.py:iniciar_compactador.<locals>._loop",)) == "outros"
+
+
+class RepoLento:
+    def persistir_eventos(self, recs):
+        fim = time.perf_counter() + 0.3
+        while time.perf_counter() < fim:
+            pass
+
+
+def test_captura_conta_o_commit_em_grupo_como_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "repo", RepoLento())
+    p = serial_thread.PersistenciaEmGrupo()
+    p.iniciar()
+    captura = perfil.Captura(0.25, intervalo_ms=5).iniciar()
+    p.enfileirar([{"uid": "A1B2C3D4"}])
+    while captura.ativa:
+        time.sleep(0.02)
+    p.drenar()
+    assert captura.estado == "pronto"
+    serial = [n for (_t, pilha), n in captura._pilhas.items() if perfil._area(pilha) == "serial"]
+    assert sum(serial) > 0
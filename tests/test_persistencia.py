@@ -0,0 +1,82 @@
+import time, threading
+import config
+import serial_thread
+
+
+class RepoGravado:
+    """Só o que PersistenciaEmGrupo usa do repositório: guarda o que foi persistido."""
+    def __init__(self):
+        self.gravados = []
+        self._lock = threading.Lock()
+
+    def persistir_eventos(self, recs):
+        with self._lock:
+            self.gravados.extend(recs)
+
+
+def _esperar(cond, timeout=5.0):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return cond()
+
+
+def test_liberar_e_iniciar_intercalados_nao_perdem_lote(monkeypatch):
+    repo = RepoGravado()
+    monkeypatch.setattr(config, "repo", repo)
+    p = serial_thread.PersistenciaEmGrupo()
+    p._espera_s = 0.02
+    p.iniciar()
+    for i in range(30):
+        # um terminal sai (último usuário) enquanto outro entra
+        saida = threading.Thread(target=p.liberar)
+        entrada = threading.Thread(target=p.iniciar)
+        saida.start(); entrada.start()
+        saida.join(); entrada.join()
+        rec = {"uid": "AABBCCDD", "seq": i}
+        p.enfileirar([rec])
+        assert _esperar(lambda: rec in repo.gravados), f"lote {i} não foi gravado"
+        assert p._thread.is_alive() and not p._parar.is_set()
+    p.drenar()
+    assert [r["seq"] for r in repo.gravados] == list(range(30))
+
+
+def test_iniciar_logo_apos_parada_sobe_thread_nova(monkeypatch):
+    repo = RepoGravado()
+    monkeypatch.setattr(config, "repo", repo)
+    p = serial_thread.PersistenciaEmGrupo()
+    p._espera_s = 0.5
+    p.iniciar()
+    # a janela antiga: parada pedida, thread ainda viva esperando a fila
+    with p._lock:
+        p._usuarios -= 1
+        p._parar.set()
+        velha = p._thread
+    p.iniciar()
+    assert p._thread is not velha
+    p.enfileirar([{"uid": "AABBCCDD"}])
+    assert _esperar(lambda: repo.gravados)
+    p.drenar()
+
+
+def test_pendentes_conta_batidas_e_nao_lotes(monkeypatch):
+    liberar = threading.Event()
+
+    class RepoTravado(RepoGravado):
+        def persistir_eventos(self, recs):
+            liberar.wait(5)
+            super().persistir_eventos(recs)
+    repo = RepoTravado()
+    monkeypatch.setattr(config, "repo", repo)
+    p = serial_thread.PersistenciaEmGrupo()
+    p.iniciar()
+    p.enfileirar([{"uid": "AABBCCDD", "seq": 0}])
+    p.enfileirar([{"uid": "AABBCCDD", "seq": s} for s in range(1, 4)])     # um EDUMP: vários por lote
+    p.enfileirar([])
+    assert p.pendentes() == 4                   # na fila ou no commit travado, conta igual
+    liberar.set()
+    assert _esperar(lambda: p.pendentes() == 0)
+    assert len(repo.gravados) == 4
+    p.drenar()
@@ -0,0 +1,39 @@
+import json, os, subprocess, sys
+import config
+import data
+import ponto
+
+UID = "A1B2C3D4"
+SEGURA_TRAVA = """
+import fcntl, sys
+f = open(sys.argv[1], "a+")
+fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+print("ok", flush=True)
+sys.stdin.read()
+"""
+
+
+def _dump(tmp_path):
+    arq = tmp_path / "dump.jsonl"
+    arq.write_text(json.dumps({"uid": UID, "ts": "2024-03-01T08:00:00", "seq": 0}) + "\n")
+    return str(arq)
+
+
+def test_import_dump_recusa_com_o_serve_segurando_a_trava(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data.salvar_json(config.ARQ_FUNC, {UID: "Fulano"})
+    arq = _dump(tmp_path)
+    serve = subprocess.Popen([sys.executable, "-c", SEGURA_TRAVA, config.ARQ_TRAVA],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert serve.stdout.readline().strip() == "ok"
+        assert ponto.main(["import-dump", arq, "--placa", "0000000a"]) == 2
+        assert ponto.main(["migrate"]) == 2
+        assert not os.path.exists(config.ARQ_JOURNAL)
+        assert not os.path.exists(config.ARQ_CURSOR)
+    finally:
+        serve.communicate("")
+    assert ponto.main(["import-dump", arq, "--placa", "0000000a"]) == 0      # serve parado
+    assert data.ler_cursor(config.ARQ_CURSOR, "0000000A") == 1
+    assert data.travar(config.ARQ_TRAVA)                                    # e a trava foi solta
+    data.destravar(config.ARQ_TRAVA)
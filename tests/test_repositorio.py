@@ -0,0 +1,94 @@
+import os, threading
+import pytest
+from datetime import datetime
+import config
+import data
+import repositorio
+
+UID = "A1B2C3D4"
+
+
+@pytest.fixture
+def sqlite(tmp_path):
+    repo = repositorio.RepositorioSQLite(arq_db=str(tmp_path / "ponto.db"))
+    repo.carregar()
+    repo.salvar_funcionario(UID, "Fulano")
+    return repo
+
+
+def _no_banco(repo):
+    return repo._query("SELECT COUNT(*) FROM batidas WHERE uid = ?", (UID,))[0][0]
+
+
+def test_sqlite_remover_com_registros_descarta_batida_enfileirada(sqlite):
+    rec = data.registro_batida(UID, "2024-03-01", "entrada", "08:00")
+    sqlite.aplicar_eventos([rec])       # decidida; o commit em grupo ainda não rodou
+    sqlite.remover_funcionario(UID, apagar_registros=True)
+    sqlite.persistir_eventos([rec])     # o lote enfileirado chega depois da remoção
+    assert sqlite.dia(UID, "2024-03-01") == {}
+    assert _no_banco(sqlite) == 0
+
+
+def test_sqlite_del_uid_descarta_batida_enfileirada(sqlite):
+    rec = data.registro_batida(UID, "2024-03-01", "entrada", "08:00")
+    sqlite.aplicar_eventos([rec])
+    sqlite.registrar_eventos([{"op": "del_uid", "uid": UID}])
+    sqlite.persistir_eventos([rec])
+    assert sqlite.dia(UID, "2024-03-01") == {}
+    assert _no_banco(sqlite) == 0
+
+
+def test_sqlite_batida_enfileirada_depois_do_del_uid_e_gravada(sqlite):
+    sqlite.registrar_eventos([{"op": "del_uid", "uid": UID}])
+    rec = data.registro_batida(UID, "2024-03-02", "entrada", "08:00")
+    sqlite.aplicar_eventos([rec])
+    sqlite.persistir_eventos([rec])
+    assert _no_banco(sqlite) == 1
+    assert sqlite.dia(UID, "2024-03-02") == {"entrada": "08:00"}
+
+
+@pytest.fixture
+def json_repo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo = repositorio.RepositorioJSON()
+    repo.carregar()
+    repo.salvar_funcionario(UID, "Fulano")
+    repo.salvar_funcionario("B1B2C3D4", "Beltrano")
+    return repo
+
+
+def test_json_remover_tira_do_indice_datas_e_meses_vazios(json_repo):
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    json_repo.registrar_eventos([data.registro_batida(UID, hoje, "entrada", "08:00"),
+                                 data.registro_batida("B1B2C3D4", "2020-02-03", "entrada", "08:00"),
+                                 data.registro_batida(UID, "2020-01-02", "entrada", "08:00")])
+    assert "2020-01" in json_repo.meses() and hoje in json_repo.datas()
+    json_repo.remover_funcionario(UID, apagar_registros=True)
+    assert hoje not in json_repo.datas()                # mês carregado
+    assert "2020-01" not in json_repo.meses()           # mês só no disco
+    assert json_repo.datas() == ["2020-02-03"]
+
+    # depois de reiniciar (del_uid ainda no journal) e depois da compactação
+    assert data.carregar_indice(json_repo.dir_reg, json_repo.arq_journal) == {"2020-02": {"2020-02-03"}}
+    data.compactar(json_repo.dir_reg, json_repo.arq_journal)
+    assert data.carregar_indice(json_repo.dir_reg, json_repo.arq_journal) == {"2020-02": {"2020-02-03"}}
+
+
+def test_json_batida_enfileirada_antes_do_del_uid_nao_volta(json_repo):
+    rec = data.registro_batida(UID, "2020-01-02", "entrada", "08:00")
+    json_repo.aplicar_eventos([rec])
+    json_repo.remover_funcionario(UID, apagar_registros=True)
+    json_repo.persistir_eventos([rec])
+    assert all(r.get("op") == "del_uid" for r in data.ler_journal(json_repo.arq_journal) if r.get("uid") == UID)
+    assert "2020-01" not in json_repo.meses()
+
+
+def test_json_carregar_sem_manutencao_nao_migra_nem_compacta(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data.salvar_json(config.ARQ_REG, {UID: {"2024-03-01": {"entrada": "08:00"}}})
+    antes = threading.active_count()
+    repo = repositorio.RepositorioJSON()
+    repo.carregar(manutencao=False)
+    assert threading.active_count() == antes             # sem a thread do compactador
+    assert data.precisa_migrar(config.ARQ_REG, config.DIR_REG)
+    assert not os.path.exists(config.DIR_REG)
@@ -0,0 +1,73 @@
+import serial
+import config
+import data
+import repositorio
+import serial_thread
+from simulador import ArduinoSimulado
+
+
+def _sincronizar(sim, terminal):
+    """Conecta na porta do simulador, espera o READY e roda a sincronização inicial."""
+    with serial.Serial(sim.porta, config.BAUDRATE, timeout=config.TIMEOUT) as ar:
+        pronto, _uids, terminal.placa = serial_thread._aguardar_pronto(ar)
+        assert pronto
+        serial_thread._do_initial_sync(ar, sim.porta, terminal)
+
+
+def _batidas(repo, uids):
+    return sum(len(repo.dia(u, d)) for u in uids for d in repo.datas())
+
+
+def test_cursor_segue_a_placa_e_nao_a_porta(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    uids_a = [f"{0xA0000000 + i:08X}" for i in range(4)]
+    uids_b = [f"{0xB0000000 + i:08X}" for i in range(4)]
+    data.salvar_json(config.ARQ_FUNC, {u: u for u in uids_a + uids_b})
+    repo = repositorio.RepositorioJSON()
+    repo.carregar()
+    monkeypatch.setattr(config, "repo", repo)
+
+    sims = []
+    try:
+        # placa A na "COM3": importa tudo e guarda o cursor no id dela
+        a = ArduinoSimulado(128, baud=0, placa="0000000A").iniciar()
+        sims.append(a)
+        a.preencher_eeprom(uids_a)
+        _sincronizar(a, serial_thread.Terminal(a.porta, "COM3"))
+        assert _batidas(repo, uids_a) == a.max_slots
+        assert data.ler_cursor(config.ARQ_CURSOR, "0000000A") == a.seq
+
+        # outra placa, mesmas sequências, aparece na mesma "COM3": nada pode ser pulado
+        b = ArduinoSimulado(128, baud=0, placa="0000000B").iniciar()
+        sims.append(b)
+        b.preencher_eeprom(uids_b)
+        _sincronizar(b, serial_thread.Terminal(b.porta, "COM3"))
+        assert _batidas(repo, uids_b) == b.max_slots
+        assert data.ler_cursor(config.ARQ_CURSOR, "0000000B") == b.seq
+        assert data.ler_cursor(config.ARQ_CURSOR, "0000000A") == a.seq
+    finally:
+        for sim in sims:
+            sim.parar()
+
+
+def test_placa_sem_id_pede_o_dump_completo(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    uids = [f"{0xC0000000 + i:08X}" for i in range(4)]
+    data.salvar_json(config.ARQ_FUNC, {u: u for u in uids})
+    data.salvar_json(config.ARQ_CURSOR, {"COM3": 1000})     # cursor antigo, por porta
+    repo = repositorio.RepositorioJSON()
+    repo.carregar()
+    monkeypatch.setattr(config, "repo", repo)
+
+    sim = ArduinoSimulado(128, baud=0).iniciar()
+    try:
+        sim.preencher_eeprom(uids)
+        terminal = serial_thread.Terminal(sim.porta, "COM3")
+        with serial.Serial(sim.porta, config.BAUDRATE, timeout=config.TIMEOUT) as ar:
+            assert serial_thread._aguardar_pronto(ar)[0]
+            serial_thread._do_initial_sync(ar, sim.porta, terminal)     # READY "perdido": placa desconhecida
+        assert _batidas(repo, uids) == sim.max_slots
+        assert terminal.placa == sim.placa                             # veio no próprio dump
+        assert data.ler_cursor(config.ARQ_CURSOR, sim.placa) == sim.seq
+    finally:
+        sim.parar()